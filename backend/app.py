@@ -1,10 +1,19 @@
-from flask import Flask, jsonify
+from services.startup import startup, PROCESS_STARTED
+import time
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from routes.api import api_bp
-from config.database import supabase_config
+from routes.debug import debug_bp
+from services.storage import storage
+from services.training_service import training_service
+from services.knowledge_service import knowledge_service
+from services.nlp_service import nlp_service
+from services.logger import assign_request_id, request_id_var
 import os
 from dotenv import load_dotenv
 
+startup.record('imports', time.perf_counter() - PROCESS_STARTED)
+
 # Load environment variables
 load_dotenv()
 
@@ -17,16 +26,20 @@ def create_app():
     # Configuration
     app.config['DEBUG'] = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     
-    # Initialize database
-    try:
-        supabase_config.create_tables()
-        print("Database connection established")
-    except Exception as e:
-        print(f"Warning: Database connection failed: {e}")
-        print("Application will continue with limited functionality")
-    
     # Register blueprints
     app.register_blueprint(api_bp, url_prefix='/api')
+    # Admin-only profiling endpoints; 404 unless ADMIN_TOKEN is set
+    app.register_blueprint(debug_bp, url_prefix='/api/debug')
+    
+    # Every log record written while handling a request carries its id
+    @app.before_request
+    def set_request_id():
+        assign_request_id(request.headers.get('X-Request-ID'))
+    
+    @app.after_request
+    def add_request_id(response):
+        response.headers['X-Request-ID'] = request_id_var.get() or ''
+        return response
     
     # Root route
     @app.route('/')
@@ -52,8 +65,25 @@ def create_app():
             'error': 'Internal server error'
         }), 500
     
+    # Heavy resources load in the background (or per STARTUP_MODE); /api/health/ready reports progress
+    startup.start([
+        ('database', _init_database),
+        ('training_data', training_service.load_data),
+        ('sentence_model', lambda: nlp_service.sentence_model),
+        ('knowledge_index', knowledge_service.warm_up)
+    ])
+    
     return app
 
+def _init_database():
+    """Initialize database"""
+    try:
+        storage.initialize()
+        print("Database connection established")
+    except Exception as e:
+        print(f"Warning: Database connection failed: {e}")
+        print("Application will continue with limited functionality")
+
 if __name__ == '__main__':
     app = create_app()
     
@@ -0,0 +1,104 @@
+"""ASGI entry point.
+
+Run with an ASGI server, e.g. ``uvicorn asgi:app --port 5000``. ``POST
+/api/chat`` is served natively on the event loop through
+``ChatService.process_message_async``, so a single worker can hold many
+in-flight LLM calls. Every other route, including streaming chat, is
+delegated to the Flask app from ``create_app``.
+"""
+import json
+from asgiref.wsgi import WsgiToAsgi
+from app import create_app
+from services.chat_service import chat_service
+from services.http_client import async_http_client
+from services.logger import assign_request_id, request_id_var
+
+flask_app = create_app()
+wsgi_app = WsgiToAsgi(flask_app)
+
+ALLOWED_ORIGINS = {'http://localhost:3000'}
+
+
+async def _read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_json(send, status: int, payload, origin: str = ''):
+    body = json.dumps(payload).encode('utf-8')
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+               (b'x-request-id', (request_id_var.get() or '').encode())]
+    if origin in ALLOWED_ORIGINS:
+        headers.append((b'access-control-allow-origin', origin.encode()))
+        headers.append((b'vary', b'Origin'))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            chat_service.history_writer.close()
+            if async_http_client is not None:
+                await async_http_client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _chat(scope, receive, send):
+    """Native async POST /api/chat; mirrors routes.api.chat"""
+    headers = dict(scope.get('headers') or [])
+    origin = headers.get(b'origin', b'').decode('latin-1')
+    assign_request_id(headers.get(b'x-request-id', b'').decode('latin-1'))
+    body = await _read_body(receive)
+
+    try:
+        data = json.loads(body or b'null')
+    except ValueError:
+        data = None
+
+    wants_stream = isinstance(data, dict) and data.get('stream') or \
+        b'text/event-stream' in headers.get(b'accept', b'')
+    if wants_stream:
+        # Streaming stays on the WSGI route; replay the consumed body to it
+        async def replay():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await wsgi_app(scope, replay, send)
+        return
+
+    if not isinstance(data, dict) or 'message' not in data:
+        await _send_json(send, 400, {'success': False, 'error': 'Message is required'}, origin)
+        return
+
+    message = str(data['message']).strip()
+    if not message:
+        await _send_json(send, 400, {'success': False, 'error': 'Message cannot be empty'}, origin)
+        return
+
+    context_tokens = data.get('context_tokens')
+    context_tokens_error = chat_service.context_tokens_error(context_tokens)
+    if context_tokens_error:
+        await _send_json(send, 400, {'success': False, 'error': context_tokens_error}, origin)
+        return
+
+    try:
+        response = await chat_service.process_message_async(message, data.get('user_id', 'anonymous'), context_tokens)
+        await _send_json(send, 200, response, origin)
+    except Exception as e:
+        await _send_json(send, 500, {'success': False, 'error': f'Internal server error: {str(e)}'}, origin)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] == '/api/chat':
+        await _chat(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
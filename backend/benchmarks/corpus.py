@@ -0,0 +1,71 @@
+import os
+import json
+import random
+from typing import List, Dict, Iterator
+
+from services.tokenizer import tokenizer
+
+_SYLLABLES = [consonant + vowel for consonant in 'bdfgklmnprstvz' for vowel in 'aeiou']
+
+SEED_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'cybersecurity_knowledge.json')
+
+
+def load_seed_items(path: str = SEED_FILE) -> List[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class SyntheticCorpus:
+    """Deterministic synthetic cybersecurity corpus built from the seed knowledge file.
+
+    Documents recombine seed sentences and splice in seed tags plus a long
+    tail of generated terms (drawn with a Zipf-like distribution), so the
+    vocabulary keeps growing with corpus size the way real text does.
+    """
+
+    def __init__(self, seed_items: List[Dict] = None, seed: int = 42):
+        self.seed_items = seed_items if seed_items is not None else load_seed_items()
+        self.seed = seed
+        self.sentences = [sentence for item in self.seed_items for sentence in tokenizer.sentences(item['content'])]
+        self.terms = sorted({tag.replace('_', ' ') for item in self.seed_items for tag in item.get('tags', [])})
+        self.titles = [item['title'] for item in self.seed_items]
+        self.categories = sorted({item.get('category', 'general') for item in self.seed_items})
+
+    def _term(self, rng: random.Random) -> str:
+        if rng.random() < 0.7:
+            return rng.choice(self.terms)
+        # Long-tail vocabulary with Zipf-like ranks
+        return self._pseudo_word(int(rng.paretovariate(0.8)))
+
+    @staticmethod
+    def _pseudo_word(rank: int) -> str:
+        """Pronounceable letters-only word for a rank (the tokenizer drops digits)"""
+        syllables = []
+        while True:
+            rank, digit = divmod(rank, len(_SYLLABLES))
+            syllables.append(_SYLLABLES[digit])
+            if rank == 0:
+                return 'x' + ''.join(syllables)
+
+    def document(self, index: int) -> Dict:
+        rng = random.Random(self.seed * 1000003 + index)
+        sentences = rng.sample(self.sentences, rng.randint(2, min(6, len(self.sentences))))
+        extra = ' '.join(self._term(rng) for _ in range(rng.randint(3, 12)))
+        return {
+            'id': f"bench_{index:07d}",
+            'title': f"{rng.choice(self.titles)}: {self._term(rng)}",
+            'content': f"{' '.join(sentences)} Related: {extra}.",
+            'category': rng.choice(self.categories),
+            'created_at': '2024-01-01T00:00:00',
+            'updated_at': '2024-01-01T00:00:00'
+        }
+
+    def documents(self, size: int) -> List[Dict]:
+        return [self.document(index) for index in range(size)]
+
+    def queries(self, count: int) -> Iterator[str]:
+        """User-style questions about seed topics"""
+        rng = random.Random(self.seed)
+        templates = ('what is {}', 'how do I protect against {}', '{} best practices', 'explain {} and {}')
+        for _ in range(count):
+            yield rng.choice(templates).format(rng.choice(self.terms).lower(), rng.choice(self.terms).lower())
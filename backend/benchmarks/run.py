@@ -0,0 +1,304 @@
+"""Offline micro-benchmarks for the NLP and retrieval hot paths.
+
+Run from the backend directory, e.g.::
+
+    python -m benchmarks.run --sizes 100,1000,10000
+    python -m benchmarks.run --sizes 1000000 --max-seconds 30
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Each benchmark is timed call by call (throughput and p50/p95/p99 latency),
+then re-run for a few calls under tracemalloc to record peak Python heap
+usage. Results are written as JSON; ``--compare`` flags p50 regressions
+against an earlier run and exits non-zero if there are any.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import platform
+import logging
+import tracemalloc
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional
+
+import numpy as np
+
+from benchmarks.corpus import SyntheticCorpus
+from services.nlp_service import nlp_service, BM25Index
+from services.search_index import TfidfIndex
+from services.embedding_store import EmbeddingStore
+from services.ann_index import IVFIndex
+from services.tokenizer import tokenizer
+from services.knowledge_service import KnowledgeService
+from services.storage import SQLiteStorage
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+DEFAULT_SIZES = [100, 1000, 10000]
+# Dimensions of the hashed bag-of-words vectors standing in for a sentence model
+HASHED_EMBEDDING_DIM = 256
+
+
+class Benchmark:
+    """A named call measured against one corpus size"""
+
+    def __init__(self, name: str, corpus_size: int, fn: Callable[[int], Any], max_iterations: int = 1000,
+                 setup: Optional[Callable[[], None]] = None, report: Optional[Callable[[], Dict]] = None):
+        self.name = name
+        self.corpus_size = corpus_size
+        self.fn = fn
+        self.max_iterations = max_iterations
+        self.setup = setup
+        # Extra, non-latency figures (e.g. ANN recall) added to the result
+        self.report = report
+
+
+def measure(benchmark: Benchmark, max_seconds: float, warmup: int, memory_iterations: int) -> Dict[str, Any]:
+    if benchmark.setup:
+        benchmark.setup()
+    for i in range(min(warmup, benchmark.max_iterations)):
+        benchmark.fn(i)
+
+    latencies = []
+    started = time.perf_counter()
+    deadline = started + max_seconds
+    while len(latencies) < benchmark.max_iterations and (not latencies or time.perf_counter() < deadline):
+        call_started = time.perf_counter_ns()
+        benchmark.fn(len(latencies))
+        latencies.append(time.perf_counter_ns() - call_started)
+    elapsed = time.perf_counter() - started
+
+    peak = None
+    if memory_iterations > 0:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            for i in range(min(memory_iterations, benchmark.max_iterations)):
+                benchmark.fn(i)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+
+    latency_ms = np.array(latencies, dtype=np.float64) / 1e6
+    result = {
+        'benchmark': benchmark.name,
+        'corpus_size': benchmark.corpus_size,
+        'iterations': len(latencies),
+        'throughput_per_s': round(len(latencies) / elapsed, 3) if elapsed > 0 else None,
+        'latency_ms': {
+            'mean': round(float(latency_ms.mean()), 4),
+            'p50': round(float(np.percentile(latency_ms, 50)), 4),
+            'p95': round(float(np.percentile(latency_ms, 95)), 4),
+            'p99': round(float(np.percentile(latency_ms, 99)), 4),
+            'max': round(float(latency_ms.max()), 4)
+        },
+        'peak_memory_bytes': peak
+    }
+    if benchmark.report:
+        result.update(benchmark.report())
+    return result
+
+
+def _hashed_embeddings(texts: List[str]) -> np.ndarray:
+    """Deterministic bag-of-words vectors, so ANN recall can be measured without a sentence model"""
+    vectors = np.zeros((len(texts), HASHED_EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in tokenizer.index_tokens(text):
+            vectors[row, zlib.crc32(token.encode('utf-8')) % HASHED_EMBEDDING_DIM] += 1.0
+    return vectors
+
+
+def _ivf_index() -> IVFIndex:
+    """An IVF index over a throwaway embedding store"""
+    directory = tempfile.mkdtemp(prefix='satecha-bench-ivf-')
+    return IVFIndex(EmbeddingStore(_hashed_embeddings, directory), path=os.path.join(directory, 'ivf.npz'))
+
+
+def _knowledge_service(corpus: List[Dict]) -> KnowledgeService:
+    """A KnowledgeService serving a fixed in-memory corpus (no Supabase or training data)"""
+    service = KnowledgeService()
+    service.index_snapshots = None
+    service.cache_ttl = 0
+    service._corpus = corpus
+    service._corpus_loaded_at = time.monotonic()
+    service.warm_up()
+    return service
+
+
+def benchmarks_for(corpus: List[Dict], queries: List[str], methods: List[str]) -> List[Benchmark]:
+    size = len(corpus)
+    texts = [item['content'] for item in corpus[:1000]]
+    contents = [item['content'] for item in corpus]
+    background = nlp_service.keyword_document_frequencies(contents)
+
+    def query(i: int) -> str:
+        return queries[i % len(queries)]
+
+    suite = [
+        Benchmark('preprocess_text', size, lambda i: nlp_service.preprocess_text(texts[i % len(texts)])),
+        # Corpus IDF for keyword extraction, computed once per corpus load
+        Benchmark('keyword_document_frequencies', size, lambda i: nlp_service.keyword_document_frequencies(contents),
+                  max_iterations=3),
+        Benchmark('extract_keywords', size,
+                  lambda i: nlp_service.extract_keywords(texts[i % len(texts)], background=background)),
+    ]
+
+    for method in methods:
+        if method == 'ivf':
+            index = _ivf_index()
+        else:
+            index = BM25Index() if method == 'bm25' else TfidfIndex()
+        suite.append(Benchmark(f'index_build[{method}]', size, lambda i, index=index: index.build(corpus),
+                               max_iterations=3))
+        suite.append(Benchmark(
+            f'find_similar_content[{method}]', size,
+            lambda i, index=index, method=method: nlp_service.find_similar_content(
+                query(i), [], method=method, index=index, top_k=5
+            ),
+            setup=lambda index=index: len(index) or index.build(corpus)
+        ))
+        if method == 'ivf':
+            # Latency of a top-10 ANN query, plus recall@10 against exact search for each nprobe
+            suite.append(Benchmark(
+                'ann_recall[ivf]', size, lambda i, index=index: index.search(query(i), 10),
+                setup=lambda index=index: len(index) or index.build(corpus),
+                report=lambda index=index: {'recall': index.evaluate_recall(queries[:100], top_k=10)}
+            ))
+
+    state = {}
+
+    def setup_context():
+        state['service'] = _knowledge_service(corpus)
+
+    suite.append(Benchmark('get_relevant_context', size,
+                           lambda i: state['service'].get_relevant_context(query(i)),
+                           setup=setup_context))
+
+    def setup_sqlite():
+        if 'sqlite' not in state:
+            directory = tempfile.mkdtemp(prefix='satecha-bench-')
+            state['sqlite'] = SQLiteStorage(os.path.join(directory, 'bench.db'))
+            state['sqlite'].insert_knowledge(corpus)
+
+    def chat_round_trip(i: int):
+        user_id = f"user_{i % 100}"
+        state['sqlite'].append_chat_history([{
+            'id': f"{size}_{i}_{time.perf_counter_ns()}", 'user_id': user_id, 'user_message': query(i),
+            'bot_response': 'ok', 'timestamp': datetime.utcnow().isoformat()
+        }])
+        return state['sqlite'].get_chat_history(user_id, 10)
+
+    suite.append(Benchmark('storage_search[sqlite]', size,
+                           lambda i: state['sqlite'].search_knowledge(query(i), 5), setup=setup_sqlite))
+    suite.append(Benchmark('storage_chat_history[sqlite]', size, chat_round_trip, setup=setup_sqlite))
+    return suite
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def compare(results: List[Dict], baseline_path: str, threshold: float) -> List[str]:
+    """p50 regressions beyond ``threshold`` (a ratio) against a previous results file"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['benchmark'], r['corpus_size']): r for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['benchmark'], result['corpus_size']))
+        if not previous or not previous['latency_ms']['p50']:
+            continue
+        ratio = result['latency_ms']['p50'] / previous['latency_ms']['p50']
+        marker = ' REGRESSION' if ratio > threshold else ''
+        print(f"{result['benchmark']:<32} n={result['corpus_size']:<8} p50 x{ratio:.2f}{marker}")
+        if marker:
+            regressions.append(f"{result['benchmark']} (n={result['corpus_size']}): p50 x{ratio:.2f}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated corpus sizes (up to 1000000)')
+    parser.add_argument('--methods', default='tfidf,bm25,ivf', help='index methods to benchmark (tfidf, bm25, ivf)')
+    parser.add_argument('--only', default='', help='comma-separated benchmark name prefixes to run')
+    parser.add_argument('--max-seconds', type=float, default=5.0, help='time budget per benchmark')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--memory-iterations', type=int, default=3, help='calls traced for peak memory (0 disables)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/bench-<timestamp>.json)')
+    parser.add_argument('--compare', help='previous results file to check for regressions')
+    parser.add_argument('--regression-threshold', type=float, default=1.2, help='p50 ratio that counts as a regression')
+    args = parser.parse_args(argv)
+    # Keep sampled request logs out of the timings; warnings and errors still show
+    logging.getLogger('satecha').setLevel(logging.WARNING)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    methods = [method.strip() for method in args.methods.split(',') if method.strip()]
+    only = [name.strip() for name in args.only.split(',') if name.strip()]
+
+    generator = SyntheticCorpus(seed=args.seed)
+    queries = list(generator.queries(args.queries))
+    results = []
+    for size in sizes:
+        print(f"Generating corpus of {size} documents...")
+        corpus = generator.documents(size)
+        for benchmark in benchmarks_for(corpus, queries, methods):
+            if only and not any(benchmark.name.startswith(prefix) for prefix in only):
+                continue
+            result = measure(benchmark, args.max_seconds, args.warmup, args.memory_iterations)
+            results.append(result)
+            latency = result['latency_ms']
+            print(f"{result['benchmark']:<32} n={size:<8} {result['throughput_per_s']:>10.1f}/s "
+                  f"p50={latency['p50']:.3f}ms p95={latency['p95']:.3f}ms p99={latency['p99']:.3f}ms "
+                  f"peak={result['peak_memory_bytes']}")
+            for row in result.get('recall', []):
+                print(f"    nprobe={row['nprobe']:<4} of {row['n_lists']:<5} recall@10={row['recall_at_k']:.3f} "
+                      f"ann={row['mean_latency_ms']:.3f}ms exact={row['exact_mean_latency_ms']:.3f}ms")
+        del corpus
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'peak_rss_bytes': _peak_rss_bytes(),
+            'args': vars(args)
+        },
+        'results': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.regression_threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond x{args.regression_threshold}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,52 @@
-from flask import Blueprint, request, jsonify
+import json
+import time
+from flask import Blueprint, request, jsonify, Response, stream_with_context, g
 from services.chat_service import chat_service
 from services.knowledge_service import knowledge_service
 from services.nlp_service import nlp_service
+from services.http_client import http_client, async_http_client
+from services.deepseek_service import deepseek_service
+from services.startup import startup
+from services.pagination import decode_cursor
+from services.metrics import metrics
 
 api_bp = Blueprint('api', __name__)
 
+request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'API request latency (streamed responses until headers are sent)',
+    ('endpoint', 'method', 'status')
+)
+
+HTTP_CLIENT_COUNTERS = ('requests', 'attempts', 'retries', 'failures')
+metrics.register_stats('http_client', 'Pooled DeepSeek HTTP client', http_client.get_metrics,
+                       counters=HTTP_CLIENT_COUNTERS, gauges=('in_flight', 'max_in_flight'))
+metrics.register_callback('http_client_responses_total', 'Pooled DeepSeek HTTP client: responses by status code',
+                          'counter', lambda: http_client.get_metrics()['status_codes'], ('code',))
+if async_http_client is not None:
+    metrics.register_stats('async_http_client', 'Async DeepSeek HTTP client', async_http_client.get_metrics,
+                           counters=HTTP_CLIENT_COUNTERS, gauges=('in_flight', 'max_in_flight'))
+metrics.register_stats('response_cache', 'LLM response cache', deepseek_service.response_cache.get_stats,
+                       counters=('hits', 'misses', 'stores', 'evictions', 'expirations', 'invalidations',
+                                 'saved_tokens'),
+                       gauges=('entries',))
+if chat_service.semantic_cache:
+    metrics.register_stats('semantic_cache', 'Semantic answer cache', chat_service.semantic_cache.get_stats,
+                           counters=('hits', 'misses', 'stores', 'evictions', 'stale_dropped'), gauges=('entries',))
+metrics.register_stats('chat_history_writer', 'Chat history write-behind queue', chat_service.history_writer.get_stats,
+                       counters=('enqueued', 'written', 'batches', 'failed', 'sync_writes'), gauges=('queued',))
+
+@api_bp.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@api_bp.after_request
+def _record_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_duration.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unknown',
+                                 method=request.method, status=response.status_code)
+    return response
+
 @api_bp.route('/chat', methods=['POST'])
 def chat():
     """Handle chat messages"""
@@ -26,8 +68,20 @@ def chat():
         
         user_id = data.get('user_id', 'anonymous')
         
+        # Optional per-request token budget for the knowledge context
+        context_tokens = data.get('context_tokens')
+        context_tokens_error = chat_service.context_tokens_error(context_tokens)
+        if context_tokens_error:
+            return jsonify({
+                'success': False,
+                'error': context_tokens_error
+            }), 400
+        
+        if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+            return _stream_chat(message, user_id, context_tokens)
+        
         # Process the message
-        response = chat_service.process_message(message, user_id)
+        response = chat_service.process_message(message, user_id, context_tokens)
         
         return jsonify(response)
         
@@ -37,12 +91,77 @@ def chat():
             'error': f'Internal server error: {str(e)}'
         }), 500
 
+def _stream_chat(message: str, user_id: str, context_tokens=None) -> Response:
+    """Relay the reply as Server-Sent Events while it is being generated"""
+    def generate():
+        for event, payload in chat_service.stream_message(message, user_id, context_tokens):
+            if event == 'delta':
+                yield f"data: {json.dumps({'delta': payload})}\n\n"
+            else:
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def _page_args(default_limit: int = DEFAULT_PAGE_SIZE):
+    """(limit, cursor) from the query string; raises ValueError when invalid
+
+    Every listing is bounded: ``limit`` defaults to ``default_limit`` and is
+    capped at MAX_PAGE_SIZE.
+    """
+    raw_limit = request.args.get('limit', '').strip()
+    try:
+        limit = int(raw_limit) if raw_limit else default_limit
+    except ValueError:
+        raise ValueError('limit must be a positive integer')
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    cursor = request.args.get('cursor') or None
+    if cursor:
+        decode_cursor(cursor)
+    return min(limit, MAX_PAGE_SIZE), cursor
+
+def _wants_ndjson() -> bool:
+    return request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+def _ndjson_response(rows, headers=None) -> Response:
+    """Stream rows from a generator as newline-delimited JSON"""
+    def generate():
+        for row in rows:
+            yield json.dumps(row, default=str) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers=headers or {})
+
 @api_bp.route('/knowledge', methods=['GET'])
 def get_knowledge():
-    """Get all knowledge base items"""
+    """Get knowledge base items, newest first, one keyset page at a time
+    
+    Pages are ordered on (created_at, id); ``X-Next-Cursor`` carries the
+    ``cursor`` for the next one. ``format=ndjson`` streams the page one
+    item per line instead.
+    """
     try:
-        knowledge_items = knowledge_service.get_all_knowledge()
-        return jsonify(knowledge_items)
+        try:
+            limit, cursor = _page_args()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        headers = {'X-Knowledge-Version': str(knowledge_service.corpus_version)}
+        if _wants_ndjson():
+            return _ndjson_response(knowledge_service.iter_knowledge(cursor, limit), headers)
+        
+        knowledge_items, next_cursor = knowledge_service.list_knowledge_page(limit, cursor)
+        if next_cursor:
+            headers['X-Next-Cursor'] = next_cursor
+        response = jsonify(knowledge_items)
+        response.headers.update(headers)
+        return response
         
     except Exception as e:
         return jsonify({
@@ -74,6 +193,12 @@ def add_knowledge():
         # Add knowledge item
         knowledge_item = knowledge_service.add_knowledge(title, content)
         
+        if not knowledge_item:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to save knowledge item'
+            }), 500
+        
         return jsonify(knowledge_item), 201
         
     except Exception as e:
@@ -82,6 +207,50 @@ def add_knowledge():
             'error': f'Error adding knowledge: {str(e)}'
         }), 500
 
+@api_bp.route('/knowledge/bulk', methods=['POST'])
+def add_knowledge_bulk():
+    """Add many knowledge items from a JSON array or an NDJSON stream"""
+    try:
+        parse_errors = {}
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            items = []
+            for line in request.stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except ValueError as e:
+                    parse_errors[len(items)] = f'Invalid JSON: {e}'
+                    items.append(None)
+        else:
+            items = request.get_json(silent=True)
+            if not isinstance(items, list):
+                return jsonify({
+                    'success': False,
+                    'error': 'Expected a JSON array of items or an NDJSON body'
+                }), 400
+        
+        if not items:
+            return jsonify({
+                'success': False,
+                'error': 'No items to add'
+            }), 400
+        
+        result = knowledge_service.add_knowledge_bulk(items)
+        for failure in result['failures']:
+            if failure['index'] in parse_errors:
+                failure['error'] = parse_errors[failure['index']]
+        
+        # 207: some or all items failed, see 'failures'
+        return jsonify(result), 201 if not result['failed'] else 207
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error adding knowledge: {str(e)}'
+        }), 500
+
 @api_bp.route('/knowledge/<knowledge_id>', methods=['DELETE'])
 def delete_knowledge(knowledge_id):
     """Delete a knowledge item"""
@@ -148,14 +317,26 @@ def search_knowledge():
 
 @api_bp.route('/chat/history/<user_id>', methods=['GET'])
 def get_chat_history(user_id):
-    """Get chat history for a user"""
+    """Get chat history for a user, newest first, one keyset page at a time
+    
+    Pass the returned ``next_cursor`` as ``cursor`` for older turns;
+    ``format=ndjson`` streams the history one turn per line instead.
+    """
     try:
-        limit = request.args.get('limit', 50, type=int)
-        history = chat_service.get_chat_history(user_id, limit)
+        try:
+            limit, cursor = _page_args(default_limit=50)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if _wants_ndjson():
+            return _ndjson_response(chat_service.iter_chat_history(user_id, cursor, limit))
+        
+        history, next_cursor = chat_service.get_chat_history_page(user_id, limit, cursor)
         
         return jsonify({
             'success': True,
-            'history': history
+            'history': history,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -189,5 +370,34 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'message': 'Chatbot API is running'
+        'message': 'Chatbot API is running',
+        'ready': startup.ready,
+        'startup': startup.get_status()
+    })
+
+@api_bp.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'alive'})
+
+@api_bp.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until startup warm-up has finished"""
+    status = startup.get_status()
+    return jsonify(dict(status, status='ready' if status['ready'] else 'starting')), 200 if status['ready'] else 503
+
+@api_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latencies and runtime counters in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api_bp.route('/stats', methods=['GET'])
+def get_stats():
+    """Runtime counters for outbound calls and caches"""
+    return jsonify({
+        'success': True,
+        'http_client': http_client.get_metrics(),
+        'response_cache': deepseek_service.response_cache.get_stats(),
+        'semantic_cache': chat_service.semantic_cache.get_stats() if chat_service.semantic_cache else None,
+        'chat_history_writer': chat_service.history_writer.get_stats()
     })
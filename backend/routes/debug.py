@@ -0,0 +1,135 @@
+import os
+import hmac
+from flask import Blueprint, request, jsonify, Response
+from services.profiler import profiler, memory_tracker
+
+debug_bp = Blueprint('debug', __name__)
+
+GROUP_BY_OPTIONS = ('lineno', 'filename', 'traceback')
+
+@debug_bp.before_request
+def _require_admin():
+    """Debug endpoints only exist when ADMIN_TOKEN is set, and need it on every request"""
+    admin_token = os.getenv('ADMIN_TOKEN', '')
+    if not admin_token:
+        return jsonify({'success': False, 'error': 'Endpoint not found'}), 404
+    supplied = request.headers.get('X-Admin-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        supplied = authorization[len('Bearer '):]
+    if not hmac.compare_digest(supplied.encode(), admin_token.encode()):
+        return jsonify({'success': False, 'error': 'Admin token required'}), 401
+
+def _number_arg(name: str, default, cast=float):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    number = cast(value)
+    if number < 0:
+        raise ValueError(f"{name} must be non-negative")
+    return number
+
+def _group_by() -> str:
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in GROUP_BY_OPTIONS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY_OPTIONS)}")
+    return group_by
+
+@debug_bp.route('/profile', methods=['GET'])
+def profile():
+    """Sample live thread stacks for ?seconds= (collapsed stacks, or ?format=json for a summary)"""
+    try:
+        seconds = _number_arg('seconds', 5.0)
+        interval = _number_arg('interval_ms', 5.0) / 1000
+        limit = _number_arg('limit', 20, int)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        result = profiler.profile(
+            seconds, interval,
+            include_idle=request.args.get('idle', 'false').lower() == 'true',
+            thread_prefix=request.args.get('thread')
+        )
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'success': True,
+            'seconds': result['seconds'],
+            'interval': result['interval'],
+            'samples': result['samples'],
+            'top_functions': profiler.top_functions(result['stacks'], limit)
+        })
+    return Response(profiler.collapsed(result['stacks']), mimetype='text/plain', headers={
+        'X-Profile-Samples': str(result['samples']),
+        'X-Profile-Seconds': str(result['seconds'])
+    })
+
+@debug_bp.route('/memory', methods=['GET'])
+def memory_status():
+    """Tracing state and the snapshots kept for diffing"""
+    return jsonify(dict(memory_tracker.status(), success=True))
+
+@debug_bp.route('/memory/start', methods=['POST'])
+def memory_start():
+    """Start tracemalloc (optionally {"frames": n} per traceback)"""
+    data = request.get_json(silent=True) or {}
+    frames = data.get('frames', 25)
+    if not isinstance(frames, int) or isinstance(frames, bool) or frames < 1:
+        return jsonify({'success': False, 'error': 'frames must be a positive integer'}), 400
+    return jsonify(dict(memory_tracker.start(frames), success=True))
+
+@debug_bp.route('/memory/stop', methods=['POST'])
+def memory_stop():
+    """Stop tracemalloc and drop stored snapshots"""
+    return jsonify(dict(memory_tracker.stop(), success=True))
+
+@debug_bp.route('/memory/snapshots', methods=['POST'])
+def memory_snapshot():
+    """Take a snapshot and return its top allocation sites"""
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = _number_arg('limit', 25, int)
+        group_by = _group_by()
+        snapshot = memory_tracker.snapshot(str(data.get('label', '')))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({
+        'success': True,
+        'snapshot': snapshot,
+        'top': memory_tracker.top(snapshot['id'], limit, group_by)
+    }), 201
+
+@debug_bp.route('/memory/snapshots/<int:snapshot_id>', methods=['GET'])
+def memory_top(snapshot_id):
+    """Top allocation sites of a stored snapshot"""
+    try:
+        top = memory_tracker.top(snapshot_id, _number_arg('limit', 25, int), _group_by())
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except KeyError as e:
+        return jsonify({'success': False, 'error': e.args[0]}), 404
+    return jsonify({'success': True, 'id': snapshot_id, 'top': top})
+
+@debug_bp.route('/memory/diff', methods=['GET'])
+def memory_diff():
+    """Growth between snapshot ?from= and ?to= (default: a new snapshot taken now)"""
+    if 'from' not in request.args:
+        return jsonify({'success': False, 'error': 'from is required'}), 400
+    try:
+        old_id = int(request.args['from'])
+        limit = _number_arg('limit', 25, int)
+        group_by = _group_by()
+        new_id = int(request.args['to']) if 'to' in request.args else memory_tracker.snapshot('diff')['id']
+        diff = memory_tracker.diff(old_id, new_id, limit, group_by)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except KeyError as e:
+        return jsonify({'success': False, 'error': e.args[0]}), 404
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True, 'from': old_id, 'to': new_id, 'diff': diff})
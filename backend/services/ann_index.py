@@ -0,0 +1,344 @@
+import os
+import time
+import threading
+from typing import List, Dict, Tuple, Optional
+from services.logger import get_logger
+
+logger = get_logger('index')
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not available, ANN index disabled")
+
+from services.embedding_store import EmbeddingStore
+
+DEFAULT_ANN_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'index', 'ann', 'ivf.npz')
+
+
+class IVFIndex:
+    """Inverted-file (IVF) approximate nearest-neighbour index over an EmbeddingStore.
+
+    Vectors are clustered with spherical k-means into ``n_lists`` cells. A
+    query is compared against the centroids and only the ``nprobe`` closest
+    cells are scanned, trading recall for latency. Inserts are assigned to
+    their nearest centroid; once inserts since training pass ``retrain_ratio``
+    of the trained size, a background thread retrains the centroids and swaps
+    them in together with the reassigned lists. Searches never train; they
+    keep using the previous centroids until the swap.
+
+    Only the centroids need to survive a restart: ``build`` reassigns every
+    vector from the EmbeddingStore, which persists each insert and delete,
+    so list changes made since the last ``save`` are rebuilt, not lost.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, store: EmbeddingStore, n_lists: Optional[int] = None, nprobe: int = 8,
+                 path: str = DEFAULT_ANN_PATH, retrain_ratio: float = 1.0, kmeans_iterations: int = 10,
+                 seed: int = 42):
+        self.store = store
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.path = path
+        self.retrain_ratio = retrain_ratio
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self._lock = threading.RLock()
+        self.centroids = None
+        self._list_ids: List[List[str]] = []
+        self._list_vectors: List['np.ndarray'] = []
+        self._assignment: Dict[str, Tuple[int, int]] = {}
+        self._trained_size = 0
+        self._inserts_since_training = 0
+        self._retrain_thread: Optional[threading.Thread] = None
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._assignment)
+
+    def _default_n_lists(self, size: int) -> int:
+        return int(min(4096, max(1, round(np.sqrt(size)))))
+
+    def _train(self, vectors: 'np.ndarray') -> 'np.ndarray':
+        """Spherical k-means on (a sample of) the corpus vectors; returns the centroids"""
+        n_lists = min(self.n_lists or self._default_n_lists(len(vectors)), len(vectors))
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), 256 * n_lists)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)] if sample_size < len(vectors) else vectors
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty cells from random points so every list stays useful
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        return centroids
+
+    def _install(self, centroids: 'np.ndarray', ids: List[str], vectors: 'np.ndarray'):
+        """Swap in trained centroids and reassign every vector to them (caller holds the lock)"""
+        self.centroids = centroids
+        self._trained_size = len(ids)
+        self._inserts_since_training = 0
+        self._assign_all(ids, vectors)
+
+    def _assign_all(self, ids: List[str], vectors: 'np.ndarray'):
+        """Place every vector in the list of its nearest centroid"""
+        n_lists = len(self.centroids)
+        labels = np.argmax(vectors @ self.centroids.T, axis=1) if len(vectors) else np.zeros(0, dtype=np.int64)
+        self._list_ids = [[] for _ in range(n_lists)]
+        self._list_vectors = []
+        self._assignment = {}
+        order = np.argsort(labels, kind='stable')
+        boundaries = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        for list_no in range(n_lists):
+            members = order[boundaries[list_no]:boundaries[list_no + 1]]
+            self._list_ids[list_no] = [ids[i] for i in members]
+            self._list_vectors.append(np.ascontiguousarray(vectors[members], dtype=np.float32))
+            for position, item_id in enumerate(self._list_ids[list_no]):
+                self._assignment[item_id] = (list_no, position)
+
+    def _drifted(self, size: int) -> bool:
+        """Whether the corpus has grown or shrunk past ``retrain_ratio`` since training"""
+        return abs(size - self._trained_size) > self.retrain_ratio * max(self._trained_size, 1)
+
+    def build(self, knowledge_items: List[Dict]):
+        """Sync the store and (re)assign the corpus to the inverted lists
+
+        Centroids loaded from disk are reused unless the corpus size has
+        drifted past ``retrain_ratio`` from the size they were trained on.
+        """
+        with self._lock:
+            self.store.build(knowledge_items)
+            ids, vectors = self.store.vectors()
+            if not ids:
+                self.centroids = None
+                self._list_ids, self._list_vectors, self._assignment = [], [], {}
+                return
+            if self.centroids is None or self.centroids.shape[1] != vectors.shape[1] or self._drifted(len(ids)):
+                self._install(self._train(vectors), ids, vectors)
+            else:
+                self._inserts_since_training = max(0, len(ids) - self._trained_size)
+                self._assign_all(ids, vectors)
+            self.save()
+
+    def retrain(self):
+        """Retrain the centroids on the current corpus and reassign every vector
+
+        k-means runs on a snapshot of the vectors without the lock; the new
+        centroids are then installed with lists rebuilt from the store as it
+        is at swap time, so writes made during training are not lost.
+        """
+        ids, vectors = self.store.vectors()
+        if not ids:
+            return
+        centroids = self._train(vectors)
+        with self._lock:
+            ids, vectors = self.store.vectors()
+            if not ids or vectors.shape[1] != centroids.shape[1]:
+                return
+            self._install(centroids, ids, vectors)
+            self.save()
+
+    def _schedule_retrain(self):
+        """Start a background retrain unless one is already running (caller holds the lock)"""
+        if self._retrain_thread is not None and self._retrain_thread.is_alive():
+            return
+        self._retrain_thread = threading.Thread(target=self._retrain_in_background, name='ivf-retrain', daemon=True)
+        self._retrain_thread.start()
+
+    def _retrain_in_background(self):
+        try:
+            self.retrain()
+        except Exception as e:
+            logger.warning("Background IVF retrain failed: %s", e)
+
+    def _remove_from_list(self, item_id: str):
+        location = self._assignment.pop(item_id, None)
+        if location is None:
+            return
+        list_no, position = location
+        ids = self._list_ids[list_no]
+        vectors = self._list_vectors[list_no]
+        last = len(ids) - 1
+        if position != last:
+            # Swap-remove keeps each list contiguous
+            ids[position] = ids[last]
+            vectors[position] = vectors[last]
+            self._assignment[ids[position]] = (list_no, position)
+        ids.pop()
+        self._list_vectors[list_no] = vectors[:last]
+
+    def add(self, item: Dict):
+        """Encode (if needed) and insert a single item"""
+        if item.get('id') is None:
+            return
+        item_id = str(item['id'])
+        with self._lock:
+            self.store.upsert([item])
+            vector = self.store.get_vector(item_id)
+            if vector is None:
+                return
+            if self.centroids is None or self.centroids.shape[1] != vector.shape[0]:
+                self.build([self.store.get_item(i) for i in self.store.vectors()[0]])
+                return
+            is_new = item_id not in self._assignment
+            self._remove_from_list(item_id)
+            list_no = int(np.argmax(self.centroids @ vector))
+            self._list_ids[list_no].append(item_id)
+            self._list_vectors[list_no] = np.vstack([self._list_vectors[list_no], vector[None, :]])
+            self._assignment[item_id] = (list_no, len(self._list_ids[list_no]) - 1)
+            if is_new:
+                # Edits move a vector between lists but do not grow the corpus
+                self._inserts_since_training += 1
+                if self._inserts_since_training > self.retrain_ratio * max(self._trained_size, 1):
+                    self._schedule_retrain()
+
+    def add_many(self, knowledge_items: List[Dict]):
+        """Insert many items, encoding them in one batch"""
+        with self._lock:
+            self.store.upsert(knowledge_items)
+            for item in knowledge_items:
+                self.add(item)
+
+    def update(self, item: Dict):
+        """Re-encode an edited item and move it to its new nearest list"""
+        self.add(item)
+
+    def remove(self, item_id: str):
+        """Delete an item from the lists and the underlying store"""
+        with self._lock:
+            self._remove_from_list(str(item_id))
+            self.store.remove(item_id)
+
+    def _search_vector(self, query_vector: 'np.ndarray', top_k: int, nprobe: int) -> Tuple[List[str], 'np.ndarray']:
+        nprobe = min(nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query_vector
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe] if nprobe < len(centroid_scores) else range(len(centroid_scores))
+
+        candidate_ids: List[str] = []
+        candidate_scores = []
+        for list_no in probe:
+            if self._list_ids[list_no]:
+                candidate_ids.extend(self._list_ids[list_no])
+                candidate_scores.append(self._list_vectors[list_no] @ query_vector)
+        if not candidate_ids:
+            return [], np.zeros(0, dtype=np.float32)
+
+        scores = np.concatenate(candidate_scores)
+        top = np.argpartition(-scores, top_k - 1)[:top_k] if len(scores) > top_k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [candidate_ids[i] for i in top], scores[top]
+
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.0, nprobe: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """Return approximately the top-k items by cosine similarity"""
+        if self.centroids is None:
+            return []
+        query_vector = self.store.encode_query(query)
+        if query_vector.shape[0] != self.centroids.shape[1]:
+            # The encoder changed under us: re-encode the store and retrain on the new vectors
+            self.store.reembed()
+            self.retrain()
+        with self._lock:
+            if self.centroids is None or query_vector.shape[0] != self.centroids.shape[1]:
+                return []
+            ids, scores = self._search_vector(query_vector, top_k, nprobe or self.nprobe)
+            return [(self.store.get_item(item_id), float(score))
+                    for item_id, score in zip(ids, scores) if score >= threshold and self.store.get_item(item_id)]
+
+    def evaluate_recall(self, queries: List[str], top_k: int = 10, nprobe_values: Tuple[int, ...] = (1, 2, 4, 8, 16, 32)) -> List[Dict]:
+        """Report recall@k and mean latency against exact search for each nprobe setting"""
+        with self._lock:
+            if self.centroids is None or not queries:
+                return []
+            query_vectors = [self.store.encode_query(query) for query in queries]
+            all_ids, all_vectors = self.store.vectors()
+
+            exact = []
+            start = time.perf_counter()
+            for query_vector in query_vectors:
+                scores = all_vectors @ query_vector
+                top = np.argpartition(-scores, top_k - 1)[:top_k] if len(scores) > top_k else np.arange(len(scores))
+                exact.append({all_ids[i] for i in top})
+            exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            report = []
+            for nprobe in nprobe_values:
+                hits = 0
+                start = time.perf_counter()
+                results = [self._search_vector(query_vector, top_k, nprobe)[0] for query_vector in query_vectors]
+                elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+                for found, expected in zip(results, exact):
+                    hits += len(expected.intersection(found))
+                report.append({
+                    'nprobe': min(nprobe, len(self.centroids)),
+                    'n_lists': len(self.centroids),
+                    'recall_at_k': hits / max(sum(len(expected) for expected in exact), 1),
+                    'mean_latency_ms': elapsed_ms,
+                    'exact_mean_latency_ms': exact_ms
+                })
+            return report
+
+    def save(self, path: Optional[str] = None):
+        """Serialise centroids and inverted lists to an .npz file"""
+        path = path or self.path
+        with self._lock:
+            if self.centroids is None:
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            sizes = np.array([len(ids) for ids in self._list_ids], dtype=np.int64)
+            ids = [item_id for list_ids in self._list_ids for item_id in list_ids]
+            dim = self.centroids.shape[1]
+            vectors = np.concatenate(self._list_vectors) if ids else np.zeros((0, dim), dtype=np.float32)
+            tmp_path = path + '.tmp.npz'
+            np.savez(
+                tmp_path,
+                format_version=np.array(self.FORMAT_VERSION),
+                centroids=self.centroids,
+                list_sizes=sizes,
+                ids=np.array(ids, dtype=str),
+                vectors=vectors,
+                trained_size=np.array(self._trained_size)
+            )
+            os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """Restore a saved index; returns False when there is nothing usable on disk"""
+        path = path or self.path
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['format_version']) != self.FORMAT_VERSION:
+                    logger.warning("Ignoring ANN index at %s with unsupported format", path)
+                    return False
+                centroids = data['centroids']
+                sizes = data['list_sizes']
+                ids = data['ids'].tolist()
+                vectors = data['vectors']
+                trained_size = int(data['trained_size'])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not load ANN index from %s: %s", path, e)
+            return False
+
+        with self._lock:
+            self.centroids = centroids
+            self._trained_size = trained_size
+            self._inserts_since_training = 0
+            self._list_ids, self._list_vectors, self._assignment = [], [], {}
+            offset = 0
+            for list_no, size in enumerate(sizes):
+                list_ids = ids[offset:offset + size]
+                self._list_ids.append(list_ids)
+                self._list_vectors.append(np.array(vectors[offset:offset + size], dtype=np.float32))
+                for position, item_id in enumerate(list_ids):
+                    self._assignment[item_id] = (list_no, position)
+                offset += size
+        return True
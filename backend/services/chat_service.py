@@ -1,91 +1,359 @@
-from typing import Dict, List, Optional
-from services.deepseek_service import deepseek_service
+from typing import Dict, List, Optional, Iterator, Tuple, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from services.deepseek_service import deepseek_service, FallbackReply, LLMStreamError
 from services.knowledge_service import knowledge_service
 from services.nlp_service import nlp_service
-from config.database import supabase_config
+from services.semantic_cache import SemanticCache
+from services.write_behind import WriteBehindQueue
+from services.pagination import decode_cursor, next_cursor
+from services.storage import storage
+from services.metrics import metrics
+from services.logger import get_logger
+import os
+import time
 import uuid
+import asyncio
+import contextvars
 from datetime import datetime
 
+logger = get_logger('chat')
+stage_timeouts = metrics.counter('chat_stage_timeouts_total', 'Chat pipeline stages that ran past their timeout', ('stage',))
+chat_turns = metrics.counter('chat_turns_total', 'Chat turns by how they were answered', ('outcome',))
+
 class ChatService:
-    def __init__(self):
-        self.supabase = supabase_config.get_client()
+    def __init__(self, storage_backend=None):
+        self.storage = storage_backend or storage
+        self.history_writer = WriteBehindQueue(
+            self._insert_chat_history,
+            name='chat-history-writer',
+            max_batch=int(os.getenv('CHAT_HISTORY_BATCH_SIZE', '50')),
+            flush_interval=float(os.getenv('CHAT_HISTORY_FLUSH_INTERVAL', '1.0')),
+            max_queue=int(os.getenv('CHAT_HISTORY_QUEUE_SIZE', '10000'))
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('CHAT_PIPELINE_WORKERS', '16')),
+            thread_name_prefix='chat-pipeline'
+        )
+        self.stage_timeouts = {
+            'intent': float(os.getenv('CHAT_INTENT_TIMEOUT', '1.0')),
+            'context': float(os.getenv('CHAT_CONTEXT_TIMEOUT', '5.0')),
+            'history': float(os.getenv('CHAT_HISTORY_TIMEOUT', '1.0'))
+        }
+        self.history_turns = int(os.getenv('CHAT_HISTORY_TURNS', '0'))
+        self.semantic_cache = None
+        # The hashed-word fallback is coarse, so only cache by default with a sentence model
+        semantic_default = 'True' if nlp_service.sentence_model_name else 'False'
+        if (os.getenv('SEMANTIC_CACHE_ENABLED') or semantic_default).lower() == 'true':
+            self.semantic_cache = SemanticCache(
+                capacity=int(os.getenv('SEMANTIC_CACHE_SIZE', '1000')),
+                threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9')),
+                embedder=nlp_service.encode_texts if nlp_service.sentence_model_name else None
+            )
+    
+    @staticmethod
+    def context_tokens_error(context_tokens: Any) -> Optional[str]:
+        """Why a per-request context token budget is invalid, or None if it is acceptable"""
+        if context_tokens is None:
+            return None
+        if not isinstance(context_tokens, int) or isinstance(context_tokens, bool) or context_tokens < 0:
+            return 'context_tokens must be a non-negative integer'
+        if context_tokens > knowledge_service.max_context_tokens:
+            return f'context_tokens must not exceed {knowledge_service.max_context_tokens}'
+        return None
+    
+    def _uses_semantic_cache(self, user_id: str, context_tokens: Optional[int]) -> bool:
+        """Whether the reply depends only on the question and the shared knowledge context
+        
+        Prompts that include the user's prior turns, or a context built with a
+        custom token budget, are neither served from nor stored in the cache.
+        """
+        if not self.semantic_cache or context_tokens is not None:
+            return False
+        return self.history_turns <= 0 or user_id == "anonymous"
+    
+    def _cached_answer(self, message: str, user_id: str, context_tokens: Optional[int]) -> Optional[Dict]:
+        """Return a previously answered near-duplicate question, if any"""
+        if not self._uses_semantic_cache(user_id, context_tokens):
+            return None
+        cached = self.semantic_cache.lookup(message, knowledge_service.corpus_version)
+        if cached is None:
+            return None
+        response, similarity = cached
+        return dict(response, cached=True, cache_similarity=similarity)
+    
+    def _recent_turns(self, user_id: str) -> List[Dict]:
+        """Prior turns for the user, oldest first, to give the model conversational context"""
+        if self.history_turns <= 0 or user_id == "anonymous":
+            return []
+        return list(reversed(self.get_chat_history(user_id, self.history_turns)))
+    
+    def _pipeline_stages(self, message: str, user_id: str,
+                         context_tokens: Optional[int] = None) -> Dict[str, Tuple[Callable[[], Any], Any]]:
+        """Independent pre-LLM stages: name -> (callable, default used on timeout or error)"""
+        stages = {
+            'intent': (lambda: nlp_service.analyze_intent(message), {'type': 'unknown', 'confidence': 0.0, 'entities': []}),
+            'context': (lambda: knowledge_service.get_relevant_context(message, context_tokens), ""),
+            'history': (lambda: self._recent_turns(user_id), [])
+        }
+        return {name: (self._timed(name, fn), default) for name, (fn, default) in stages.items()}
+    
+    @staticmethod
+    def _timed(stage: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+        """Wrap a stage so it is timed, and logs under the caller's request id, on the worker thread"""
+        context = contextvars.copy_context()
+        def run():
+            with metrics.span(stage):
+                return context.run(fn)
+        return run
     
-    def process_message(self, message: str, user_id: str = "anonymous") -> Dict:
-        """Process incoming chat message and generate response"""
+    def _gather_inputs(self, message: str, user_id: str, context_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Run intent analysis, context retrieval and history lookup concurrently"""
+        stages = self._pipeline_stages(message, user_id, context_tokens)
+        started = time.monotonic()
+        futures = {name: self.executor.submit(fn) for name, (fn, _) in stages.items()}
+        
+        results = {}
+        for name, future in futures.items():
+            # Every stage's timeout is measured from the start of the fan-out
+            remaining = max(0.0, started + self.stage_timeouts[name] - time.monotonic())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FuturesTimeoutError:
+                future.cancel()
+                stage_timeouts.inc(stage=name)
+                logger.warning("Chat pipeline stage '%s' timed out after %ss", name, self.stage_timeouts[name],
+                               extra={'stage': name})
+                results[name] = stages[name][1]
+            except Exception as e:
+                logger.error("Chat pipeline stage '%s' failed: %s", name, e, extra={'stage': name})
+                results[name] = stages[name][1]
+        return results
+    
+    async def _gather_inputs_async(self, message: str, user_id: str, context_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """asyncio variant of _gather_inputs; stages run on the pipeline executor"""
+        loop = asyncio.get_running_loop()
+        stages = self._pipeline_stages(message, user_id, context_tokens)
+        
+        async def run_stage(name: str):
+            fn, default = stages[name]
+            try:
+                return await asyncio.wait_for(loop.run_in_executor(self.executor, fn), self.stage_timeouts[name])
+            except asyncio.TimeoutError:
+                stage_timeouts.inc(stage=name)
+                logger.warning("Chat pipeline stage '%s' timed out after %ss", name, self.stage_timeouts[name],
+                               extra={'stage': name})
+                return default
+            except Exception as e:
+                logger.error("Chat pipeline stage '%s' failed: %s", name, e, extra={'stage': name})
+                return default
+        
+        values = await asyncio.gather(*(run_stage(name) for name in stages))
+        return dict(zip(stages, values))
+    
+    def _finish(self, user_id: str, message: str, response: str, inputs: Dict[str, Any],
+                context_tokens: Optional[int] = None) -> Dict:
+        """Persist the turn, remember the answer and build the API response
+        
+        Only replies the LLM actually completed are remembered; fallback text
+        from an outage would otherwise be served for every similar question.
+        """
+        completed = not isinstance(response, FallbackReply)
+        chat_turns.inc(outcome='generated' if completed else 'fallback')
+        self._save_chat_history(user_id, message, response)
+        
+        result = {
+            'message': response,
+            'success': True,
+            'intent': inputs['intent'],
+            'context_used': bool(inputs['context'])
+        }
+        if completed and not inputs['history'] and self._uses_semantic_cache(user_id, context_tokens):
+            self.semantic_cache.store(message, result, knowledge_service.corpus_version)
+        return dict(result, cached=False)
+    
+    def _error_response(self, error: Exception) -> Dict:
+        chat_turns.inc(outcome='error')
+        return {
+            'message': 'Sorry, I encountered an error processing your message. Please try again.',
+            'success': False,
+            'error': str(error)
+        }
+    
+    def process_message(self, message: str, user_id: str = "anonymous", context_tokens: Optional[int] = None) -> Dict:
+        """Process incoming chat message and generate response
+        
+        ``context_tokens`` overrides the knowledge context token budget for this request.
+        """
         try:
-            # Analyze user intent
-            intent = nlp_service.analyze_intent(message)
+            cached = self._cached_answer(message, user_id, context_tokens)
+            if cached:
+                chat_turns.inc(outcome='cached')
+                self._save_chat_history(user_id, message, cached['message'])
+                return cached
             
-            # Get relevant context from knowledge base
-            context = knowledge_service.get_relevant_context(message)
+            # Intent, context and prior turns are independent, so fetch them concurrently
+            inputs = self._gather_inputs(message, user_id, context_tokens)
             
             # Generate response using DeepSeek API with context
-            response = deepseek_service.generate_response(message, context)
+            response = deepseek_service.generate_response(
+                message, inputs['context'],
+                cache_version=knowledge_service.corpus_version,
+                history=inputs['history']
+            )
             
-            # Save chat history
-            self._save_chat_history(user_id, message, response)
+            return self._finish(user_id, message, response, inputs, context_tokens)
             
-            return {
-                'message': response,
-                'success': True,
-                'intent': intent,
-                'context_used': bool(context)
-            }
+        except Exception as e:
+            logger.exception("Error processing message: %s", e)
+            return self._error_response(e)
+    
+    async def process_message_async(self, message: str, user_id: str = "anonymous",
+                                    context_tokens: Optional[int] = None) -> Dict:
+        """Coroutine version of process_message; the LLM call does not hold a thread"""
+        try:
+            cached = self._cached_answer(message, user_id, context_tokens)
+            if cached:
+                chat_turns.inc(outcome='cached')
+                self._save_chat_history(user_id, message, cached['message'])
+                return cached
             
+            inputs = await self._gather_inputs_async(message, user_id, context_tokens)
+            response = await deepseek_service.generate_response_async(
+                message, inputs['context'],
+                cache_version=knowledge_service.corpus_version,
+                history=inputs['history']
+            )
+            
+            return self._finish(user_id, message, response, inputs, context_tokens)
+        
         except Exception as e:
-            print(f"Error processing message: {e}")
-            return {
-                'message': 'Sorry, I encountered an error processing your message. Please try again.',
-                'success': False,
-                'error': str(e)
-            }
+            logger.exception("Error processing message: %s", e)
+            return self._error_response(e)
     
-    def _save_chat_history(self, user_id: str, user_message: str, bot_response: str):
-        """Save chat conversation to database"""
+    def stream_message(self, message: str, user_id: str = "anonymous",
+                       context_tokens: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+        """Process a chat message, yielding ('delta', text) events while the reply is generated
+        
+        Ends with a single ('done', metadata) event, or ('error', response) on
+        failure; a reply cut off mid-stream is reported with ``truncated``.
+        Chat history is only saved once the stream has completed, so abandoned
+        and truncated streams are neither persisted nor cached.
+        """
         try:
-            chat_entry = {
-                'id': str(uuid.uuid4()),
-                'user_id': user_id,
-                'user_message': user_message,
-                'bot_response': bot_response,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            cached = self._cached_answer(message, user_id, context_tokens)
+            if cached:
+                chat_turns.inc(outcome='cached')
+                answer = cached.pop('message')
+                yield 'delta', answer
+                self._save_chat_history(user_id, message, answer)
+                yield 'done', cached
+                return
             
-            self.supabase.table('chat_history').insert(chat_entry).execute()
+            inputs = self._gather_inputs(message, user_id, context_tokens)
             
+            parts = []
+            for delta in deepseek_service.stream_response(
+                message, inputs['context'],
+                cache_version=knowledge_service.corpus_version,
+                history=inputs['history']
+            ):
+                parts.append(delta)
+                yield 'delta', delta
+            
+            reply = ''.join(parts).strip()
+            if any(isinstance(part, FallbackReply) for part in parts):
+                reply = FallbackReply(reply)
+            result = self._finish(user_id, message, reply, inputs, context_tokens)
+            result.pop('message')
+            yield 'done', result
+        
+        except LLMStreamError as e:
+            logger.error("Reply stream truncated: %s", e)
+            chat_turns.inc(outcome='truncated')
+            yield 'error', {
+                'message': 'The reply was interrupted before it finished. Please try again.',
+                'success': False,
+                'error': str(e),
+                'truncated': True
+            }
+        
         except Exception as e:
-            print(f"Error saving chat history: {e}")
-            # Continue without saving if database is unavailable
-            pass
+            logger.exception("Error streaming message: %s", e)
+            yield 'error', self._error_response(e)
+    
+    def _save_chat_history(self, user_id: str, user_message: str, bot_response: str):
+        """Queue a chat conversation for the background history writer"""
+        chat_entry = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'user_message': user_message,
+            'bot_response': bot_response,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        
+        with metrics.span('save_history'):
+            self.history_writer.enqueue(chat_entry)
+    
+    def _insert_chat_history(self, rows: List[Dict]):
+        """Write a batch of chat history rows in one multi-row insert"""
+        # Errors are reported by the writer; history is best effort if the database is unavailable
+        self.storage.append_chat_history(rows)
     
     def get_chat_history(self, user_id: str, limit: int = 50) -> List[Dict]:
         """Retrieve chat history for a user"""
+        return self.get_chat_history_page(user_id, limit)[0]
+    
+    def get_chat_history_page(self, user_id: str, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of a user's history, newest first, plus the cursor for the next page
+        
+        Raises ValueError for a malformed cursor.
+        """
+        before = decode_cursor(cursor) if cursor else None
         try:
-            result = self.supabase.table('chat_history')\
-                .select('*')\
-                .eq('user_id', user_id)\
-                .order('timestamp', desc=True)\
-                .limit(limit)\
-                .execute()
-            
-            return result.data if result.data else []
+            rows = self.storage.get_chat_history(user_id, limit, before)
+            rows = self._merge_unwritten(rows, user_id, limit, before)
+            return rows, next_cursor(rows, limit, 'timestamp')
             
         except Exception as e:
-            print(f"Error fetching chat history: {e}")
-            return []
+            logger.error("Error fetching chat history: %s", e)
+            return [], None
+    
+    def _merge_unwritten(self, rows: List[Dict], user_id: str, limit: int,
+                         before: Optional[Tuple[str, str]]) -> List[Dict]:
+        """Add this process's still-queued turns to a stored page, without waiting for a flush"""
+        queued = self.history_writer.pending(
+            lambda row: row['user_id'] == user_id and (before is None or (row['timestamp'], row['id']) < tuple(before))
+        )
+        if not queued:
+            return rows
+        stored_ids = {str(row.get('id')) for row in rows}
+        merged = rows + [row for row in queued if row['id'] not in stored_ids]
+        merged.sort(key=lambda row: (str(row.get('timestamp')), str(row.get('id'))), reverse=True)
+        return merged[:limit]
+    
+    def iter_chat_history(self, user_id: str, cursor: Optional[str] = None, limit: Optional[int] = None,
+                          page_size: int = 200) -> Iterator[Dict]:
+        """Yield a user's history newest first, fetching one keyset page at a time"""
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            rows, cursor = self.get_chat_history_page(user_id, size, cursor)
+            for row in rows:
+                yield row
+            if remaining is not None:
+                remaining -= len(rows)
+            if cursor is None:
+                return
     
     def clear_chat_history(self, user_id: str) -> bool:
         """Clear chat history for a user"""
         try:
-            result = self.supabase.table('chat_history')\
-                .delete()\
-                .eq('user_id', user_id)\
-                .execute()
-            
-            return True
+            # Flush first so queued rows are not inserted after the delete
+            self.history_writer.flush()
+            return self.storage.clear_chat_history(user_id)
             
         except Exception as e:
-            print(f"Error clearing chat history: {e}")
+            logger.error("Error clearing chat history: %s", e)
             return False
 
 chat_service = ChatService()
@@ -0,0 +1,84 @@
+import re
+from typing import List, Dict, Tuple
+
+_SENTENCE_SPAN_PATTERN = re.compile(r'\S.*?(?:[.!?]+(?=\s|$)|$)', re.DOTALL)
+_WORD_SPAN_PATTERN = re.compile(r'\S+')
+
+
+class PassageChunker:
+    """Split knowledge content into overlapping, sentence-aligned passages.
+
+    Sentences are packed into passages of at most ``max_chars`` characters;
+    each passage starts with the trailing sentences of the previous one, up
+    to ``overlap`` characters, so an answer spanning a boundary is still
+    found whole. Sentences longer than ``max_chars`` are split on word
+    boundaries. Every passage records its parent id and its ``start``/``end``
+    character offsets into the parent's ``content``.
+    """
+
+    def __init__(self, max_chars: int = 400, overlap: int = 80):
+        self.max_chars = max(1, max_chars)
+        self.overlap = max(0, min(overlap, self.max_chars // 2))
+
+    def _units(self, text: str) -> List[Tuple[int, int]]:
+        """Sentence spans, with over-long sentences broken into word runs"""
+        units = []
+        for match in _SENTENCE_SPAN_PATTERN.finditer(text):
+            start, end = match.start(), match.end()
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if end - start <= self.max_chars:
+                units.append((start, end))
+                continue
+            run_start = run_end = None
+            for word in _WORD_SPAN_PATTERN.finditer(text, start, end):
+                if run_start is not None and word.end() - run_start > self.max_chars:
+                    units.append((run_start, run_end))
+                    run_start = None
+                if run_start is None:
+                    run_start = word.start()
+                run_end = word.end()
+            if run_start is not None:
+                units.append((run_start, run_end))
+        return units
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """Character spans of the passages for ``text``"""
+        units = self._units(text)
+        spans = []
+        first = 0
+        while first < len(units):
+            last = first
+            while last + 1 < len(units) and units[last + 1][1] - units[first][0] <= self.max_chars:
+                last += 1
+            spans.append((units[first][0], units[last][1]))
+            if last + 1 >= len(units):
+                break
+            # Next passage backs up over whole sentences that fit in the overlap,
+            # as long as it can still take at least one new sentence
+            next_first = last + 1
+            while next_first - 1 > first and units[last][1] - units[next_first - 1][0] <= self.overlap \
+                    and units[last + 1][1] - units[next_first - 1][0] <= self.max_chars:
+                next_first -= 1
+            first = next_first
+        return spans
+
+    def chunk(self, item: Dict) -> List[Dict]:
+        """Passages for one knowledge item"""
+        parent_id = str(item['id'])
+        content = item.get('content', '') or ''
+        spans = self.spans(content) or [(0, len(content))]
+        return [
+            {
+                'id': f"{parent_id}#{position}",
+                'parent_id': parent_id,
+                'title': item.get('title', ''),
+                'content': content[start:end],
+                'start': start,
+                'end': end,
+                'chunk_index': position,
+                'chunk_count': len(spans),
+                'source': item.get('source')
+            }
+            for position, (start, end) in enumerate(spans)
+        ]
@@ -0,0 +1,86 @@
+from typing import List, Dict, Tuple, Callable, Set
+from services.tokenizer import tokenizer
+
+# Tokens taken by the blank line joining two context parts
+SEPARATOR_TOKENS = 2
+
+
+class ContextPacker:
+    """Select retrieved passages for the LLM prompt under a token budget.
+
+    Candidates are deduplicated first: passages of the same document whose
+    spans overlap, and near-identical passages from different documents,
+    keep only their best-scoring copy. Candidates scoring below
+    ``min_relative_score`` of the best hit are dropped so spare budget is
+    not padded with noise. The rest is a 0/1 knapsack: maximise the summed
+    similarity score subject to the rendered passages' token count fitting
+    the budget.
+    """
+
+    def __init__(self, render: Callable[[Dict], str], min_relative_score: float = 0.25,
+                 duplicate_threshold: float = 0.8):
+        self.render = render
+        self.min_relative_score = min_relative_score
+        self.duplicate_threshold = duplicate_threshold
+
+    @staticmethod
+    def _overlaps(a: Dict, b: Dict) -> bool:
+        if a.get('parent_id') is None or a.get('parent_id') != b.get('parent_id'):
+            return False
+        return a.get('start', 0) < b.get('end', 0) and b.get('start', 0) < a.get('end', 0)
+
+    def _is_duplicate(self, terms: Set[str], kept_terms: Set[str]) -> bool:
+        if not terms or not kept_terms:
+            return False
+        return len(terms & kept_terms) / len(terms | kept_terms) >= self.duplicate_threshold
+
+    def deduplicate(self, hits: List[Tuple[Dict, float]]) -> List[Tuple[Dict, float]]:
+        """Drop passages that overlap or nearly repeat a better-scoring one"""
+        kept = []
+        kept_terms = []
+        for passage, score in sorted(hits, key=lambda hit: -hit[1]):
+            terms = set(tokenizer.index_tokens(passage.get('content', '')))
+            if any(self._overlaps(passage, other) or self._is_duplicate(terms, other_terms)
+                   for (other, _), other_terms in zip(kept, kept_terms)):
+                continue
+            kept.append((passage, score))
+            kept_terms.append(terms)
+        return kept
+
+    @staticmethod
+    def _knapsack(weights: List[int], values: List[float], budget: int) -> List[int]:
+        """Indices of the subset with the highest total value whose weights fit the budget"""
+        # Capacity beyond the total weight can never be used
+        budget = min(budget, sum(weights))
+        best = [0.0] * (budget + 1)
+        taken = []
+        for weight, value in zip(weights, values):
+            row = [False] * (budget + 1)
+            for capacity in range(budget, weight - 1, -1):
+                candidate = best[capacity - weight] + value
+                if candidate > best[capacity]:
+                    best[capacity] = candidate
+                    row[capacity] = True
+            taken.append(row)
+
+        chosen = []
+        capacity = budget
+        for index in range(len(weights) - 1, -1, -1):
+            if taken[index][capacity]:
+                chosen.append(index)
+                capacity -= weights[index]
+        return sorted(chosen)
+
+    def pack(self, hits: List[Tuple[Dict, float]], token_budget: int) -> List[Tuple[str, Dict, float]]:
+        """Rendered passages chosen for the budget, best score first, as (text, passage, score)"""
+        hits = [(passage, score) for passage, score in hits if score > 0]
+        if not hits or token_budget <= 0:
+            return []
+        hits = self.deduplicate(hits)
+        floor = hits[0][1] * self.min_relative_score
+        candidates = [(self.render(passage), passage, score) for passage, score in hits if score >= floor]
+
+        weights = [tokenizer.count_tokens(text) + SEPARATOR_TOKENS for text, _, _ in candidates]
+        fitting = [i for i, weight in enumerate(weights) if weight <= token_budget]
+        chosen = self._knapsack([weights[i] for i in fitting], [candidates[i][2] for i in fitting], token_budget)
+        return [candidates[fitting[i]] for i in chosen]
@@ -1,87 +1,260 @@
 import os
-import requests
 import json
-from typing import Dict, Any, Optional
+import time
+import asyncio
+from typing import Dict, Any, Optional, Iterator, List
 from dotenv import load_dotenv
+from services.http_client import http_client, async_http_client
+from services.response_cache import ResponseCache
+from services.metrics import metrics
+from services.logger import get_logger
 
 load_dotenv()
 
+logger = get_logger('llm')
+llm_fallbacks = metrics.counter('llm_fallbacks_total', 'Replies served by the keyword fallback instead of the LLM')
+
+
+class FallbackReply(str):
+    """Canned reply used when the LLM could not answer; never cache it as an answer"""
+
+
+class LLMStreamError(Exception):
+    """A streamed reply broke off after some tokens were sent; ``partial`` is the text received"""
+
+    def __init__(self, message: str, partial: str = ''):
+        super().__init__(message)
+        self.partial = partial
+
+
 class DeepSeekService:
     def __init__(self):
         self.api_key = os.getenv('DEEPSEEK_API_KEY')
-<<<<<<< HEAD
         self.base_url = os.getenv('DEEPSEEK_BASE_URL', 'https://openrouter.ai/api/v1')
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json',
             'HTTP-Referer': 'http://localhost:3000',  # Optional, can be changed
             'X-Title': 'Cybersecurity Chatbot'  # Optional, can be changed
-=======
-        self.base_url = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
-        self.headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
->>>>>>> daf97b202766d82f427622fa997fdfa044882444
         }
+        self.temperature = float(os.getenv('DEEPSEEK_TEMPERATURE', '0.7'))
+        self.response_cache = ResponseCache(
+            max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '512')),
+            ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+        )
+    
+    def _is_configured(self) -> bool:
+        return bool(self.api_key) and self.api_key != 'your_deepseek_api_key_here'
+    
+    def _build_payload(self, prompt: str, context: str = "", stream: bool = False,
+                       history: Optional[List[Dict]] = None, max_tokens: int = 500) -> Dict[str, Any]:
+        """Build the chat-completions request body
+        
+        ``history`` holds prior turns (oldest first) as chat_history rows.
+        """
+        # Combine context and prompt
+        full_prompt = f"Context: {context}\n\nUser: {prompt}\n\nAssistant:" if context else f"User: {prompt}\n\nAssistant:"
+        
+        payload = {
+            "model": "deepseek/deepseek-chat-v3-0324:free",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a helpful AI assistant. Use the provided context to answer questions accurately and helpfully."
+                },
+                {
+                    "role": "user",
+                    "content": full_prompt
+                }
+            ],
+            "max_tokens": max_tokens,
+            "temperature": self.temperature
+        }
+        if history:
+            turns = []
+            for turn in history:
+                turns.append({"role": "user", "content": turn.get('user_message', '')})
+                turns.append({"role": "assistant", "content": turn.get('bot_response', '')})
+            payload["messages"][1:1] = turns
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    def _cache_key(self, prompt: str, context: str, history: Optional[List[Dict]] = None, max_tokens: int = 500) -> str:
+        payload = self._build_payload('', '', history=history, max_tokens=max_tokens)
+        # Everything that shapes the completion except the final user turn, which prompt/context cover
+        params = {key: value for key, value in payload.items() if key != 'messages'}
+        params['messages'] = payload['messages'][:-1]
+        return self.response_cache.make_key(prompt, context, params)
     
-    def generate_response(self, prompt: str, context: str = "", max_tokens: int = 500) -> Optional[str]:
-        """Generate response using DeepSeek API"""
-        if not self.api_key or self.api_key == 'your_deepseek_api_key_here':
+    def generate_response(self, prompt: str, context: str = "", max_tokens: int = 500,
+                          cache_version: Optional[int] = None, history: Optional[List[Dict]] = None) -> Optional[str]:
+        """Generate response using DeepSeek API
+        
+        Successful completions are cached; ``cache_version`` is the knowledge
+        corpus version the context came from and invalidates older entries.
+        When the API is unavailable or fails the reply is a FallbackReply.
+        """
+        if not self._is_configured():
             # Fallback response when API key is not configured
             return self._generate_fallback_response(prompt, context)
         
+        cache_key = self._cache_key(prompt, context, history, max_tokens)
+        cached = self.response_cache.get(cache_key, cache_version)
+        if cached is not None:
+            return cached
+        
         try:
-            # Combine context and prompt
-            full_prompt = f"Context: {context}\n\nUser: {prompt}\n\nAssistant:" if context else f"User: {prompt}\n\nAssistant:"
-            
-            payload = {
-<<<<<<< HEAD
-                "model": "deepseek/deepseek-chat-v3-0324:free",
-=======
-                "model": "deepseek-chat",
->>>>>>> daf97b202766d82f427622fa997fdfa044882444
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are a helpful AI assistant. Use the provided context to answer questions accurately and helpfully."
-                    },
-                    {
-                        "role": "user",
-                        "content": full_prompt
-                    }
-<<<<<<< HEAD
-                ]
-            }
+            payload = self._build_payload(prompt, context, history=history, max_tokens=max_tokens)
             
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-=======
-                ],
-                "max_tokens": max_tokens,
-                "temperature": 0.7
-            }
+            started = time.perf_counter()
+            with metrics.span('llm'):
+                response = http_client.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=self.headers,
+                    json=payload
+                )
             
-            response = requests.post(
-                f"{self.base_url}/v1/chat/completions",
->>>>>>> daf97b202766d82f427622fa997fdfa044882444
-                headers=self.headers,
-                json=payload,
-                timeout=30
+            if response.status_code == 200:
+                result = response.json()
+                content = result['choices'][0]['message']['content'].strip()
+                self.response_cache.put(
+                    cache_key, content, cache_version,
+                    latency=time.perf_counter() - started,
+                    tokens=(result.get('usage') or {}).get('total_tokens', 0)
+                )
+                return content
+            else:
+                logger.error("DeepSeek API error: %s - %s", response.status_code, response.text, extra={'status_code': response.status_code})
+                return self._generate_fallback_response(prompt, context)
+                
+        except Exception as e:
+            logger.error("Error calling DeepSeek API: %s", e)
+            return self._generate_fallback_response(prompt, context)
+    
+    async def generate_response_async(self, prompt: str, context: str = "", cache_version: Optional[int] = None,
+                                      history: Optional[List[Dict]] = None, max_tokens: int = 500) -> str:
+        """Non-blocking variant of generate_response for the ASGI entry point"""
+        if not self._is_configured():
+            return self._generate_fallback_response(prompt, context)
+        
+        cache_key = self._cache_key(prompt, context, history, max_tokens)
+        cached = self.response_cache.get(cache_key, cache_version)
+        if cached is not None:
+            return cached
+        
+        if async_http_client is None:
+            # No async HTTP library installed: fall back to the pooled sync client off-loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, lambda: self.generate_response(prompt, context, max_tokens, cache_version=cache_version,
+                                                     history=history)
             )
+        
+        try:
+            started = time.perf_counter()
+            with metrics.span('llm'):
+                response = await async_http_client.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=self.headers,
+                    json=self._build_payload(prompt, context, history=history, max_tokens=max_tokens)
+                )
             
             if response.status_code == 200:
                 result = response.json()
-                return result['choices'][0]['message']['content'].strip()
+                content = result['choices'][0]['message']['content'].strip()
+                self.response_cache.put(
+                    cache_key, content, cache_version,
+                    latency=time.perf_counter() - started,
+                    tokens=(result.get('usage') or {}).get('total_tokens', 0)
+                )
+                return content
             else:
-                print(f"DeepSeek API error: {response.status_code} - {response.text}")
+                logger.error("DeepSeek API error: %s - %s", response.status_code, response.text, extra={'status_code': response.status_code})
                 return self._generate_fallback_response(prompt, context)
-                
+        
         except Exception as e:
-            print(f"Error calling DeepSeek API: {str(e)}")
+            logger.error("Error calling DeepSeek API: %s", e)
             return self._generate_fallback_response(prompt, context)
     
-    def _generate_fallback_response(self, prompt: str, context: str = "") -> str:
+    def stream_response(self, prompt: str, context: str = "", cache_version: Optional[int] = None,
+                        history: Optional[List[Dict]] = None, max_tokens: int = 500) -> Iterator[str]:
+        """Yield response text deltas as the DeepSeek API generates them
+        
+        Falls back to a single fallback chunk when the API is unavailable or
+        fails before any token has been produced. A cached completion is
+        replayed as one chunk; fully streamed completions are cached. Raises
+        LLMStreamError if the stream breaks off after tokens were yielded.
+        """
+        if not self._is_configured():
+            yield self._generate_fallback_response(prompt, context)
+            return
+        
+        cache_key = self._cache_key(prompt, context, history, max_tokens)
+        cached = self.response_cache.get(cache_key, cache_version)
+        if cached is not None:
+            yield cached
+            return
+        
+        produced = False
+        completed = False
+        parts = []
+        try:
+            started = time.perf_counter()
+            response = http_client.post(
+                f"{self.base_url}/chat/completions",
+                headers=dict(self.headers, Accept='text/event-stream'),
+                json=self._build_payload(prompt, context, stream=True, history=history, max_tokens=max_tokens),
+                stream=True
+            )
+            
+            with response:
+                if response.status_code != 200:
+                    logger.error("DeepSeek API error: %s - %s", response.status_code, response.text, extra={'status_code': response.status_code})
+                    yield self._generate_fallback_response(prompt, context)
+                    return
+                
+                for line in response.iter_lines(decode_unicode=True):
+                    # SSE frames look like "data: {...}"; blank lines and ": keep-alive" comments are skipped
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        completed = True
+                        metrics.stage_duration.observe(time.perf_counter() - started, stage='llm_stream')
+                        self.response_cache.put(
+                            cache_key, ''.join(parts).strip(), cache_version,
+                            latency=time.perf_counter() - started
+                        )
+                        break
+                    chunk = json.loads(data)
+                    choices = chunk.get('choices') or [{}]
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if delta:
+                        if not produced:
+                            metrics.stage_duration.observe(time.perf_counter() - started, stage='llm_first_token')
+                        produced = True
+                        parts.append(delta)
+                        yield delta
+        
+        except Exception as e:
+            logger.error("Error streaming from DeepSeek API: %s", e)
+            if produced:
+                raise LLMStreamError(f"Reply stream interrupted: {e}", ''.join(parts)) from e
+            yield self._generate_fallback_response(prompt, context)
+            return
+        
+        if produced and not completed:
+            logger.error("DeepSeek API stream ended before completion")
+            raise LLMStreamError("Reply stream ended before completion", ''.join(parts))
+    
+    def _generate_fallback_response(self, prompt: str, context: str = "") -> FallbackReply:
         """Generate a fallback response when DeepSeek API is not available"""
+        llm_fallbacks.inc()
+        return FallbackReply(self._fallback_text(prompt, context))
+    
+    @staticmethod
+    def _fallback_text(prompt: str, context: str) -> str:
         prompt_lower = prompt.lower()
         
         # Simple keyword-based responses
@@ -0,0 +1,444 @@
+import os
+import json
+import hashlib
+import threading
+from typing import List, Dict, Tuple, Optional, Callable
+from services.logger import get_logger
+
+logger = get_logger('index')
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not available, embedding store disabled")
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+DEFAULT_EMBEDDING_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'index', 'embeddings')
+
+
+class EmbeddingStore:
+    """Precomputed, memory-mapped sentence embeddings keyed by item id.
+
+    Vectors are L2-normalised float32 rows of ``embeddings.npy``, opened with
+    ``mmap_mode`` so the OS pages them in on demand. ``embeddings_ids.json``
+    maps item ids to rows and records a content hash, so only new or edited
+    items are ever encoded. A query is a single matrix-vector product.
+
+    The id table also records the ``model`` that produced the vectors; a
+    store written by another model (or whose vectors no longer match the
+    encoder's dimension) is discarded and re-encoded. Single changes are
+    appended to ``embeddings_ids.log`` and folded into the table on
+    ``build`` or once the log outgrows it.
+
+    The files have a single writer: the process holding the lock on
+    ``.writer``. Other processes on the same directory (and children forked
+    from the writer) map the matrix copy-on-write and keep their own changes
+    in memory. Use the shared index to serve many workers from one store.
+    """
+
+    MATRIX_FILE = 'embeddings.npy'
+    ID_TABLE_FILE = 'embeddings_ids.json'
+    JOURNAL_FILE = 'embeddings_ids.log'
+    WRITER_LOCK_FILE = '.writer'
+    MIN_JOURNAL_ENTRIES = 256
+
+    def __init__(self, encoder: Callable[[List[str]], 'np.ndarray'], directory: str = DEFAULT_EMBEDDING_DIR,
+                 initial_capacity: int = 1024, model: Optional[str] = None):
+        self.encoder = encoder
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self.model = model or ''
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._dim = 0
+        self._rows: Dict[str, int] = {}
+        self._hashes: Dict[str, str] = {}
+        self._free_rows: List[int] = []
+        self._next_row = 0
+        self._row_ids: Dict[int, str] = {}
+        self._live = None
+        self._items: Dict[str, Dict] = {}
+        self._generation = 0
+        # Entries appended since the table was last written; None until the table is current
+        self._journal_size: Optional[int] = None
+        self._writer_file = None
+        self._writer_pid: Optional[int] = None
+        self._acquire_writer_lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def matrix_path(self) -> str:
+        return os.path.join(self.directory, self.MATRIX_FILE)
+
+    @property
+    def id_table_path(self) -> str:
+        return os.path.join(self.directory, self.ID_TABLE_FILE)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.directory, self.JOURNAL_FILE)
+
+    def _acquire_writer_lock(self):
+        """Become the process that writes the files, unless another one already is"""
+        self._writer_pid = os.getpid()
+        if not FCNTL_AVAILABLE:
+            # No cross-process locking: run one process per directory
+            self._writer_file = True
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            writer_file = open(os.path.join(self.directory, self.WRITER_LOCK_FILE), 'a+')
+        except OSError as e:
+            logger.warning("Could not open embedding store lock in %s: %s", self.directory, e)
+            return
+        try:
+            fcntl.flock(writer_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            writer_file.close()
+            logger.info("Embedding store %s is written by another process; keeping changes in memory",
+                        self.directory)
+            return
+        self._writer_file = writer_file
+
+    def owns_files(self) -> bool:
+        """Whether this process writes the store's files"""
+        return self._writer_file is not None and self._writer_pid == os.getpid()
+
+    def _make_private(self):
+        """Detach an inherited writable mapping before a non-writer changes a row"""
+        if self._matrix is not None and getattr(self._matrix, 'mode', None) == 'r+' and not self.owns_files():
+            self._matrix = np.array(self._matrix)
+
+    def _flush(self):
+        if self._matrix is not None and self.owns_files():
+            self._matrix.flush()
+
+    @staticmethod
+    def _document_text(item: Dict) -> str:
+        return f"{item.get('title', '')} {item.get('content', '')}".strip()
+
+    @staticmethod
+    def _content_hash(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _load(self):
+        """Map an existing store from disk, if there is one"""
+        if not os.path.exists(self.matrix_path) or not os.path.exists(self.id_table_path):
+            return
+        try:
+            with open(self.id_table_path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            if table.get('model', '') != self.model:
+                logger.info("Embedding store was built with model %r, re-encoding for %r",
+                            table.get('model', ''), self.model)
+                return
+            self._matrix = np.load(self.matrix_path, mmap_mode='r+' if self.owns_files() else 'c')
+            self._dim = self._matrix.shape[1]
+            self._rows = {item_id: entry['row'] for item_id, entry in table['items'].items()}
+            self._hashes = {item_id: entry['hash'] for item_id, entry in table['items'].items()}
+            self._next_row = table['next_row']
+            self._generation = table.get('generation', 0)
+            self._journal_size = self._replay_journal()
+            used_rows = set(self._rows.values())
+            self._next_row = max([self._next_row] + [row + 1 for row in used_rows])
+            self._free_rows = [row for row in range(self._next_row) if row not in used_rows]
+            self._row_ids = {row: item_id for item_id, row in self._rows.items()}
+            # Rows only become searchable once the corpus confirms them via build/upsert
+            self._live = np.zeros(self._matrix.shape[0], dtype=bool)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not load embedding store from %s: %s", self.directory, e)
+            self._reset()
+
+    def _replay_journal(self) -> Optional[int]:
+        """Apply changes logged since the id table was written; None if the log belongs to another table"""
+        if not os.path.exists(self.journal_path):
+            return None
+        applied = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return None
+        if header.get('generation') != self._generation:
+            return None
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A torn final line from an interrupted append
+                break
+            if entry['row'] is None:
+                self._rows.pop(entry['id'], None)
+                self._hashes.pop(entry['id'], None)
+            else:
+                self._rows[entry['id']] = entry['row']
+                self._hashes[entry['id']] = entry['hash']
+            applied += 1
+        return applied
+
+    def _reset(self):
+        """Forget every vector; the files are replaced on the next write"""
+        self._matrix = None
+        self._dim = 0
+        self._rows = {}
+        self._hashes = {}
+        self._next_row = 0
+        self._free_rows = []
+        self._row_ids = {}
+        self._live = None
+        self._journal_size = None
+
+    def _save_id_table(self):
+        """Write the full id table and start an empty journal for it"""
+        if not self.owns_files():
+            return
+        self._generation += 1
+        table = {
+            'model': self.model,
+            'dim': self._dim,
+            'generation': self._generation,
+            'next_row': self._next_row,
+            'items': {item_id: {'row': row, 'hash': self._hashes[item_id]} for item_id, row in self._rows.items()}
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.id_table_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(table, f)
+        os.replace(tmp_path, self.id_table_path)
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'generation': self._generation}) + '\n')
+        os.replace(tmp_path, self.journal_path)
+        self._journal_size = 0
+
+    def _persist(self, item_ids: List[str]):
+        """Append the rows of changed items to the journal, compacting when it outgrows the table"""
+        if not self.owns_files():
+            return
+        if self._journal_size is None or \
+                self._journal_size + len(item_ids) > max(self.MIN_JOURNAL_ENTRIES, len(self._rows)):
+            self._save_id_table()
+            return
+        entries = [{'id': item_id, 'row': self._rows.get(item_id), 'hash': self._hashes.get(item_id)}
+                   for item_id in item_ids]
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+        self._journal_size += len(entries)
+
+    def _ensure_capacity(self, rows_needed: int, dim: int):
+        """Create or grow the memory-mapped matrix, doubling its capacity"""
+        if self._matrix is not None and self._dim != dim:
+            raise ValueError(f"Embedding dimension changed from {self._dim} to {dim}")
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows_needed <= capacity:
+            return
+
+        new_capacity = max(self.initial_capacity, capacity)
+        while new_capacity < rows_needed:
+            new_capacity *= 2
+
+        if not self.owns_files():
+            grown = np.zeros((new_capacity, dim), dtype=np.float32)
+            if self._matrix is not None:
+                grown[:capacity] = self._matrix
+            self._matrix = grown
+        else:
+            self._grow_file(capacity, new_capacity, dim)
+        self._dim = dim
+        live = np.zeros(new_capacity, dtype=bool)
+        if self._live is not None:
+            live[:capacity] = self._live
+        self._live = live
+
+    def _grow_file(self, capacity: int, new_capacity: int, dim: int):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.matrix_path + '.tmp.npy'
+        grown = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(new_capacity, dim))
+        if self._matrix is not None:
+            grown[:capacity] = self._matrix
+        grown.flush()
+        del grown
+        self._matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self._matrix = np.load(self.matrix_path, mmap_mode='r+')
+
+    def _encode(self, texts: List[str]) -> 'np.ndarray':
+        vectors = np.asarray(self.encoder(texts), dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _allocate_row(self, item_id: str) -> int:
+        if item_id in self._rows:
+            return self._rows[item_id]
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = self._next_row
+        self._next_row += 1
+        return row
+
+    def upsert(self, knowledge_items: List[Dict]):
+        """Encode and store the items whose content is new or has changed"""
+        with self._lock:
+            changed = self._upsert(knowledge_items)
+            if changed:
+                self._flush()
+                self._persist(changed)
+
+    def _upsert(self, knowledge_items: List[Dict]) -> List[str]:
+        with self._lock:
+            pending = {}
+            for item in knowledge_items:
+                if item.get('id') is None:
+                    continue
+                item_id = str(item['id'])
+                self._items[item_id] = item
+                text = self._document_text(item)
+                content_hash = self._content_hash(text)
+                if self._hashes.get(item_id) != content_hash:
+                    pending[item_id] = (item_id, text, content_hash)
+                else:
+                    self._live[self._rows[item_id]] = True
+
+            if not pending:
+                return []
+
+            pending = list(pending.values())
+            vectors = self._encode([text for _, text, _ in pending])
+            if self._matrix is not None and vectors.shape[1] != self._dim:
+                logger.warning("Embedding dimension changed from %d to %d, re-encoding %d items",
+                               self._dim, vectors.shape[1], len(self._items))
+                self._reset()
+                texts = {item_id: self._document_text(item) for item_id, item in self._items.items()}
+                pending = [(item_id, text, self._content_hash(text)) for item_id, text in texts.items()]
+                vectors = self._encode([text for _, text, _ in pending])
+            rows = [self._allocate_row(item_id) for item_id, _, _ in pending]
+            self._make_private()
+            self._ensure_capacity(max(rows) + 1, vectors.shape[1])
+            for (item_id, _, content_hash), row, vector in zip(pending, rows, vectors):
+                # Edited items are overwritten in place; new items take a free or fresh row
+                self._matrix[row] = vector
+                self._rows[item_id] = row
+                self._row_ids[row] = item_id
+                self._hashes[item_id] = content_hash
+                self._live[row] = True
+            return [item_id for item_id, _, _ in pending]
+
+    def reembed(self):
+        """Drop every stored vector and encode the known items again"""
+        with self._lock:
+            items = list(self._items.values())
+            self._reset()
+            if self._upsert(items):
+                self._flush()
+            self._save_id_table()
+
+    def build(self, knowledge_items: List[Dict]):
+        """Sync the store with the corpus, encoding only what is missing or stale"""
+        with self._lock:
+            current_ids = {str(item['id']) for item in knowledge_items if item.get('id') is not None}
+            for item_id in [item_id for item_id in self._rows if item_id not in current_ids]:
+                self._release(item_id)
+            self._items = {}
+            self._upsert(knowledge_items)
+            self._flush()
+            self._save_id_table()
+
+    def add(self, item: Dict):
+        """Encode a single new item and append it"""
+        self.upsert([item])
+
+    def add_many(self, knowledge_items: List[Dict]):
+        """Encode new items in one batch"""
+        self.upsert(knowledge_items)
+
+    def update(self, item: Dict):
+        """Re-encode an edited item in place"""
+        self.upsert([item])
+
+    def _release(self, item_id: str):
+        row = self._rows.pop(item_id, None)
+        self._hashes.pop(item_id, None)
+        self._items.pop(item_id, None)
+        if row is not None:
+            self._make_private()
+            self._matrix[row] = 0.0
+            self._live[row] = False
+            self._row_ids.pop(row, None)
+            self._free_rows.append(row)
+
+    def remove(self, item_id: str):
+        """Drop an item; its row is zeroed and reused by later inserts"""
+        with self._lock:
+            if str(item_id) in self._rows:
+                self._release(str(item_id))
+                self._flush()
+                self._persist([str(item_id)])
+
+    def vectors(self) -> Tuple[List[str], 'np.ndarray']:
+        """Return the live item ids and a copy of their vectors"""
+        with self._lock:
+            if self._matrix is None:
+                return [], np.zeros((0, self._dim), dtype=np.float32)
+            rows = np.flatnonzero(self._live[:self._next_row])
+            return [self._row_ids[row] for row in rows], np.asarray(self._matrix[rows])
+
+    def get_vector(self, item_id: str) -> Optional['np.ndarray']:
+        """Return a copy of the stored vector for an item, if present"""
+        with self._lock:
+            row = self._rows.get(str(item_id))
+            return None if row is None else np.array(self._matrix[row])
+
+    def get_item(self, item_id: str) -> Optional[Dict]:
+        """Return the knowledge item for an id known to the store"""
+        return self._items.get(str(item_id))
+
+    def encode_query(self, query: str) -> 'np.ndarray':
+        """Encode and normalise a query vector"""
+        return self._encode([query])[0]
+
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.0) -> List[Tuple[Dict, float]]:
+        """Return the top-k items by cosine similarity to the query"""
+        if self._matrix is None or not self._rows:
+            return []
+        # Encode without the lock, so a slow model does not stall writers and other searches
+        query_vector = self.encode_query(query)
+        with self._lock:
+            if self._matrix is not None and query_vector.shape[0] != self._dim:
+                logger.warning("Query dimension %d does not match stored %d, re-encoding the store",
+                               query_vector.shape[0], self._dim)
+                self.reembed()
+            if self._matrix is None:
+                return []
+            # A view of the rows plus a copy of the live flags; rows edited meanwhile score either version
+            matrix = self._matrix[:self._next_row]
+            live = self._live[:self._next_row].copy()
+        similarities = matrix @ query_vector
+        similarities[~live] = -np.inf
+        candidates = np.flatnonzero(similarities >= threshold)
+        if candidates.size == 0:
+            return []
+        if candidates.size > top_k:
+            candidates = candidates[np.argpartition(-similarities[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-similarities[candidates], kind='stable')]
+        with self._lock:
+            # Drop rows removed while scoring
+            hits = []
+            for row in candidates:
+                item = self._items.get(self._row_ids.get(int(row), ''))
+                if item is not None and self._live[row]:
+                    hits.append((item, float(similarities[row])))
+            return hits
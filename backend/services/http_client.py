@@ -0,0 +1,238 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+load_dotenv()
+
+
+def backoff_delay(attempt: int, base: float, maximum: float, status_code: Optional[int] = None,
+                  retry_after: str = '') -> float:
+    """Jittered exponential backoff, honouring Retry-After on 429"""
+    if status_code == 429 and retry_after.isdigit():
+        return min(float(retry_after), maximum)
+    # Full jitter: uniform in [0, base * 2^attempt]
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+class PooledHttpClient:
+    """Shared keep-alive HTTP client with a bounded connection pool.
+
+    Requests reuse TCP/TLS connections through one ``requests.Session``. The
+    pool is capped at ``pool_size`` connections per host and blocks rather
+    than opening extra sockets. Failures to connect and retryable statuses
+    are retried with jittered exponential backoff. Errors after the request
+    was sent (resets, read timeouts) are not: the upstream may already be
+    generating, and a POST is not safe to repeat.
+    """
+
+    RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 3.05, read_timeout: float = 30.0,
+                 max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.pool_size = pool_size
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._metrics = {
+            'requests': 0,
+            'attempts': 0,
+            'retries': 0,
+            'failures': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+            'status_codes': {}
+        }
+
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def _backoff_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        if response is None:
+            return backoff_delay(attempt, self.backoff_base, self.backoff_max)
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max,
+                             response.status_code, response.headers.get('Retry-After', ''))
+
+    @staticmethod
+    def _never_sent(error: requests.exceptions.ConnectionError) -> bool:
+        """True if the request failed while connecting, so the server never saw it"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        # requests wraps urllib3's MaxRetryError, whose ``reason`` is the underlying error
+        wrapped = error.args[0] if error.args else None
+        return isinstance(getattr(wrapped, 'reason', wrapped), NewConnectionError) or \
+            isinstance(error.__cause__, NewConnectionError)
+
+    def _track(self, key: str, amount: int = 1):
+        with self._lock:
+            self._metrics[key] += amount
+            if key == 'in_flight':
+                self._metrics['max_in_flight'] = max(self._metrics['max_in_flight'], self._metrics['in_flight'])
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the pool, retrying transient failures"""
+        kwargs.setdefault('timeout', self.timeout)
+        self._track('requests')
+        self._track('in_flight')
+        try:
+            attempt = 0
+            while True:
+                self._track('attempts')
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.exceptions.ConnectionError as e:
+                    if attempt >= self.max_retries or not self._never_sent(e):
+                        self._track('failures')
+                        raise
+                    delay = self._backoff_delay(attempt)
+                else:
+                    with self._lock:
+                        codes = self._metrics['status_codes']
+                        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+                    if response.status_code not in self.RETRYABLE_STATUSES or attempt >= self.max_retries:
+                        if response.status_code >= 400:
+                            self._track('failures')
+                        return response
+                    delay = self._backoff_delay(attempt, response)
+                    # Release the connection back to the pool before sleeping
+                    response.close()
+
+                attempt += 1
+                self._track('retries')
+                time.sleep(delay)
+        finally:
+            self._track('in_flight', -1)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return request counters and per-host pool usage"""
+        with self._lock:
+            metrics = dict(self._metrics, status_codes=dict(self._metrics['status_codes']))
+
+        pools = {}
+        pool_manager = self.adapter.poolmanager
+        for key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(key)
+            if pool is None:
+                continue
+            # The LIFO queue is pre-filled with None placeholders for unopened slots
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'max_size': self.pool_size,
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests,
+                'idle': idle
+            }
+        metrics['pool'] = pools
+        return metrics
+
+
+class AsyncPooledHttpClient:
+    """asyncio counterpart of PooledHttpClient built on ``httpx.AsyncClient``.
+
+    Lets one event loop keep many LLM calls in flight without a thread each.
+    Applies the same pool bound, timeouts and retry policy; the underlying
+    client is created lazily inside the running loop.
+    """
+
+    RETRYABLE_STATUSES = PooledHttpClient.RETRYABLE_STATUSES
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 3.05, read_timeout: float = 30.0,
+                 max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = None
+        self._metrics = {'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'in_flight': 0, 'max_in_flight': 0}
+
+    def _get_client(self) -> 'httpx.AsyncClient':
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+            )
+        return self._client
+
+    async def request(self, method: str, url: str, **kwargs) -> 'httpx.Response':
+        """Send a request through the async pool, retrying transient failures"""
+        client = self._get_client()
+        metrics = self._metrics
+        metrics['requests'] += 1
+        metrics['in_flight'] += 1
+        metrics['max_in_flight'] = max(metrics['max_in_flight'], metrics['in_flight'])
+        try:
+            attempt = 0
+            while True:
+                metrics['attempts'] += 1
+                try:
+                    response = await client.request(method, url, **kwargs)
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    if attempt >= self.max_retries:
+                        metrics['failures'] += 1
+                        raise
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                else:
+                    if response.status_code not in self.RETRYABLE_STATUSES or attempt >= self.max_retries:
+                        if response.status_code >= 400:
+                            metrics['failures'] += 1
+                        return response
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_max,
+                                          response.status_code, response.headers.get('Retry-After', ''))
+                    await response.aclose()
+
+                attempt += 1
+                metrics['retries'] += 1
+                await asyncio.sleep(delay)
+        finally:
+            metrics['in_flight'] -= 1
+
+    async def post(self, url: str, **kwargs) -> 'httpx.Response':
+        return await self.request('POST', url, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return dict(self._metrics, max_size=self.pool_size)
+
+
+http_client = PooledHttpClient(
+    pool_size=int(os.getenv('DEEPSEEK_POOL_SIZE', '10')),
+    connect_timeout=float(os.getenv('DEEPSEEK_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('DEEPSEEK_READ_TIMEOUT', '30')),
+    max_retries=int(os.getenv('DEEPSEEK_MAX_RETRIES', '2'))
+)
+
+async_http_client = AsyncPooledHttpClient(
+    pool_size=int(os.getenv('DEEPSEEK_POOL_SIZE', '10')),
+    connect_timeout=float(os.getenv('DEEPSEEK_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('DEEPSEEK_READ_TIMEOUT', '30')),
+    max_retries=int(os.getenv('DEEPSEEK_MAX_RETRIES', '2'))
+) if HTTPX_AVAILABLE else None
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from typing import Dict, Any, Optional, Tuple
+from services.logger import get_logger
+
+logger = get_logger('index')
+
+try:
+    import numpy as np
+    import scipy.sparse as sp
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'index', 'snapshots')
+LATEST_FILE = 'LATEST'
+ARRAY_FILES = ('idf.npy', 'data.npy', 'indices.npy', 'indptr.npy')
+
+
+def _file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexSnapshotStore:
+    """Versioned on-disk snapshots of a fitted TF-IDF index.
+
+    Each snapshot is a directory holding the IDF weights and document
+    matrix as ``.npy`` arrays, a JSON table of terms, item ids and content
+    hashes, and a manifest with the format version, the settings the index
+    was built with, the corpus version/watermark and a SHA-256 checksum per
+    file. ``LATEST`` is replaced atomically once a snapshot is complete. A
+    snapshot with another format version, other settings or a bad checksum
+    is rejected, and the caller rebuilds from scratch.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory: str = DEFAULT_SNAPSHOT_DIR, keep: int = 2):
+        self.directory = directory
+        self.keep = max(1, keep)
+        self._lock = threading.Lock()
+
+    def _latest(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, LATEST_FILE), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, state: Dict[str, Any], settings: Dict[str, Any], metadata: Dict[str, Any]) -> str:
+        """Write ``state`` (from ``TfidfIndex.export_state``) as the new latest snapshot"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            staging = os.path.join(self.directory, f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+            os.makedirs(staging)
+            try:
+                matrix = state['matrix'].tocsr()
+                np.save(os.path.join(staging, 'idf.npy'), np.asarray(state['idf']))
+                np.save(os.path.join(staging, 'data.npy'), matrix.data)
+                np.save(os.path.join(staging, 'indices.npy'), matrix.indices)
+                np.save(os.path.join(staging, 'indptr.npy'), matrix.indptr)
+                with open(os.path.join(staging, 'table.json'), 'w', encoding='utf-8') as f:
+                    json.dump({'terms': state['terms'], 'ids': state['ids'], 'hashes': state['hashes']}, f)
+                manifest = dict(
+                    metadata,
+                    format_version=self.FORMAT_VERSION,
+                    settings=settings,
+                    shape=list(matrix.shape),
+                    created_at=time.time(),
+                    checksums={name: _file_checksum(os.path.join(staging, name)) for name in ARRAY_FILES + ('table.json',)}
+                )
+                with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f)
+                existing = sorted(name for name in os.listdir(self.directory) if name.startswith('snapshot-'))
+                number = int(existing[-1][len('snapshot-'):]) + 1 if existing else 1
+                name = f"snapshot-{number:06d}"
+                os.rename(staging, os.path.join(self.directory, name))
+            except Exception:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            pointer = os.path.join(self.directory, f"{LATEST_FILE}.tmp-{os.getpid()}")
+            with open(pointer, 'w', encoding='utf-8') as f:
+                f.write(name)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(pointer, os.path.join(self.directory, LATEST_FILE))
+            for old in existing[:max(0, len(existing) + 1 - self.keep)]:
+                shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+            return name
+
+    def load(self, settings: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Return ``(state, manifest)`` of the latest valid snapshot built with ``settings``, or None"""
+        name = self._latest()
+        if name is None:
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            with open(os.path.join(path, 'manifest.json'), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('format_version') != self.FORMAT_VERSION:
+                logger.warning("Ignoring index snapshot %s with unsupported format %s", name, manifest.get('format_version'))
+                return None
+            if manifest.get('settings') != settings:
+                logger.warning("Ignoring index snapshot %s built with different settings", name)
+                return None
+            for file_name, checksum in manifest['checksums'].items():
+                if _file_checksum(os.path.join(path, file_name)) != checksum:
+                    logger.warning("Ignoring index snapshot %s: checksum mismatch in %s", name, file_name)
+                    return None
+            arrays = {file_name: np.load(os.path.join(path, file_name), allow_pickle=False) for file_name in ARRAY_FILES}
+            with open(os.path.join(path, 'table.json'), 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            matrix = sp.csr_matrix((arrays['data.npy'], arrays['indices.npy'], arrays['indptr.npy']),
+                                   shape=tuple(manifest['shape']))
+            if not (len(table['ids']) == len(table['hashes']) == matrix.shape[0] and
+                    len(table['terms']) == len(arrays['idf.npy']) == matrix.shape[1]):
+                logger.warning("Ignoring index snapshot %s: inconsistent table sizes", name)
+                return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Could not load index snapshot %s: %s", name, e)
+            return None
+        state = dict(table, idf=arrays['idf.npy'], matrix=matrix)
+        return state, manifest
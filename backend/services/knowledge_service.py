@@ -1,54 +1,403 @@
-from typing import List, Dict, Optional, Tuple
-from config.database import supabase_config
-from services.nlp_service import nlp_service
-<<<<<<< HEAD
+from typing import List, Dict, Optional, Tuple, Iterator
+from services.storage import storage, StorageSearchIndex
+from services.nlp_service import nlp_service, BM25Index
 from services.training_service import training_service
-=======
->>>>>>> daf97b202766d82f427622fa997fdfa044882444
+from services.search_index import TfidfIndex, PassageIndex
+from services.chunker import PassageChunker
+from services.context_packer import ContextPacker
+from services.tokenizer import tokenizer
+from services.pagination import decode_cursor, next_cursor
+from services.embedding_store import EmbeddingStore
+from services.ann_index import IVFIndex
+from services.shared_index import SharedIndex, DEFAULT_SHARED_INDEX_DIR, SCIPY_AVAILABLE
+from services.index_snapshot import IndexSnapshotStore, DEFAULT_SNAPSHOT_DIR
+from services.metrics import metrics
+from services.logger import get_logger
+import os
+import time
 import uuid
+import atexit
+import bisect
+import threading
+from collections import Counter
 from datetime import datetime
 
+logger = get_logger('knowledge')
+context_logger = get_logger('knowledge.context')
+corpus_reloads = metrics.counter('corpus_reloads_total', 'Knowledge corpus reloads from storage', ('changed',))
+
 class KnowledgeService:
-    def __init__(self):
-        self.supabase = supabase_config.get_client()
+    def __init__(self, storage_backend=None):
+        self.storage = storage_backend or storage
+        self.search_method = os.getenv('KNOWLEDGE_SEARCH_METHOD', 'tfidf').lower()
+        self.search_index = self._create_index(self.search_method)
+        # Backend text-search scores (ts_rank_cd, FTS5 bm25) are not on the 0-1 cosine scale
+        self.search_threshold = 0.0 if isinstance(self.search_index, StorageSearchIndex) else 0.3
+        # Index overlapping passages rather than whole documents; pushed-down search sees whole rows
+        self.passages_enabled = os.getenv('KNOWLEDGE_PASSAGES', 'True').lower() == 'true' and \
+            not isinstance(self.search_index, StorageSearchIndex)
+        if self.passages_enabled:
+            self.search_index = PassageIndex(self.search_index, PassageChunker(
+                max_chars=int(os.getenv('KNOWLEDGE_PASSAGE_CHARS', '400')),
+                overlap=int(os.getenv('KNOWLEDGE_PASSAGE_OVERLAP', '80'))
+            ))
+        self._index_built = False
+        # Fitted TF-IDF state saved to disk, so a restart only applies what changed since
+        self.index_snapshots = None
+        self._index_snapshot_version: Optional[int] = None
+        self._index_snapshot_attempted = False
+        self._index_snapshot_lock = threading.Lock()
+        base_index = self.search_index.index if self.passages_enabled else self.search_index
+        if os.getenv('KNOWLEDGE_INDEX_SNAPSHOTS', 'True').lower() == 'true' and isinstance(base_index, TfidfIndex):
+            self.index_snapshots = IndexSnapshotStore(
+                os.getenv('KNOWLEDGE_INDEX_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR),
+                keep=int(os.getenv('KNOWLEDGE_INDEX_SNAPSHOT_KEEP', '2'))
+            )
+            atexit.register(self.save_index_snapshot)
+        # In-process corpus snapshot; writes update it, the TTL catches external changes
+        self.cache_ttl = float(os.getenv('KNOWLEDGE_CACHE_TTL', '300'))
+        self.corpus_version = 0
+        self._corpus: List[Dict] = []
+        self._corpus_loaded_at: Optional[float] = None
+        self._corpus_lock = threading.RLock()
+        self._keyword_frequencies: Optional[Tuple[Counter, int]] = None
+        self._sorted_corpus = None
+        self.bulk_chunk_size = int(os.getenv('KNOWLEDGE_BULK_CHUNK_SIZE', '500'))
+        # Prompt context: default token budget per request and how many passages compete for it
+        self.context_token_budget = int(os.getenv('KNOWLEDGE_CONTEXT_TOKENS', '300'))
+        self.max_context_tokens = max(self.context_token_budget, int(os.getenv('KNOWLEDGE_MAX_CONTEXT_TOKENS', '4000')))
+        self.context_candidates = int(os.getenv('KNOWLEDGE_CONTEXT_CANDIDATES', '20'))
+        self.context_packer = ContextPacker(
+            self._format_passage,
+            min_relative_score=float(os.getenv('KNOWLEDGE_CONTEXT_MIN_SCORE', '0.25'))
+        )
+    
+    def _create_index(self, method: str):
+        """Create the long-lived index for the configured search method"""
+        if os.getenv('KNOWLEDGE_SHARED_INDEX', 'False').lower() == 'true' and SCIPY_AVAILABLE:
+            if method in ('tfidf', 'semantic'):
+                return SharedIndex(
+                    lambda: self._create_local_index(method),
+                    directory=os.getenv('KNOWLEDGE_SHARED_INDEX_DIR', DEFAULT_SHARED_INDEX_DIR),
+                    encoder=nlp_service.encode_texts if method == 'semantic' else None,
+                    check_interval=float(os.getenv('KNOWLEDGE_SHARED_INDEX_CHECK_INTERVAL', '1.0')),
+                    keep_generations=int(os.getenv('KNOWLEDGE_SHARED_INDEX_GENERATIONS', '3')),
+                    publish_delay=float(os.getenv('KNOWLEDGE_SHARED_INDEX_PUBLISH_DELAY', '1.0'))
+                )
+            logger.warning("Shared index supports tfidf and semantic search only; %s stays per process", method)
+        return self._create_local_index(method)
+    
+    def _create_local_index(self, method: str):
+        """Create an in-process index for ``method``"""
+        if method == 'bm25':
+            return BM25Index()
+        if method == 'storage':
+            # Stored rows are searched in the database; bundled training data in process
+            return StorageSearchIndex(self.storage, TfidfIndex())
+        if method in ('semantic', 'ann'):
+            if nlp_service.sentence_model_name:
+                store = EmbeddingStore(nlp_service.encode_texts, model=nlp_service.sentence_model_name)
+                if method == 'ann':
+                    return IVFIndex(
+                        store,
+                        n_lists=int(os.getenv('ANN_LISTS', '0')) or None,
+                        nprobe=int(os.getenv('ANN_NPROBE', '8'))
+                    )
+                return store
+            logger.warning("Sentence model not loaded, falling back to TF-IDF search")
+            self.search_method = 'tfidf'
+        return TfidfIndex()
+    
+    def _ensure_index(self):
+        """Build the search index from the corpus snapshot when it is missing or stale"""
+        with self._corpus_lock:
+            if isinstance(self.search_index, StorageSearchIndex):
+                # The database searches its own rows; never download the whole table
+                if not self._index_built:
+                    self.search_index.build(self._bundled_knowledge())
+                    self._index_built = True
+                return
+            corpus = self.get_all_knowledge()
+            if not self._index_built:
+                with metrics.span('index_build'):
+                    if not self._restore_index_snapshot(corpus):
+                        self.search_index.build(corpus)
+                self._index_built = True
+                if self.index_snapshots is not None and self._index_snapshot_version != self.corpus_version:
+                    threading.Thread(target=self.save_index_snapshot, name='index-snapshot', daemon=True).start()
+    
+    def _index_settings(self) -> Dict:
+        """Settings a saved index must match to be reused"""
+        settings = {'method': self.search_method, 'passages': self.passages_enabled}
+        if self.passages_enabled:
+            settings.update(passage_chars=self.search_index.chunker.max_chars,
+                            passage_overlap=self.search_index.chunker.overlap)
+        return settings
+    
+    def _restore_index_snapshot(self, corpus: List[Dict]) -> bool:
+        """On the first build of the process, adopt the saved index and apply only changed rows"""
+        if self.index_snapshots is None or self._index_snapshot_attempted:
+            return False
+        self._index_snapshot_attempted = True
+        loaded = self.index_snapshots.load(self._index_settings())
+        if loaded is None:
+            return False
+        state, manifest = loaded
+        try:
+            applied = self.search_index.restore_state(state, corpus)
+        except Exception as e:
+            logger.warning("Could not restore index snapshot: %s", e)
+            return False
+        logger.info("Restored search index from snapshot (%d saved rows, %d changed since, watermark %s)",
+                    len(state['ids']), applied, manifest.get('watermark'))
+        if applied == 0:
+            self._index_snapshot_version = self.corpus_version
+        return True
+    
+    def save_index_snapshot(self):
+        """Save the fitted search index if it changed since the last save"""
+        if self.index_snapshots is None or not self._index_built:
+            return
+        with self._index_snapshot_lock:
+            version = self.corpus_version
+            if self._index_snapshot_version == version:
+                return
+            try:
+                state = self.search_index.export_state()
+                if state is None:
+                    return
+                watermark = max((str(item.get('updated_at') or item.get('created_at') or '') for item in self._corpus),
+                                default='')
+                name = self.index_snapshots.save(state, self._index_settings(), {
+                    'corpus_version': version,
+                    'watermark': watermark,
+                    'documents': len(self._corpus)
+                })
+                self._index_snapshot_version = version
+                logger.info("Saved index snapshot %s (%d rows)", name, len(state['ids']))
+            except Exception as e:
+                logger.warning("Could not save index snapshot: %s", e)
+    
+    def warm_up(self):
+        """Load the corpus snapshot and build the search index ahead of the first query"""
+        self._ensure_index()
     
-    def add_knowledge(self, title: str, content: str) -> Dict:
-        """Add new knowledge to the database"""
+    def add_knowledge(self, title: str, content: str) -> Optional[Dict]:
+        """Add new knowledge to the database; the index only sees items that were saved"""
         try:
             knowledge_item = {
                 'id': str(uuid.uuid4()),
                 'title': title,
                 'content': content,
-                'keywords': nlp_service.extract_keywords(content),
+                'keywords': nlp_service.extract_keywords(content, background=self._keyword_background()),
                 'created_at': datetime.utcnow().isoformat(),
                 'updated_at': datetime.utcnow().isoformat()
             }
             
-            result = self.supabase.table('knowledge_base').insert(knowledge_item).execute()
+            inserted = self.storage.insert_knowledge([knowledge_item])
             
-            if result.data:
-                return result.data[0]
-            else:
-                raise Exception("Failed to insert knowledge item")
+            if inserted:
+                self._apply_upsert(inserted[0])
+                return inserted[0]
+            logger.error("Storage did not return the inserted knowledge item")
+            return None
                 
         except Exception as e:
-            print(f"Error adding knowledge: {e}")
-            # Fallback to in-memory storage for demo
-            return knowledge_item
+            logger.error("Error adding knowledge: %s", e)
+            return None
+    
+    def _keyword_background(self) -> Optional[Tuple[Counter, int]]:
+        """Corpus document frequencies that supply IDF for keyword extraction
+        
+        Computed once per corpus load; single writes shift IDF too little to
+        be worth a recount, so they are picked up on the next reload.
+        """
+        try:
+            with self._corpus_lock:
+                corpus = self.get_all_knowledge()
+                if self._keyword_frequencies is None:
+                    self._keyword_frequencies = nlp_service.keyword_document_frequencies(
+                        [item.get('content', '') for item in corpus]
+                    )
+                return self._keyword_frequencies
+        except Exception as e:
+            logger.warning("Could not load corpus for keyword extraction: %s", e)
+            return None
+    
+    def add_knowledge_bulk(self, items: List[Dict]) -> Dict:
+        """Add many knowledge items at once
+        
+        Keywords for the whole batch come from one vectorization against the
+        corpus IDF, rows are inserted in multi-row chunks and the search index
+        is updated once at the end. Failures are reported per item by their
+        position in ``items``.
+        """
+        failures = []
+        valid = []
+        for position, data in enumerate(items):
+            if not isinstance(data, dict):
+                failures.append({'index': position, 'error': 'Item must be an object'})
+                continue
+            title = data.get('title')
+            content = data.get('content')
+            if not isinstance(title, str) or not isinstance(content, str) or not title.strip() or not content.strip():
+                failures.append({'index': position, 'error': 'Title and content are required'})
+                continue
+            valid.append((position, title.strip(), content.strip()))
+        
+        keywords = nlp_service.extract_keywords_batch(
+            [content for _, _, content in valid], background=self._keyword_background()
+        ) if valid else []
+        
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (position, {
+                'id': str(uuid.uuid4()),
+                'title': title,
+                'content': content,
+                'keywords': item_keywords,
+                'created_at': now,
+                'updated_at': now
+            })
+            for (position, title, content), item_keywords in zip(valid, keywords)
+        ]
+        
+        inserted = []
+        chunk_size = max(1, self.bulk_chunk_size)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                inserted.extend(self.storage.insert_knowledge([row for _, row in chunk]))
+            except Exception as e:
+                logger.error("Error inserting knowledge chunk of %d rows: %s", len(chunk), e)
+                # Retry row by row so one bad item does not fail its whole chunk
+                for position, row in chunk:
+                    try:
+                        inserted.extend(self.storage.insert_knowledge([row]))
+                    except Exception as row_error:
+                        failures.append({'index': position, 'error': str(row_error)})
+        
+        if inserted:
+            self._apply_bulk_upsert(inserted)
+        
+        failures.sort(key=lambda failure: failure['index'])
+        return {
+            'success': not failures,
+            'received': len(items),
+            'inserted': len(inserted),
+            'failed': len(failures),
+            'failures': failures,
+            'ids': [item.get('id') for item in inserted]
+        }
     
     def get_all_knowledge(self) -> List[Dict]:
-<<<<<<< HEAD
+        """Return the cached corpus snapshot, reloading it once the TTL has expired"""
+        with self._corpus_lock:
+            if self._corpus_is_stale():
+                self._refresh_corpus()
+            return list(self._corpus)
+    
+    @staticmethod
+    def _page_key(item: Dict) -> Tuple[str, str]:
+        return str(item.get('created_at') or ''), str(item.get('id'))
+    
+    def _sorted_snapshot(self) -> Tuple[List[Dict], List[Tuple[str, str]]]:
+        """Snapshot items sorted ascending by (created_at, id), cached per corpus version"""
+        with self._corpus_lock:
+            corpus = self.get_all_knowledge()
+            cached = self._sorted_corpus
+            if cached is None or cached[0] != self.corpus_version:
+                items = sorted(corpus, key=self._page_key)
+                cached = (self.corpus_version, items, [self._page_key(item) for item in items])
+                self._sorted_corpus = cached
+            return cached[1], cached[2]
+    
+    def iter_knowledge(self, cursor: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Yield knowledge items newest first by (created_at, id), starting after ``cursor``
+        
+        Raises ValueError for a malformed cursor.
+        """
+        items, keys = self._sorted_snapshot()
+        end = bisect.bisect_left(keys, decode_cursor(cursor)) if cursor else len(items)
+        start = 0 if limit is None else max(0, end - limit)
+        for position in range(end - 1, start - 1, -1):
+            yield items[position]
+    
+    def list_knowledge_page(self, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of knowledge items plus the cursor for the next page"""
+        rows = list(self.iter_knowledge(cursor, limit))
+        return rows, next_cursor(rows, limit, 'created_at')
+    
+    def invalidate_corpus(self):
+        """Force the next read to reload the corpus from its sources"""
+        with self._corpus_lock:
+            self._corpus_loaded_at = None
+    
+    def _corpus_is_stale(self) -> bool:
+        if self._corpus_loaded_at is None:
+            return True
+        return self.cache_ttl > 0 and time.monotonic() - self._corpus_loaded_at > self.cache_ttl
+    
+    @staticmethod
+    def _corpus_fingerprint(corpus: List[Dict]) -> List[Tuple]:
+        # Generated items (team info, DB fallback) carry a fresh created_at on every load
+        return [(item.get('id'), item.get('updated_at')) for item in corpus]
+    
+    def _refresh_corpus(self):
+        """Reload the snapshot; bump the version and drop the index only if something changed"""
+        with metrics.span('corpus_load'):
+            corpus = self._load_corpus()
+        changed = self._corpus_loaded_at is None or \
+            self._corpus_fingerprint(corpus) != self._corpus_fingerprint(self._corpus)
+        self._corpus_loaded_at = time.monotonic()
+        corpus_reloads.inc(changed=str(changed).lower())
+        if changed:
+            self._corpus = corpus
+            self.corpus_version += 1
+            self._index_built = False
+            self._keyword_frequencies = None
+    
+    def _apply_upsert(self, item: Dict):
+        """Apply an added or edited item to the snapshot and the search index"""
+        with self._corpus_lock:
+            if self._corpus_loaded_at is not None:
+                item_id = item.get('id')
+                self._corpus = [existing for existing in self._corpus if existing.get('id') != item_id]
+                self._corpus.insert(0, item)
+                self.corpus_version += 1
+            if self._index_built:
+                self.search_index.update(item)
+    
+    def _apply_bulk_upsert(self, items: List[Dict]):
+        """Apply many new items with one snapshot swap and one batch write to the index"""
+        with self._corpus_lock:
+            if self._corpus_loaded_at is None:
+                return
+            new_ids = {item.get('id') for item in items}
+            self._corpus = list(reversed(items)) + [item for item in self._corpus if item.get('id') not in new_ids]
+            self.corpus_version += 1
+            if self._index_built:
+                # The index decides (e.g. TF-IDF refit_ratio) whether the batch warrants a full refit
+                self.search_index.add_many(items)
+    
+    def _apply_delete(self, knowledge_id: str):
+        """Remove an item from the snapshot and the search index"""
+        with self._corpus_lock:
+            if self._corpus_loaded_at is not None:
+                self._corpus = [item for item in self._corpus if str(item.get('id')) != str(knowledge_id)]
+                self.corpus_version += 1
+            self.search_index.remove(knowledge_id)
+    
+    def _load_corpus(self) -> List[Dict]:
         """Retrieve all knowledge items from database and training data."""
         all_knowledge = []
 
-        # 1. Get knowledge from Supabase
+        # 1. Get knowledge from the storage backend
         try:
-            result = self.supabase.table('knowledge_base').select('*').order('created_at', desc=True).execute()
-            if result.data:
-                all_knowledge.extend(result.data)
+            all_knowledge.extend(self.storage.list_knowledge())
         except Exception as e:
-            print(f"Warning: Could not fetch knowledge from Supabase: {e}")
-            # Add sample data if Supabase fails
+            logger.warning("Could not fetch knowledge from %s: %s", self.storage.name, e)
+            # Add sample data if the database fails
             all_knowledge.append({
                 'id': 'db_fallback_1',
                 'title': 'Sample Knowledge',
@@ -56,15 +405,22 @@ class KnowledgeService:
                 'created_at': datetime.utcnow().isoformat()
             })
 
-        # 2. Get cybersecurity knowledge from training_service
+        all_knowledge.extend(self._bundled_knowledge())
+        return all_knowledge
+
+    def _bundled_knowledge(self) -> List[Dict]:
+        """Knowledge shipped with the app (training data and team information) rather than stored"""
+        bundled = []
+
+        # Cybersecurity knowledge from training_service
         cyber_knowledge = training_service.get_all_cybersecurity_knowledge()
         if cyber_knowledge:
             # Ensure the format is consistent
             for item in cyber_knowledge:
                 item['source'] = 'cybersecurity_training'
-            all_knowledge.extend(cyber_knowledge)
+            bundled.extend(cyber_knowledge)
 
-        # 3. Get team information and format it as a knowledge item
+        # Team information, formatted as a knowledge item
         team_info = training_service.get_team_information()
         if team_info and 'team' in team_info:
             team_data = team_info['team']
@@ -83,88 +439,75 @@ class KnowledgeService:
                 'source': 'team_information',
                 'created_at': datetime.utcnow().isoformat()
             }
-            all_knowledge.append(team_knowledge_item)
+            bundled.append(team_knowledge_item)
 
-        return all_knowledge
-=======
-        """Retrieve all knowledge items"""
+        return bundled
+    
+    def search_passages(self, query: str, limit: int = 5) -> List[Tuple[Dict, float]]:
+        """Best-matching passages across documents (whole items when passages are disabled)"""
         try:
-            result = self.supabase.table('knowledge_base').select('*').order('created_at', desc=True).execute()
-            return result.data if result.data else []
+            self._ensure_index()
+            with metrics.span('knowledge_search'):
+                return nlp_service.find_similar_content(
+                    query, [], threshold=self.search_threshold, method=self.search_method,
+                    index=self.search_index, top_k=limit
+                )
         except Exception as e:
-            print(f"Error fetching knowledge: {e}")
-            # Return sample data for demo
-            return [
-                {
-                    'id': '1',
-                    'title': 'Sample Knowledge',
-                    'content': 'This is a sample knowledge base entry for demonstration purposes.',
-                    'created_at': datetime.utcnow().isoformat()
-                }
-            ]
->>>>>>> daf97b202766d82f427622fa997fdfa044882444
+            logger.error("Error searching knowledge: %s", e)
+            return []
     
     def search_knowledge(self, query: str, limit: int = 5) -> List[Tuple[Dict, float]]:
         """Search knowledge base using NLP similarity"""
-        try:
-            all_knowledge = self.get_all_knowledge()
-            similar_items = nlp_service.find_similar_content(query, all_knowledge)
-            return similar_items[:limit]
-        except Exception as e:
-            print(f"Error searching knowledge: {e}")
-            return []
+        if not self.passages_enabled:
+            return self.search_passages(query, limit)
+        # Several passages of one document can rank together, so over-fetch
+        return self.search_index.documents(self.search_passages(query, limit * 4), limit)
     
-    def get_relevant_context(self, query: str, max_context_length: int = 1000) -> str:
-        """Get relevant context for a query from knowledge base"""
+    @staticmethod
+    def _format_passage(passage: Dict) -> str:
+        """Render a passage for the LLM context, marking where it was cut from its document"""
+        content = passage.get('content', '')
+        if passage.get('start', 0) > 0:
+            content = "..." + content
+        if passage.get('chunk_index', 0) < passage.get('chunk_count', 1) - 1:
+            content = content + "..."
+        return f"**{passage.get('title', '')}**: {content}"
+    
+    def get_relevant_context(self, query: str, token_budget: Optional[int] = None) -> str:
+        """Get relevant context for a query from knowledge base, packed into a token budget"""
         try:
-            similar_items = self.search_knowledge(query)
+            budget = self.context_token_budget if token_budget is None else min(token_budget, self.max_context_tokens)
+            similar_items = self.search_passages(query, limit=self.context_candidates)
             
-            if not similar_items:
+            if not similar_items or budget <= 0:
                 return ""
             
-            # Combine relevant content
-            context_parts = []
-            current_length = 0
-            
-            for item, similarity in similar_items:
-                content = item.get('content', '')
-                title = item.get('title', '')
-                
-                # Add title and content
-                part = f"**{title}**: {content}"
-                
-                if current_length + len(part) <= max_context_length:
-                    context_parts.append(part)
-                    current_length += len(part)
-                else:
-                    # Add truncated version
-                    remaining_space = max_context_length - current_length
-                    if remaining_space > 50:  # Only add if there's meaningful space
-                        truncated_part = part[:remaining_space-3] + "..."
-                        context_parts.append(truncated_part)
-                    break
+            context_parts = [text for text, passage, score in self.context_packer.pack(similar_items, budget)]
+            if not context_parts:
+                # Nothing fits whole (e.g. long documents with passages disabled): truncate the best hit
+                part = self._format_passage(max(similar_items, key=lambda hit: hit[1])[0])
+                if budget > 12:  # Only add if there's meaningful space
+                    context_parts.append(tokenizer.truncate_to_tokens(part, budget - 3) + "...")
             
-<<<<<<< HEAD
             final_context = "\n\n".join(context_parts)
-            print(f"--- [Knowledge Service] Retrieved Context ---")
-            print(final_context)
-            print("-------------------------------------------")
+            # Full context is large; LOG_SAMPLING keeps it for a fraction of requests
+            context_logger.info("Retrieved context", extra={'query': query, 'context': final_context,
+                                                            'parts': len(context_parts)})
             return final_context
-=======
-            return "\n\n".join(context_parts)
->>>>>>> daf97b202766d82f427622fa997fdfa044882444
             
         except Exception as e:
-            print(f"Error getting relevant context: {e}")
+            logger.error("Error getting relevant context: %s", e)
             return ""
     
     def delete_knowledge(self, knowledge_id: str) -> bool:
         """Delete a knowledge item"""
         try:
-            result = self.supabase.table('knowledge_base').delete().eq('id', knowledge_id).execute()
-            return len(result.data) > 0 if result.data else False
+            deleted = self.storage.delete_knowledge(knowledge_id)
+            if deleted:
+                self._apply_delete(knowledge_id)
+            return deleted
         except Exception as e:
-            print(f"Error deleting knowledge: {e}")
+            logger.error("Error deleting knowledge: %s", e)
             return False
     
     def update_knowledge(self, knowledge_id: str, title: str = None, content: str = None) -> Optional[Dict]:
@@ -178,16 +521,24 @@ class KnowledgeService:
                 update_data['title'] = title
             if content:
                 update_data['content'] = content
-                update_data['keywords'] = nlp_service.extract_keywords(content)
+                update_data['keywords'] = nlp_service.extract_keywords(content, background=self._keyword_background())
             
-            result = self.supabase.table('knowledge_base').update(update_data).eq('id', knowledge_id).execute()
+            updated = self.storage.update_knowledge(knowledge_id, update_data)
             
-            if result.data:
-                return result.data[0]
-            return None
+            if updated:
+                self._apply_upsert(updated)
+            return updated
             
         except Exception as e:
-            print(f"Error updating knowledge: {e}")
+            logger.error("Error updating knowledge: %s", e)
             return None
 
 knowledge_service = KnowledgeService()
+
+metrics.register_callback('corpus_documents', 'Knowledge items in the corpus snapshot', 'gauge',
+                          lambda: len(knowledge_service._corpus))
+metrics.register_callback('corpus_version', 'Knowledge corpus version (bumped on every change)', 'gauge',
+                          lambda: knowledge_service.corpus_version)
+metrics.register_callback('search_index_entries', 'Entries in the knowledge search index (passages when enabled)', 'gauge',
+                          lambda: knowledge_service.search_index.passage_count if knowledge_service.passages_enabled
+                          else len(knowledge_service.search_index))
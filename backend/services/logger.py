@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import zlib
+import re
+import uuid
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+import contextvars
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_LOGGER = 'satecha'
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+# Attributes every LogRecord has; anything else came in through ``extra=`` and becomes a JSON field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+
+def _parse_settings(value: str) -> Dict[str, str]:
+    """``"knowledge.context=0.01,storage=DEBUG"`` -> {category: setting}"""
+    settings = {}
+    for part in value.split(','):
+        category, _, setting = part.partition('=')
+        if category.strip() and setting.strip():
+            settings[category.strip()] = setting.strip()
+    return settings
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records of sampled categories.
+
+    Rates match a category and its children (``knowledge`` covers
+    ``knowledge.context``); the most specific rate wins. The decision is a
+    hash of the request id, so a sampled request keeps all of its records
+    in that category. Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, category: str) -> Optional[float]:
+        while category:
+            if category in self.rates:
+                return self.rates[category]
+            category = category.rpartition('.')[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.rates or record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name[len(ROOT_LOGGER) + 1:])
+        if rate is None or rate >= 1:
+            return True
+        request_id = request_id_var.get()
+        if request_id is None:
+            return random.random() < rate
+        return zlib.crc32(f"{record.name}:{request_id}".encode()) / 0xFFFFFFFF < rate
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that freezes a record into a plain dict on the calling thread.
+
+    Only message interpolation happens on the hot path; JSON encoding and
+    the write to the stream are left to the listener thread. When the queue
+    is full the record is dropped and counted rather than blocking a request.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> Dict[str, Any]:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'category': record.name[len(ROOT_LOGGER) + 1:] or ROOT_LOGGER,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        request_id = request_id_var.get()
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = logging.Formatter().formatException(record.exc_info)
+        return entry
+
+    def enqueue(self, entry: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonLineHandler(logging.Handler):
+    """Writes the dicts prepared by StructuredQueueHandler as JSON lines (listener side)"""
+
+    def __init__(self, stream=None):
+        super().__init__()
+        self.stream = stream or sys.stdout
+
+    def handle(self, entry: Dict[str, Any]):
+        try:
+            self.stream.write(json.dumps(entry, default=str, ensure_ascii=False) + '\n')
+            self.stream.flush()
+        except Exception:
+            pass
+
+
+class LogSubsystem:
+    """Configures the ``satecha`` logger tree once per process.
+
+    ``LOG_LEVEL`` sets the default level, ``LOG_LEVELS`` per-category
+    overrides and ``LOG_SAMPLING`` per-category keep rates, e.g.
+    ``LOG_SAMPLING=knowledge.context=0.01`` logs the retrieved context for
+    about 1% of requests. A forked child (e.g. a gunicorn ``--preload``
+    worker) inherits the handler but not the writer thread, so it gets a
+    fresh queue and listener of its own.
+    """
+
+    def __init__(self):
+        self.handler: Optional[StructuredQueueHandler] = None
+        self.listener: Optional[logging.handlers.QueueListener] = None
+
+    def configure(self):
+        if self.listener is not None:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+        root.propagate = False
+        for category, level in _parse_settings(os.getenv('LOG_LEVELS', '')).items():
+            logging.getLogger(f"{ROOT_LOGGER}.{category}").setLevel(level.upper())
+
+        rates = {}
+        for category, rate in _parse_settings(os.getenv('LOG_SAMPLING', 'knowledge.context=0.01')).items():
+            try:
+                rates[category] = float(rate)
+            except ValueError:
+                pass
+
+        log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+        self.handler = StructuredQueueHandler(log_queue)
+        self.handler.addFilter(SamplingFilter(rates))
+        root.addHandler(self.handler)
+        self.listener = logging.handlers.QueueListener(log_queue, JsonLineHandler())
+        self.listener.start()
+        atexit.register(self.shutdown)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def _restart_in_child(self):
+        """Replace the queue and listener thread that did not survive fork"""
+        if self.listener is None:
+            return
+        log_queue: queue.Queue = queue.Queue(maxsize=self.handler.queue.maxsize)
+        self.handler.queue = log_queue
+        self.handler.dropped = 0
+        self.listener = logging.handlers.QueueListener(log_queue, JsonLineHandler())
+        self.listener.start()
+
+    def shutdown(self):
+        """Drain queued records and stop the writer thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            logging.getLogger(ROOT_LOGGER).removeHandler(self.handler)
+
+
+log_subsystem = LogSubsystem()
+log_subsystem.configure()
+
+
+def get_logger(category: str) -> logging.Logger:
+    """Logger for a category such as ``knowledge`` or ``knowledge.context``"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{category}")
+
+
+def assign_request_id(supplied: Optional[str] = None) -> str:
+    """Set the current request id, reusing a well-formed incoming X-Request-ID"""
+    request_id = supplied if supplied and _REQUEST_ID_PATTERN.match(supplied) else uuid.uuid4().hex
+    request_id_var.set(request_id)
+    return request_id
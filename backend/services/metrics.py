@@ -0,0 +1,199 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Callable, Optional, Any, Iterator
+from services.logger import get_logger
+
+logger = get_logger('metrics')
+
+# Seconds; spans range from sub-millisecond cache lookups to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with optional labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, ('le', _format_value(bound)))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {count}"
+
+
+class CallbackMetric:
+    """Counter or gauge whose values are read from existing stats when scraped
+
+    ``fn`` returns a number, or a dict mapping a label value (for the single
+    label in ``labels``) to a number.
+    """
+
+    def __init__(self, name: str, help_text: str, kind: str, fn: Callable[[], Any], labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.fn = fn
+        self.labels = labels
+
+    def samples(self) -> Iterator[str]:
+        value = self.fn()
+        if value is None:
+            return
+        if isinstance(value, dict):
+            for label, item in sorted(value.items()):
+                if isinstance(item, (int, float)) and not isinstance(item, bool):
+                    yield f"{self.name}{_format_labels(self.labels, (str(label),))} {_format_value(item)}"
+        else:
+            yield f"{self.name} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format.
+
+    ``span`` times a block into the shared stage-duration histogram; a
+    span costs two ``perf_counter`` calls, a bisect and a lock, so it is
+    cheap enough for every request. Counters that other services already
+    keep (cache and HTTP client stats) are registered as callbacks and
+    only read on scrape.
+    """
+
+    def __init__(self, prefix: str = 'satecha'):
+        self.prefix = prefix
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.stage_duration = self.histogram(
+            'stage_duration_seconds', 'Duration of chat pipeline stages and external calls', ('stage',)
+        )
+        self.stage_errors = self.counter('stage_errors_total', 'Stages that raised an exception', ('stage',))
+
+    def _register(self, name: str, factory: Callable[[str], Any]):
+        full_name = f"{self.prefix}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = factory(full_name)
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(name, lambda full_name: Counter(full_name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(name, lambda full_name: Histogram(full_name, help_text, labels, buckets))
+
+    def register_callback(self, name: str, help_text: str, kind: str, fn: Callable[[], Any],
+                          labels: Tuple[str, ...] = ()) -> CallbackMetric:
+        """Expose a counter/gauge computed at scrape time; re-registering replaces it"""
+        full_name = f"{self.prefix}_{name}"
+        metric = CallbackMetric(full_name, help_text, kind, fn, labels)
+        with self._lock:
+            self._metrics[full_name] = metric
+        return metric
+
+    def register_stats(self, prefix: str, subject: str, get_stats: Callable[[], Dict[str, Any]],
+                       counters: Tuple[str, ...] = (), gauges: Tuple[str, ...] = ()):
+        """Expose selected keys of an existing ``get_stats()`` dict as counters and gauges"""
+        for key in counters:
+            self.register_callback(f"{prefix}_{key}_total", f"{subject}: {key.replace('_', ' ')}", 'counter',
+                                   lambda key=key: get_stats().get(key))
+        for key in gauges:
+            self.register_callback(f"{prefix}_{key}", f"{subject}: {key.replace('_', ' ')}", 'gauge',
+                                   lambda key=key: get_stats().get(key))
+
+    @contextmanager
+    def span(self, stage: str):
+        """Record the duration of a block under ``stage``; exceptions are counted and re-raised"""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.stage_errors.inc(stage=stage)
+            raise
+        finally:
+            self.stage_duration.observe(time.perf_counter() - started, stage=stage)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        for name, metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                logger.error("Error collecting metric %s: %s", name, e)
+                continue
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
@@ -1,22 +1,15 @@
-import re
-from typing import List, Dict, Tuple, Optional
-try:
-    import nltk
-    from nltk.corpus import stopwords
-    from nltk.tokenize import word_tokenize, sent_tokenize
-    # Download required NLTK data
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        nltk.download('punkt')
-    try:
-        nltk.data.find('corpora/stopwords')
-    except LookupError:
-        nltk.download('stopwords')
-    NLTK_AVAILABLE = True
-except ImportError:
-    NLTK_AVAILABLE = False
-    print("NLTK not available, using basic text processing")
+import os
+import math
+import heapq
+import threading
+import importlib.util
+from collections import Counter
+from typing import List, Dict, Tuple, Optional, Callable
+
+from services.tokenizer import tokenizer
+from services.logger import get_logger
+
+logger = get_logger('nlp')
 
 try:
     from sklearn.feature_extraction.text import TfidfVectorizer
@@ -24,7 +17,7 @@ try:
     SKLEARN_AVAILABLE = True
 except ImportError:
     SKLEARN_AVAILABLE = False
-    print("Scikit-learn not available, using basic similarity")
+    logger.warning("Scikit-learn not available, using basic similarity")
 
 try:
     from textblob import TextBlob
@@ -32,13 +25,13 @@ try:
 except ImportError:
     TEXTBLOB_AVAILABLE = False
 
+# sentence-transformers pulls in torch, so it is only imported when a model is first used
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec('sentence_transformers') is not None
+
 class NLPService:
     def __init__(self):
-        if NLTK_AVAILABLE:
-            self.stop_words = set(stopwords.words('english'))
-        else:
-            # Basic English stop words
-            self.stop_words = set(['the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'])
+        self.tokenizer = tokenizer
+        self.stop_words = tokenizer.stop_words
         
         if SKLEARN_AVAILABLE:
             self.tfidf_vectorizer = TfidfVectorizer(
@@ -49,69 +42,108 @@ class NLPService:
         else:
             self.tfidf_vectorizer = None
         
-        self.sentence_model = None  # Simplified for now
+        # Name of the configured sentence model; the model itself loads on first use
+        self.sentence_model_name = os.getenv('SENTENCE_MODEL') if SENTENCE_TRANSFORMERS_AVAILABLE else None
+        self._sentence_model = None
+        self._sentence_model_lock = threading.Lock()
+    
+    @property
+    def sentence_model(self):
+        """Load the configured sentence model on first access"""
+        if self._sentence_model is None and self.sentence_model_name:
+            with self._sentence_model_lock:
+                if self._sentence_model is None and self.sentence_model_name:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                        self._sentence_model = SentenceTransformer(self.sentence_model_name)
+                    except Exception as e:
+                        logger.warning("Could not load sentence model %s: %s", self.sentence_model_name, e)
+                        self.sentence_model_name = None
+        return self._sentence_model
     
     def preprocess_text(self, text: str) -> str:
         """Clean and preprocess text"""
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove special characters and digits
-        text = re.sub(r'[^a-zA-Z\s]', '', text)
-        
-        # Remove extra whitespace
-        text = ' '.join(text.split())
+        # Lowercase, remove special characters and digits, collapse whitespace
+        return self.tokenizer.normalize(text)
+    
+    def index_tokens(self, text: str) -> List[str]:
+        """Preprocess text into stop-word-free tokens for inverted indexing"""
+        return self.tokenizer.index_tokens(text)
+    
+    def encode_texts(self, texts: List[str]):
+        """Embed texts with the sentence model"""
+        if not self.sentence_model:
+            raise RuntimeError("Sentence model is not loaded")
+        return self.sentence_model.encode(texts, convert_to_numpy=True)
+    
+    def extract_keywords(self, text: str, num_keywords: int = 10,
+                         background: Optional[Tuple[Counter, int]] = None) -> List[str]:
+        """Extract keywords from text using TF-IDF
         
-        return text
+        ``background`` holds corpus document frequencies (see
+        ``keyword_document_frequencies``) that supply the IDF; without them
+        every term of a single text scores the same.
+        """
+        keywords = self.extract_keywords_batch([text], num_keywords, background)
+        return keywords[0] if keywords else []
+    
+    def _keyword_terms(self, tokens: List[str]) -> List[str]:
+        # Unigrams + bigrams of the words long enough to be keywords
+        return self.tokenizer.analyze([word for word in tokens if len(word) > 2])
+    
+    def keyword_document_frequencies(self, texts: List[str]) -> Tuple[Counter, int]:
+        """Document frequency of every keyword term over a corpus, reusable across extractions"""
+        frequencies = Counter()
+        for tokens in self.tokenizer.tokenize_batch(texts):
+            frequencies.update(set(self._keyword_terms(tokens)))
+        return frequencies, len(texts)
     
-    def extract_keywords(self, text: str, num_keywords: int = 10) -> List[str]:
-        """Extract keywords from text using TF-IDF or basic word frequency"""
+    def extract_keywords_batch(self, texts: List[str], num_keywords: int = 10,
+                               background: Optional[Tuple[Counter, int]] = None) -> List[List[str]]:
+        """Extract keywords for many texts in one pass
+        
+        IDF covers the batch plus the ``background`` document frequencies,
+        with the same smoothing as scikit-learn's ``TfidfVectorizer``.
+        """
         try:
-            processed_text = self.preprocess_text(text)
-            
-            # Tokenize and remove stopwords
-            if NLTK_AVAILABLE:
-                tokens = word_tokenize(processed_text)
-            else:
-                # Basic tokenization
-                tokens = processed_text.split()
+            term_counts = [Counter(self._keyword_terms(tokens)) for tokens in self.tokenizer.tokenize_batch(texts)]
+            background_frequencies, background_docs = background or (Counter(), 0)
+            batch_frequencies = Counter()
+            for counts in term_counts:
+                batch_frequencies.update(counts.keys())
+            total_docs = background_docs + len(texts)
             
-            filtered_tokens = [word for word in tokens if word not in self.stop_words and len(word) > 2]
-            
-            if not filtered_tokens:
-                return []
-            
-            if SKLEARN_AVAILABLE and self.tfidf_vectorizer:
-                # Use TF-IDF to find important terms
-                tfidf_matrix = self.tfidf_vectorizer.fit_transform([' '.join(filtered_tokens)])
-                feature_names = self.tfidf_vectorizer.get_feature_names_out()
-                tfidf_scores = tfidf_matrix.toarray()[0]
-                
-                # Get top keywords
-                keyword_scores = list(zip(feature_names, tfidf_scores))
-                keyword_scores.sort(key=lambda x: x[1], reverse=True)
-                
-                return [keyword for keyword, score in keyword_scores[:num_keywords] if score > 0]
-            else:
-                # Basic frequency-based keyword extraction
-                word_freq = {}
-                for word in filtered_tokens:
-                    word_freq[word] = word_freq.get(word, 0) + 1
-                
-                # Sort by frequency
-                sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-                return [word for word, freq in sorted_words[:num_keywords]]
+            keywords = []
+            for counts in term_counts:
+                scored = []
+                for term, count in counts.items():
+                    frequency = background_frequencies.get(term, 0) + batch_frequencies[term]
+                    idf = math.log((1 + total_docs) / (1 + frequency)) + 1
+                    scored.append((count * idf, term))
+                scored.sort(key=lambda pair: (-pair[0], pair[1]))
+                keywords.append([term for score, term in scored[:num_keywords]])
+            return keywords
         
         except Exception as e:
-            print(f"Error extracting keywords: {e}")
-            return []
+            logger.error("Error extracting keywords: %s", e)
+            return [[] for _ in texts]
     
-    def find_similar_content(self, query: str, knowledge_base: List[Dict], threshold: float = 0.3) -> List[Tuple[Dict, float]]:
-        """Find similar content in knowledge base using semantic similarity"""
-        if not knowledge_base:
+    def find_similar_content(self, query: str, knowledge_base: List[Dict], threshold: float = 0.3,
+                             method: str = 'tfidf', index=None, top_k: int = 5) -> List[Tuple[Dict, float]]:
+        """Find similar content in knowledge base using semantic similarity
+        
+        ``method`` selects the scorer ('tfidf' or 'bm25'). When a prebuilt
+        ``index`` is passed it is queried directly and ``knowledge_base`` is
+        not rescanned; for BM25 ``threshold`` is a minimum raw score.
+        """
+        if index is None and not knowledge_base:
             return []
         
         try:
+            if index is not None:
+                return index.search(query, top_k=top_k, threshold=threshold)
+            if method == 'bm25':
+                return BM25Index(knowledge_base).search(query, top_k=top_k, threshold=threshold)
             # Use sentence transformer if available
             if self.sentence_model:
                 return self._semantic_similarity_search(query, knowledge_base, threshold)
@@ -119,7 +151,7 @@ class NLPService:
                 return self._tfidf_similarity_search(query, knowledge_base, threshold)
         
         except Exception as e:
-            print(f"Error finding similar content: {e}")
+            logger.error("Error finding similar content: %s", e)
             return []
     
     def _semantic_similarity_search(self, query: str, knowledge_base: List[Dict], threshold: float) -> List[Tuple[Dict, float]]:
@@ -169,7 +201,7 @@ class NLPService:
     def summarize_text(self, text: str, max_sentences: int = 3) -> str:
         """Simple extractive summarization"""
         try:
-            sentences = sent_tokenize(text)
+            sentences = self.tokenizer.sentences(text)
             
             if len(sentences) <= max_sentences:
                 return text
@@ -183,7 +215,7 @@ class NLPService:
                 return ' '.join(sentences[:max_sentences])
         
         except Exception as e:
-            print(f"Error summarizing text: {e}")
+            logger.error("Error summarizing text: %s", e)
             return text[:200] + "..." if len(text) > 200 else text
     
     def analyze_intent(self, text: str) -> Dict[str, any]:
@@ -217,10 +249,136 @@ class NLPService:
             intent['confidence'] = 0.7
         
         # Extract potential entities (simple approach)
-        words = word_tokenize(text)
+        words = self.tokenizer.words(text)
         entities = [word for word in words if word.istitle() and len(word) > 2]
         intent['entities'] = entities
         
         return intent
 
+
+class BM25Index:
+    """Okapi BM25 over an inverted posting-list index.
+
+    Only documents that share at least one term with the query are scored,
+    and the top k are picked with a heap, so query cost follows the query's
+    posting lists rather than corpus size. Items can be added and removed
+    incrementally; an RLock keeps writes from mutating posting lists while a
+    query is scoring them.
+    """
+
+    def __init__(self, knowledge_items: Optional[List[Dict]] = None, k1: float = 1.5, b: float = 0.75,
+                 tokenizer: Optional[Callable[[str], List[str]]] = None):
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self._items: Dict[str, Dict] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        if knowledge_items:
+            self.build(knowledge_items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _tokens(self, text: str) -> List[str]:
+        return (self.tokenizer or nlp_service.index_tokens)(text)
+
+    def build(self, knowledge_items: List[Dict]):
+        """Replace the index contents with the given items"""
+        items = [item for item in knowledge_items if item.get('id') is not None]
+        texts = [self._document_text(item) for item in items]
+        token_lists = tokenizer.tokenize_batch(texts) if self.tokenizer is None else [self._tokens(text) for text in texts]
+        with self._lock:
+            self.postings = {}
+            self.doc_lengths = {}
+            self._items = {}
+            self._doc_terms = {}
+            self._total_length = 0
+            for item, tokens in zip(items, token_lists):
+                self._add_tokens(item, tokens)
+
+    @staticmethod
+    def _document_text(item: Dict) -> str:
+        return f"{item.get('title', '')} {item.get('content', '')}"
+
+    def add(self, item: Dict):
+        """Index a single item, replacing any previous version"""
+        if item.get('id') is None:
+            return
+        tokens = self._tokens(self._document_text(item))
+        with self._lock:
+            self._add_tokens(item, tokens)
+
+    def add_many(self, knowledge_items: List[Dict]):
+        """Index many items, tokenizing them in one pass"""
+        items = [item for item in knowledge_items if item.get('id') is not None]
+        texts = [self._document_text(item) for item in items]
+        token_lists = tokenizer.tokenize_batch(texts) if self.tokenizer is None else [self._tokens(text) for text in texts]
+        with self._lock:
+            for item, tokens in zip(items, token_lists):
+                self._add_tokens(item, tokens)
+
+    def _add_tokens(self, item: Dict, tokens: List[str]):
+        """Index pre-tokenized text (lock held)"""
+        doc_id = str(item['id'])
+        if doc_id in self._items:
+            self.remove(doc_id)
+
+        term_counts = Counter(tokens)
+        for term, count in term_counts.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+        self._items[doc_id] = item
+        self._doc_terms[doc_id] = list(term_counts)
+        self.doc_lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def update(self, item: Dict):
+        """Re-index an edited item"""
+        self.add(item)
+
+    def remove(self, item_id: str):
+        """Drop an item and its postings"""
+        doc_id = str(item_id)
+        with self._lock:
+            if self._items.pop(doc_id, None) is None:
+                return
+            for term in self._doc_terms.pop(doc_id, []):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(doc_id, None)
+                    if not posting:
+                        del self.postings[term]
+            self._total_length -= self.doc_lengths.pop(doc_id, 0)
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency (always positive)"""
+        doc_freq = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self._items) - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.0) -> List[Tuple[Dict, float]]:
+        """Return the top-k items by BM25 score"""
+        terms = set(self._tokens(query))
+        with self._lock:
+            if not self._items:
+                return []
+
+            avg_length = self._total_length / len(self._items) or 1.0
+            scores: Dict[str, float] = {}
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = self.idf(term)
+                for doc_id, term_freq in posting.items():
+                    length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * term_freq * (self.k1 + 1) / (term_freq + length_norm)
+
+            top = heapq.nlargest(top_k, ((score, doc_id) for doc_id, score in scores.items() if score >= threshold))
+            return [(self._items[doc_id], score) for score, doc_id in top]
+
+
 nlp_service = NLPService()
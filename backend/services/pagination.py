@@ -0,0 +1,45 @@
+import re
+import json
+import base64
+from datetime import datetime
+from typing import Tuple, Any, Optional
+
+# UUIDs and the slug-style ids of bundled training items; nothing that is special in a filter expression
+_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,128}$')
+
+
+def encode_cursor(sort_value: Any, item_id: Any) -> str:
+    """Opaque keyset cursor for the row with this (sort value, id)"""
+    payload = json.dumps([sort_value, item_id], separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(sort value, id) from a cursor; raises ValueError when it is malformed
+
+    The sort value must be an ISO-8601 timestamp (or empty, for items without
+    one) and the id must look like an id, since both end up in query filters.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, item_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    sort_value = '' if sort_value is None else sort_value
+    if not isinstance(sort_value, str) or not isinstance(item_id, (str, int)) or isinstance(item_id, bool):
+        raise ValueError('Invalid cursor')
+    if sort_value:
+        try:
+            datetime.fromisoformat(sort_value.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('Invalid cursor')
+    if not _ID_PATTERN.match(str(item_id)):
+        raise ValueError('Invalid cursor')
+    return sort_value, str(item_id)
+
+
+def next_cursor(rows, limit: Optional[int], sort_key: str) -> Optional[str]:
+    """Cursor after the last row of a full page, None when the page was the last one"""
+    if not rows or limit is None or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1].get(sort_key), rows[-1].get('id'))
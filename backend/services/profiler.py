@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+# Leaf frames of threads parked on I/O or a lock; left out of profiles unless asked for
+_IDLE_FUNCTIONS = {
+    ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'), ('queue.py', 'get'),
+    ('selectors.py', 'select'), ('socket.py', 'accept'), ('socket.py', 'readinto'), ('socketserver.py', 'serve_forever'),
+    ('ssl.py', 'read'), ('base_events.py', '_run_once'), ('thread.py', '_worker'),
+}
+
+
+class SamplingProfiler:
+    """On-demand wall-clock stack sampler for the live threads of this process.
+
+    Nothing is installed between runs: ``profile`` polls
+    ``sys._current_frames()`` from the calling thread for a bounded time
+    and returns stacks in the collapsed format used by flamegraph.pl and
+    speedscope (``thread;outer;...;leaf count``). Only one profile runs at
+    a time.
+    """
+
+    def __init__(self, max_seconds: float = 30.0, min_interval: float = 0.001):
+        self.max_seconds = max_seconds
+        self.min_interval = min_interval
+        self._running = threading.Lock()
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    @staticmethod
+    def _is_idle(frame) -> bool:
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FUNCTIONS
+
+    def _sample(self, own_thread: int, names: Dict[int, str], include_idle: bool,
+                thread_prefix: Optional[str]) -> List[Tuple[str, ...]]:
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            name = names.get(thread_id, str(thread_id))
+            if thread_prefix and not name.startswith(thread_prefix):
+                continue
+            if not include_idle and self._is_idle(frame):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(name)
+            stacks.append(tuple(reversed(stack)))
+        return stacks
+
+    def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False,
+                thread_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """Sample every other thread for ``seconds`` (capped at ``max_seconds``)"""
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError('A profile is already running')
+        try:
+            seconds = max(0.0, min(seconds, self.max_seconds))
+            interval = max(interval, self.min_interval)
+            own_thread = threading.get_ident()
+            stacks: Counter = Counter()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+            while True:
+                # Thread names are re-read each tick so threads started mid-profile are labelled
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stacks.update(self._sample(own_thread, names, include_idle, thread_prefix))
+                samples += 1
+                if time.perf_counter() + interval > deadline:
+                    break
+                time.sleep(interval)
+            return {
+                'seconds': round(time.perf_counter() - started, 3),
+                'interval': interval,
+                'samples': samples,
+                'stacks': stacks
+            }
+        finally:
+            self._running.release()
+
+    @staticmethod
+    def collapsed(stacks: Counter) -> str:
+        """Collapsed-stack text, one ``frame;frame;... count`` line per distinct stack"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+    @staticmethod
+    def top_functions(stacks: Counter, limit: int = 20) -> List[Dict[str, Any]]:
+        """Functions by samples spent in them (self) and under them (total)"""
+        own, total = Counter(), Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack[1:]):
+                total[frame] += count
+        return [
+            {'function': frame, 'self_samples': own[frame], 'total_samples': count}
+            for frame, count in total.most_common(limit)
+        ]
+
+
+class MemoryTracker:
+    """tracemalloc snapshots and diffs, recorded only between ``start`` and ``stop``.
+
+    Tracing slows allocations down noticeably, so it is off until an admin
+    starts it. The last ``max_snapshots`` snapshots are kept for diffing.
+    """
+
+    def __init__(self, max_snapshots: int = 10):
+        self.max_snapshots = max_snapshots
+        self._snapshots: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 25) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            snapshots = [self._describe(snapshot_id, entry) for snapshot_id, entry in self._snapshots.items()]
+        return {
+            'tracing': tracemalloc.is_tracing(),
+            'frames': tracemalloc.get_traceback_limit(),
+            'traced_bytes': current,
+            'peak_traced_bytes': peak,
+            'snapshots': snapshots
+        }
+
+    @staticmethod
+    def _describe(snapshot_id: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {'id': snapshot_id, 'label': entry['label'], 'taken_at': entry['taken_at'],
+                'traced_bytes': entry['traced_bytes']}
+
+    def snapshot(self, label: str = '') -> Dict[str, Any]:
+        """Take and keep a snapshot; raises RuntimeError when tracing is off"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('Memory tracing is not running')
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        entry = {
+            'snapshot': snapshot,
+            'label': label,
+            'taken_at': datetime.utcnow().isoformat(),
+            'traced_bytes': tracemalloc.get_traced_memory()[0]
+        }
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = entry
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return self._describe(snapshot_id, entry)
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        with self._lock:
+            entry = self._snapshots.get(snapshot_id)
+        if entry is None:
+            raise KeyError(f"Unknown snapshot {snapshot_id}")
+        return entry['snapshot']
+
+    @staticmethod
+    def _location(stat) -> List[str]:
+        return [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+
+    def top(self, snapshot_id: int, limit: int = 25, group_by: str = 'lineno') -> List[Dict[str, Any]]:
+        """Largest allocation sites in a snapshot (``group_by``: lineno, filename or traceback)"""
+        stats = self._get(snapshot_id).statistics(group_by)
+        return [
+            {'location': self._location(stat), 'size_bytes': stat.size, 'count': stat.count}
+            for stat in stats[:limit]
+        ]
+
+    def diff(self, old_id: int, new_id: int, limit: int = 25, group_by: str = 'lineno') -> List[Dict[str, Any]]:
+        """Allocation sites that grew (or shrank) the most between two snapshots"""
+        stats = self._get(new_id).compare_to(self._get(old_id), group_by)
+        return [
+            {'location': self._location(stat), 'size_diff_bytes': stat.size_diff, 'size_bytes': stat.size,
+             'count_diff': stat.count_diff, 'count': stat.count}
+            for stat in stats[:limit]
+        ]
+
+
+profiler = SamplingProfiler(max_seconds=float(os.getenv('PROFILER_MAX_SECONDS', '30')))
+memory_tracker = MemoryTracker(max_snapshots=int(os.getenv('MEMORY_SNAPSHOT_LIMIT', '10')))
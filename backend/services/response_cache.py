@@ -0,0 +1,99 @@
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class ResponseCache:
+    """Bounded LRU + TTL cache of LLM completions.
+
+    Keys combine the normalised user prompt, a hash of the retrieved context
+    and the model parameters. Entries are tagged with the knowledge corpus
+    version they were produced under; when a caller presents a newer version
+    the whole cache is dropped, since any cached answer may rest on stale
+    context.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'saved_seconds': 0.0,
+            'saved_tokens': 0
+        }
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation"""
+        return re.sub(r'\s+', ' ', prompt.lower()).strip().rstrip('?!. ')
+
+    def make_key(self, prompt: str, context: str, params: Dict[str, Any]) -> str:
+        context_hash = hashlib.sha256(context.encode('utf-8')).hexdigest()
+        material = json.dumps([self.normalize_prompt(prompt), context_hash, params], sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _check_version(self, version: Optional[int]):
+        if version is not None and version != self._version:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: str, version: Optional[int] = None) -> Optional[str]:
+        """Return a cached response, counting a hit or miss"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl > 0 and time.monotonic() - entry['stored_at'] > self.ttl:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            self._stats['saved_seconds'] += entry['latency']
+            self._stats['saved_tokens'] += entry['tokens']
+            return entry['response']
+
+    def put(self, key: str, response: str, version: Optional[int] = None, latency: float = 0.0, tokens: int = 0):
+        """Store a response with the upstream latency and token usage it cost"""
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = {
+                'response': response,
+                'stored_at': time.monotonic(),
+                'latency': latency,
+                'tokens': tokens
+            }
+            self._entries.move_to_end(key)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            return stats
@@ -0,0 +1,373 @@
+import hashlib
+import threading
+from typing import List, Dict, Tuple, Optional, Set
+from services.tokenizer import tokenizer
+from services.chunker import PassageChunker
+from services.metrics import metrics
+from services.logger import get_logger
+
+logger = get_logger('index')
+
+try:
+    import numpy as np
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+    logger.warning("Scikit-learn not available, TF-IDF index disabled")
+
+
+class TfidfIndex:
+    """Long-lived TF-IDF index over knowledge items.
+
+    The vocabulary and IDF weights are fitted once on build. Writes transform
+    only the affected document with the fitted vectorizer: its new row goes
+    to a small pending matrix and its old row, if any, is masked out of the
+    fitted one, so a query costs one ``transform`` of the query plus two
+    sparse mat-vecs. The write that takes the changes since the last fit past
+    ``refit_ratio`` of the corpus refits, folding everything back into one
+    matrix. A single write whose words are mostly out of vocabulary
+    (``oov_refit_ratio``) also refits, so new topics stay findable.
+    """
+
+    def __init__(self, refit_ratio: float = 0.2, max_features: Optional[int] = None, oov_refit_ratio: float = 0.5):
+        self.refit_ratio = refit_ratio
+        self.oov_refit_ratio = oov_refit_ratio
+        self.max_features = max_features
+        self.vectorizer = None
+        self._lock = threading.RLock()
+        self._items: Dict[str, Dict] = {}
+        # Fitted matrix: row ids, the items they were built from, and rows since edited or removed
+        self._ids: List[str] = []
+        self._matrix = None
+        self._row_items: List[Dict] = []
+        self._row_of: Dict[str, int] = {}
+        self._masked: Set[int] = set()
+        # Rows written since the matrix was built
+        self._pending: Dict[str, 'sp.csr_matrix'] = {}
+        self._pending_items: List[Dict] = []
+        self._pending_matrix = None
+        self._changes_since_fit = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _document_text(self, item: Dict) -> str:
+        return f"{item.get('title', '')} {item.get('content', '')}"
+
+    def _new_vectorizer(self):
+        # Unigrams + bigrams over the shared tokenizer's words (the OOV check in add() counts words only)
+        return TfidfVectorizer(
+            max_features=self.max_features,
+            analyzer=tokenizer.analyze
+        )
+
+    def build(self, knowledge_items: List[Dict]):
+        """Fit the vectorizer on the full corpus and replace the index"""
+        with self._lock:
+            self._items = {str(item['id']): item for item in knowledge_items if item.get('id') is not None}
+            self._fit()
+
+    def _fit(self):
+        self._changes_since_fit = 0
+        self._publish([], None)
+
+        if not SKLEARN_AVAILABLE or not self._items:
+            self.vectorizer = None
+            return
+
+        ids = list(self._items.keys())
+        vectorizer = self._new_vectorizer()
+        try:
+            with metrics.span('tfidf_fit'):
+                token_lists = tokenizer.tokenize_batch(self._document_text(self._items[i]) for i in ids)
+                matrix = vectorizer.fit_transform(token_lists).tocsr()
+        except ValueError:
+            # Empty vocabulary (e.g. only stop words in the corpus)
+            self.vectorizer = None
+            return
+
+        self.vectorizer = vectorizer
+        self._publish(ids, matrix)
+
+    def _publish(self, ids: List[str], matrix):
+        """Make ``matrix`` (rows in ``ids`` order) the fitted matrix and clear pending writes"""
+        self._ids = ids
+        self._matrix = matrix
+        self._row_items = [self._items[item_id] for item_id in ids]
+        self._row_of = {item_id: row for row, item_id in enumerate(ids)}
+        self._masked = set()
+        self._pending = {}
+        self._refresh_pending()
+
+    def _refresh_pending(self):
+        pending_ids = list(self._pending)
+        self._pending_items = [self._items[item_id] for item_id in pending_ids]
+        self._pending_matrix = sp.vstack([self._pending[item_id] for item_id in pending_ids], format='csr') \
+            if pending_ids else None
+
+    def _ensure_ready(self):
+        """Fold pending writes into the fitted matrix (for exports that need one matrix)"""
+        with self._lock:
+            if self.vectorizer is None or (not self._pending and not self._masked):
+                return
+            kept = [row for row in range(len(self._ids)) if row not in self._masked]
+            parts = [self._matrix[kept]] if kept else []
+            if self._pending_matrix is not None:
+                parts.append(self._pending_matrix)
+            ids = [self._ids[row] for row in kept] + list(self._pending)
+            matrix = sp.vstack(parts, format='csr') if parts else \
+                sp.csr_matrix((0, len(self.vectorizer.vocabulary_)))
+            self._publish(ids, matrix)
+
+    def _content_hash(self, item: Dict) -> str:
+        return hashlib.sha1(self._document_text(item).encode('utf-8')).hexdigest()
+
+    def export_state(self) -> Optional[Dict]:
+        """Fitted vocabulary, IDF weights and document rows, as saved by IndexSnapshotStore"""
+        with self._lock:
+            self._ensure_ready()
+            if self.vectorizer is None or not self._ids:
+                return None
+            vocabulary = sorted(self.vectorizer.vocabulary_.items(), key=lambda entry: entry[1])
+            return {
+                'terms': [term for term, _ in vocabulary],
+                'idf': self.vectorizer.idf_,
+                'matrix': self._matrix,
+                'ids': list(self._ids),
+                'hashes': [self._content_hash(self._items[item_id]) for item_id in self._ids]
+            }
+
+    def restore_state(self, state: Dict, knowledge_items: List[Dict]) -> int:
+        """Adopt a saved fit, then apply only the items that changed since; returns the number applied
+
+        Unchanged items reuse their saved rows. New and edited items are
+        transformed with the saved vocabulary like any other write; when more
+        than ``refit_ratio`` of the corpus changed, the index is refitted instead.
+        """
+        items = {str(item['id']): item for item in knowledge_items if item.get('id') is not None}
+        kept = [
+            row for row, (item_id, digest) in enumerate(zip(state['ids'], state['hashes']))
+            if item_id in items and self._content_hash(items[item_id]) == digest
+        ]
+        removed = sum(1 for item_id in state['ids'] if item_id not in items)
+        if len(items) - len(kept) > self.refit_ratio * max(len(items), 1):
+            self.build(knowledge_items)
+            return len(items) - len(kept) + removed
+        vectorizer = self._new_vectorizer()
+        vectorizer.set_params(vocabulary={term: column for column, term in enumerate(state['terms'])})
+        vectorizer.idf_ = state['idf']
+        with self._lock:
+            self.vectorizer = vectorizer
+            ids = [state['ids'][row] for row in kept]
+            self._items = {item_id: items[item_id] for item_id in ids}
+            self._changes_since_fit = 0
+            self._publish(ids, state['matrix'][kept] if kept else sp.csr_matrix((0, len(state['terms']))))
+            changed = [item for item_id, item in items.items() if item_id not in self._items]
+            for item in changed:
+                self.add(item)
+            return len(changed) + removed
+
+    def _record_change(self):
+        """Count a removal; refit once enough has changed, otherwise rebuild the pending rows"""
+        self._changes_since_fit += 1
+        if self._changes_since_fit > self.refit_ratio * max(len(self._items), 1):
+            self._fit()
+        else:
+            self._refresh_pending()
+
+    def add(self, item: Dict):
+        """Add or replace a single item without refitting the vocabulary"""
+        self.add_many([item])
+
+    def add_many(self, knowledge_items: List[Dict]):
+        """Add or replace items with one batch transform, or one refit if the batch is large"""
+        items = [item for item in knowledge_items if item.get('id') is not None]
+        if not items:
+            return
+        token_lists = tokenizer.tokenize_batch(self._document_text(item) for item in items) if len(items) > 1 \
+            else [tokenizer.index_tokens(self._document_text(items[0]))]
+        with self._lock:
+            for item in items:
+                self._items[str(item['id'])] = item
+            self._changes_since_fit += len(items)
+            if self.vectorizer is None or self._changes_since_fit > self.refit_ratio * max(len(self._items), 1):
+                self._fit()
+                return
+            # The vocabulary also has bigrams, but new pairs of known words are routine and not worth a refit
+            terms = {term for tokens in token_lists for term in tokens}
+            unknown = sum(1 for term in terms if term not in self.vectorizer.vocabulary_)
+            if terms and unknown > self.oov_refit_ratio * len(terms):
+                self._fit()
+                return
+            rows = self.vectorizer.transform(token_lists).tocsr()
+            for position, item in enumerate(items):
+                item_id = str(item['id'])
+                if item_id in self._row_of:
+                    self._masked.add(self._row_of[item_id])
+                self._pending[item_id] = rows[position]
+            self._refresh_pending()
+
+    def update(self, item: Dict):
+        """Re-vectorize an edited item in place"""
+        self.add(item)
+
+    def remove(self, item_id: str):
+        """Drop an item from the index"""
+        item_id = str(item_id)
+        with self._lock:
+            if self._items.pop(item_id, None) is None:
+                return
+            if item_id in self._row_of:
+                self._masked.add(self._row_of[item_id])
+            self._pending.pop(item_id, None)
+            self._record_change()
+
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.0) -> List[Tuple[Dict, float]]:
+        """Return the top-k items by cosine similarity to the query"""
+        with self._lock:
+            if self.vectorizer is None or self._matrix is None:
+                return []
+            # Everything read after the lock is released is replaced, never mutated, by writers
+            matrix, row_items = self._matrix, self._row_items
+            pending_matrix, pending_items = self._pending_matrix, self._pending_items
+            masked = np.fromiter(self._masked, dtype=np.int64, count=len(self._masked))
+            query_vector = self.vectorizer.transform([query])
+
+        # Rows are L2-normalised by the vectorizer, so the dot product is the cosine
+        similarities = np.asarray((matrix @ query_vector.T).todense()).ravel()
+        similarities[masked] = -np.inf
+        if pending_matrix is not None:
+            similarities = np.concatenate([similarities, np.asarray((pending_matrix @ query_vector.T).todense()).ravel()])
+        candidates = np.flatnonzero(similarities >= max(threshold, 1e-12))
+        if candidates.size == 0:
+            return []
+        if candidates.size > top_k:
+            top = np.argpartition(-similarities[candidates], top_k - 1)[:top_k]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-similarities[candidates], kind='stable')]
+
+        base_rows = len(row_items)
+        return [(row_items[i] if i < base_rows else pending_items[i - base_rows], float(similarities[i]))
+                for i in candidates]
+
+
+class PassageIndex:
+    """Indexes passages of knowledge items instead of whole documents.
+
+    Wraps any index with the ``build/add/update/remove/search`` interface.
+    Items are split by ``chunker`` and their passages (see ``PassageChunker``)
+    are what the wrapped index stores and returns, so retrieval ranks the
+    best passages across documents. ``documents`` collapses passage hits
+    back onto their parent items. A wrapped index that can publish parents
+    (``SharedIndex``) is handed them too, so hits on passages written by
+    another process still resolve.
+    """
+
+    def __init__(self, index, chunker: PassageChunker):
+        self.index = index
+        self.chunker = chunker
+        self._lock = threading.RLock()
+        self._parents: Dict[str, Dict] = {}
+        self._passage_ids: Dict[str, List[str]] = {}
+        self._shared_parents = callable(getattr(index, 'parent', None))
+
+    def __len__(self) -> int:
+        return len(self._parents)
+
+    @property
+    def passage_count(self) -> int:
+        return sum(len(ids) for ids in self._passage_ids.values())
+
+    def _chunk_corpus(self, knowledge_items: List[Dict]) -> List[Dict]:
+        """Reset the parent tables from ``knowledge_items`` and return all of their passages"""
+        self._parents = {}
+        self._passage_ids = {}
+        passages = []
+        for item in knowledge_items:
+            if item.get('id') is None:
+                continue
+            item_passages = self.chunker.chunk(item)
+            self._parents[str(item['id'])] = item
+            self._passage_ids[str(item['id'])] = [passage['id'] for passage in item_passages]
+            passages.extend(item_passages)
+        return passages
+
+    def build(self, knowledge_items: List[Dict]):
+        """Chunk the full corpus and rebuild the wrapped index from its passages"""
+        with self._lock:
+            passages = self._chunk_corpus(knowledge_items)
+            if self._shared_parents:
+                self.index.build(passages, parents=list(self._parents.values()))
+            else:
+                self.index.build(passages)
+
+    def export_state(self) -> Optional[Dict]:
+        """Saved state of the wrapped index (passages are re-chunked on restore)"""
+        return self.index.export_state()
+
+    def restore_state(self, state: Dict, knowledge_items: List[Dict]) -> int:
+        """Chunk the corpus and restore the wrapped index, applying only changed passages"""
+        with self._lock:
+            return self.index.restore_state(state, self._chunk_corpus(knowledge_items))
+
+    def add(self, item: Dict):
+        """Chunk one item and replace its passages in the wrapped index"""
+        self.add_many([item])
+
+    def add_many(self, knowledge_items: List[Dict]):
+        """Chunk items and hand all of their passages to the wrapped index in one batch"""
+        with self._lock:
+            passages = []
+            parents = []
+            for item in knowledge_items:
+                if item.get('id') is None:
+                    continue
+                item_id = str(item['id'])
+                item_passages = self.chunker.chunk(item)
+                new_ids = {passage['id'] for passage in item_passages}
+                for passage_id in self._passage_ids.get(item_id, []):
+                    if passage_id not in new_ids:
+                        self.index.remove(passage_id)
+                self._parents[item_id] = item
+                self._passage_ids[item_id] = [passage['id'] for passage in item_passages]
+                parents.append(item)
+                passages.extend(item_passages)
+            if parents and self._shared_parents:
+                self.index.add_parents(parents)
+            if passages:
+                self.index.add_many(passages)
+
+    def update(self, item: Dict):
+        """Re-chunk an edited item"""
+        self.add(item)
+
+    def remove(self, item_id: str):
+        """Drop an item and all of its passages"""
+        item_id = str(item_id)
+        with self._lock:
+            self._parents.pop(item_id, None)
+            for passage_id in self._passage_ids.pop(item_id, []):
+                self.index.remove(passage_id)
+            if self._shared_parents:
+                self.index.remove_parent(item_id)
+
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.0) -> List[Tuple[Dict, float]]:
+        """Return the top-k passages across all documents"""
+        return self.index.search(query, top_k=top_k, threshold=threshold)
+
+    def documents(self, hits: List[Tuple[Dict, float]], top_k: int = 5) -> List[Tuple[Dict, float]]:
+        """Collapse passage hits onto their parent items, each scored by its best passage"""
+        documents = []
+        seen = set()
+        for passage, score in hits:
+            parent_id = passage.get('parent_id')
+            parent = self.index.parent(parent_id) if self._shared_parents else self._parents.get(parent_id)
+            if parent is None or parent_id in seen:
+                continue
+            seen.add(parent_id)
+            documents.append((parent, score))
+            if len(documents) == top_k:
+                break
+        return documents
@@ -0,0 +1,140 @@
+import time
+import zlib
+import threading
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from services.logger import get_logger
+
+logger = get_logger('cache')
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not available, semantic answer cache disabled")
+
+from services.nlp_service import nlp_service
+
+# Question scaffolding that does not change what is being asked about
+FILLER_WORDS = {
+    'what', 'whats', 'explain', 'tell', 'me', 'about', 'describe', 'define', 'definition',
+    'meaning', 'please', 'can', 'could', 'you', 'give', 'overview'
+}
+# Stop words that flip the meaning of a question and must survive tokenization
+NEGATION_WORDS = {'no', 'nor', 'not', 'never', 'without', 'against'}
+
+
+class SemanticCache:
+    """Near-duplicate question cache in front of the chat pipeline.
+
+    Questions are embedded (with the sentence model when one is loaded,
+    otherwise as hashed content words and word pairs, so negation and word
+    order still count) into a fixed-size matrix of
+    normalised vectors. A lookup is one matrix-vector product; the best match
+    above ``threshold`` is served if it was answered under the current
+    knowledge version. Entries from older versions are dropped on sight and
+    the least recently used entry is evicted when the cache is full.
+    """
+
+    def __init__(self, capacity: int = 1000, threshold: float = 0.9, hash_dim: int = 2048,
+                 embedder: Optional[Callable[[List[str]], 'np.ndarray']] = None):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.hash_dim = hash_dim
+        self.embedder = embedder
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._last_used = np.zeros(capacity, dtype=np.float64) if NUMPY_AVAILABLE else None
+        self._live = np.zeros(capacity, dtype=bool) if NUMPY_AVAILABLE else None
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'stale_dropped': 0}
+
+    def _hashed_vector(self, text: str) -> 'np.ndarray':
+        tokenizer = nlp_service.tokenizer
+        stop_words = tokenizer.stop_words
+        words = [word for word in tokenizer.normalize(text).split()
+                 if word in NEGATION_WORDS or (len(word) > 1 and word not in stop_words and word not in FILLER_WORDS)]
+        vector = np.zeros(self.hash_dim, dtype=np.float32)
+        for token in tokenizer.ngrams(words, 2):
+            vector[zlib.crc32(token.encode('utf-8')) % self.hash_dim] += 1.0
+        return vector
+
+    def embed(self, text: str) -> 'np.ndarray':
+        """Return the normalised question vector"""
+        if self.embedder is not None:
+            vector = np.asarray(self.embedder([text]), dtype=np.float32).reshape(-1)
+        else:
+            vector = self._hashed_vector(text)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question: str, version: Optional[int] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (cached response, similarity) for a near-duplicate question"""
+        if not NUMPY_AVAILABLE:
+            return None
+        query = self.embed(question)
+        if not query.any():
+            return None
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != query.shape[0] or not self._live.any():
+                self._stats['misses'] += 1
+                return None
+            similarities = self._vectors @ query
+            similarities[~self._live] = -1.0
+            while True:
+                slot = int(np.argmax(similarities))
+                similarity = float(similarities[slot])
+                if similarity < self.threshold:
+                    self._stats['misses'] += 1
+                    return None
+                entry = self._entries[slot]
+                if version is not None and entry['version'] != version:
+                    # Answered against an older corpus: drop it and keep looking
+                    self._release(slot)
+                    self._stats['stale_dropped'] += 1
+                    similarities[slot] = -1.0
+                    continue
+                self._last_used[slot] = time.monotonic()
+                self._stats['hits'] += 1
+                return entry['response'], similarity
+
+    def store(self, question: str, response: Dict[str, Any], version: Optional[int] = None):
+        """Remember the answer to a question, evicting the least recently used entry if full"""
+        if not NUMPY_AVAILABLE:
+            return
+        vector = self.embed(question)
+        if not vector.any():
+            return
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._live[:] = False
+            free = np.flatnonzero(~self._live)
+            if free.size:
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._stats['evictions'] += 1
+            self._vectors[slot] = vector
+            self._entries[slot] = {'question': question, 'response': response, 'version': version}
+            self._last_used[slot] = time.monotonic()
+            self._live[slot] = True
+            self._stats['stores'] += 1
+
+    def _release(self, slot: int):
+        self._live[slot] = False
+        self._entries[slot] = None
+
+    def clear(self):
+        with self._lock:
+            if self._live is not None:
+                self._live[:] = False
+            self._entries = [None] * self.capacity
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = int(self._live.sum()) if self._live is not None else 0
+            stats['capacity'] = self.capacity
+            stats['threshold'] = self.threshold
+            return stats
@@ -0,0 +1,663 @@
+import os
+import json
+import math
+import time
+import uuid
+import shutil
+import bisect
+import hashlib
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Optional, Callable, Any
+from services.tokenizer import tokenizer
+from services.search_index import TfidfIndex
+from services.logger import get_logger
+
+logger = get_logger('index')
+
+try:
+    import numpy as np
+    import scipy.sparse as sp
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+    logger.warning("SciPy not available, shared search index disabled")
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+DEFAULT_SHARED_INDEX_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'index', 'shared')
+FORMAT_VERSION = 2
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = '.lock'
+LEADER_FILE = '.leader'
+JOURNAL_DIR = 'journal'
+# Tables a write can target: indexed entries, and the parent documents they resolve to
+ITEMS = 'items'
+PARENTS = 'parents'
+
+
+def corpus_digest(items: List[Dict]) -> str:
+    """Order-independent digest of the searchable fields of ``items``"""
+    entries = sorted(
+        (str(item['id']), hashlib.sha1(f"{item.get('title', '')}\0{item.get('content', '')}".encode('utf-8')).hexdigest())
+        for item in items if item.get('id') is not None
+    )
+    return hashlib.sha1(json.dumps(entries).encode('utf-8')).hexdigest()
+
+
+def _document_text(item: Dict) -> str:
+    return f"{item.get('title', '')} {item.get('content', '')}"
+
+
+def _write_strings(directory: str, name: str, strings: List[str]):
+    """Store strings as one UTF-8 blob plus an offsets array"""
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f"{name}.bin"), 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+
+
+class StringTable:
+    """Read-only, memory-mapped table of strings written by ``_write_strings``"""
+
+    def __init__(self, directory: str, name: str):
+        self.offsets = np.load(os.path.join(directory, f"{name}_offsets.npy"), mmap_mode='r')
+        path = os.path.join(directory, f"{name}.bin")
+        # np.memmap cannot map an empty file
+        self.blob = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        return self.blob[self.offsets[position]:self.offsets[position + 1]].tobytes().decode('utf-8')
+
+
+class IndexGeneration:
+    """One published, immutable index generation mapped read-only.
+
+    Arrays are opened with ``mmap_mode='r'``, so every process that maps the
+    same generation shares its physical pages through the page cache. Only
+    the rows of the top hits are ever decoded.
+    """
+
+    def __init__(self, path: str, encoder: Optional[Callable[[List[str]], Any]] = None):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported shared index format in {path}")
+        self.kind = self.manifest['kind']
+        self.digest = self.manifest['digest']
+        # Highest write sequence applied per writer process, for retiring their unpublished overlays
+        self.applied: Dict[str, int] = self.manifest.get('applied', {})
+        self.ids = StringTable(path, 'ids')
+        self.items = StringTable(path, 'items')
+        # Parent documents by id, sorted by id (empty unless a PassageIndex publishes through us)
+        self.parent_ids = StringTable(path, 'parent_ids')
+        self.parents = StringTable(path, 'parents')
+        self.encoder = encoder
+        if self.kind == 'tfidf':
+            shape = tuple(self.manifest['shape'])
+            self.matrix = sp.csr_matrix((
+                np.load(os.path.join(path, 'data.npy'), mmap_mode='r'),
+                np.load(os.path.join(path, 'indices.npy'), mmap_mode='r'),
+                np.load(os.path.join(path, 'indptr.npy'), mmap_mode='r')
+            ), shape=shape, copy=False)
+            self.terms = StringTable(path, 'terms')
+            self.term_columns = np.load(os.path.join(path, 'term_columns.npy'), mmap_mode='r')
+            self.idf = np.load(os.path.join(path, 'idf.npy'), mmap_mode='r')
+        else:
+            self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def item(self, position: int) -> Dict:
+        return json.loads(self.items[position])
+
+    def all_items(self) -> List[Dict]:
+        return [self.item(position) for position in range(len(self))]
+
+    def parent(self, parent_id: str) -> Optional[Dict]:
+        position = bisect.bisect_left(self.parent_ids, parent_id)
+        if position < len(self.parent_ids) and self.parent_ids[position] == parent_id:
+            return json.loads(self.parents[position])
+        return None
+
+    def all_parents(self) -> List[Dict]:
+        return [json.loads(self.parents[position]) for position in range(len(self.parents))]
+
+    def _column(self, term: str) -> Optional[int]:
+        position = bisect.bisect_left(self.terms, term)
+        if position < len(self.terms) and self.terms[position] == term:
+            return int(self.term_columns[position])
+        return None
+
+    def _query_vector(self, query: str):
+        """TF-IDF query vector, matching TfidfVectorizer(norm='l2', smooth_idf=True)"""
+        counts: Dict[int, int] = {}
+        for term in tokenizer.analyze(query):
+            column = self._column(term)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        if not counts:
+            return None
+        columns = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * self.idf[columns]
+        values /= np.linalg.norm(values)
+        return sp.csr_matrix((values, (columns, np.zeros(len(columns), dtype=np.int32))),
+                             shape=(self.matrix.shape[1], 1))
+
+    def similarities(self, query: str) -> Optional['np.ndarray']:
+        if len(self) == 0:
+            return None
+        if self.kind == 'tfidf':
+            query_vector = self._query_vector(query)
+            if query_vector is None:
+                return None
+            return np.asarray((self.matrix @ query_vector).todense()).ravel()
+        return self.vectors @ self._encode([query])[0]
+
+    def _encode(self, texts: List[str]) -> 'np.ndarray':
+        vectors = np.asarray(self.encoder(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def _term_weights(self, text: str) -> Dict[str, float]:
+        """L2-normalised TF-IDF weights of ``text``, giving unseen terms the idf of a one-document term"""
+        counts = Counter(tokenizer.analyze(text))
+        unseen_idf = math.log((len(self) + 2) / 2) + 1
+        weights = {}
+        for term, count in counts.items():
+            column = self._column(term)
+            weights[term] = count * (float(self.idf[column]) if column is not None else unseen_idf)
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {term: weight / norm for term, weight in weights.items()} if norm else {}
+
+    def search_overlaid(self, query: str, overlay: Dict[str, Optional[Dict]], top_k: int = 5,
+                        threshold: float = 0.0, vectors: Optional[Dict[str, Any]] = None) -> List[Tuple[Dict, float]]:
+        """Search with ``overlay`` (id -> item, None when removed) replacing this generation's entries
+
+        Overlay items are scored as if they were in the generation; terms it
+        has never seen count as rare. ``vectors`` caches their vectors by id
+        and is only valid for this generation.
+        """
+        vectors = {} if vectors is None else vectors
+        items = [item for item in overlay.values() if item is not None]
+        missing = [item for item in items if vectors.get(str(item['id']), (None,))[0] is not item]
+        scale = 1.0
+        if self.kind == 'tfidf':
+            query_weights = self._term_weights(query)
+            # Generation scores are normalised over known terms only; put them on the same query norm
+            scale = math.sqrt(sum(weight * weight for term, weight in query_weights.items()
+                                  if self._column(term) is not None))
+            for item in missing:
+                vectors[str(item['id'])] = (item, self._term_weights(_document_text(item)))
+            scored = [(item, sum(weight * vectors[str(item['id'])][1].get(term, 0.0)
+                                 for term, weight in query_weights.items())) for item in items]
+        else:
+            query_vector = self._encode([query])[0]
+            if missing:
+                for item, vector in zip(missing, self._encode([_document_text(item).strip() for item in missing])):
+                    vectors[str(item['id'])] = (item, vector)
+            scored = [(item, float(vectors[str(item['id'])][1] @ query_vector)) for item in items]
+        floor = max(threshold, 1e-12)
+        hits = [(item, score * scale) for item, score in self.search(query, top_k + len(overlay), threshold)
+                if str(item.get('id')) not in overlay and score * scale >= floor]
+        hits.extend((item, score) for item, score in scored if score >= floor)
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:top_k]
+
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.0) -> List[Tuple[Dict, float]]:
+        similarities = self.similarities(query)
+        if similarities is None:
+            return []
+        candidates = np.flatnonzero(similarities >= max(threshold, 1e-12))
+        if candidates.size == 0:
+            return []
+        if candidates.size > top_k:
+            candidates = candidates[np.argpartition(-similarities[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-similarities[candidates], kind='stable')]
+        return [(self.item(int(row)), float(similarities[row])) for row in candidates]
+
+
+class SharedIndex:
+    """Search index built once and shared read-only by every worker process.
+
+    Published generations are immutable directories; publishing writes a
+    temporary directory, renames it into place and then atomically replaces
+    the ``CURRENT`` pointer, so readers never see a partial generation.
+    Searches re-read the pointer at most every ``check_interval`` seconds
+    and keep serving the mapped generation until a newer one is published.
+
+    Only one process at a time publishes: the leader, which holds an
+    exclusive lock on ``.leader``. Each process buffers its own writes, and
+    its publisher thread flushes them once writes pause for
+    ``publish_delay`` seconds. A follower hands them to the leader as a
+    file under ``journal/``; the leader applies its own and the journaled
+    writes incrementally to a live in-memory index from ``factory`` (a
+    ``TfidfIndex`` refits only past its ``refit_ratio``) and publishes the
+    result. When no generation exists yet, ``build`` publishes the first
+    one itself so there is something to serve. Later corpus reloads are
+    only adopted from the leader's ``build``; followers serve what the
+    leader publishes.
+
+    Until a write is published, the process that made it overlays it on
+    the mapped generation, so a writer always reads its own writes. Every
+    write carries a per-process sequence number and each generation records
+    the highest one applied for each writer, which retires the overlay.
+    A ``PassageIndex`` also publishes its parent documents here (``parent``),
+    so every process can resolve passage hits written by any other.
+    """
+
+    def __init__(self, factory: Callable[[], Any], directory: str = DEFAULT_SHARED_INDEX_DIR,
+                 encoder: Optional[Callable[[List[str]], Any]] = None, check_interval: float = 1.0,
+                 keep_generations: int = 3, publish_delay: float = 1.0):
+        self.factory = factory
+        self.directory = directory
+        self.journal_directory = os.path.join(directory, JOURNAL_DIR)
+        self.encoder = encoder
+        self.check_interval = check_interval
+        self.keep_generations = max(1, keep_generations)
+        self.publish_delay = publish_delay
+        # A steady stream of writes is still published at least this often
+        self.max_publish_delay = max(publish_delay * 10, publish_delay)
+        self._lock = threading.RLock()
+        self._generation: Optional[IndexGeneration] = None
+        self._checked_at = 0.0
+        # Writes are keyed by (table, id); a None value removes the entry
+        self._pending: Dict[Tuple[str, str], Optional[Dict]] = {}
+        self._pending_since = 0.0
+        self._last_write = 0.0
+        self._writer = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._sequence = 0
+        # This process's writes not yet in the mapped generation: (table, id) -> (sequence, item)
+        self._unpublished: Dict[Tuple[str, str], Tuple[int, Optional[Dict]]] = {}
+        self._overlay_vectors: Dict[str, Any] = {}
+        self._corpus_request: Optional[Tuple[List[Dict], Optional[List[Dict]]]] = None
+        # Leader only: (generation it was built for, index, items by id, parents by id, applied sequences)
+        self._live: Optional[Tuple[Optional[str], Any, Dict[str, Dict], Dict[str, Dict], Dict[str, int]]] = None
+        self._leader_file = None
+        self._wake = threading.Event()
+        self._publisher_pid: Optional[int] = None
+        os.makedirs(self.journal_directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        generation = self._generation
+        return len(generation) if generation is not None else 0
+
+    @property
+    def generation(self) -> Optional[str]:
+        generation = self._generation
+        return generation.name if generation is not None else None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_file is not None and self._publisher_pid == os.getpid()
+
+    @contextmanager
+    def _publish_lock(self):
+        """Serialise publishing across processes"""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _current_name(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self, force: bool = False):
+        """Swap to the published generation if it changed"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        name = self._current_name()
+        if name is None or (self._generation is not None and self._generation.name == name):
+            return
+        try:
+            generation = IndexGeneration(os.path.join(self.directory, name), self.encoder)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not map shared index generation %s: %s", name, e)
+            return
+        with self._lock:
+            self._generation = generation
+            self._overlay_vectors = {}
+            applied = generation.applied.get(self._writer, 0)
+            self._unpublished = {key: entry for key, entry in self._unpublished.items() if entry[0] > applied}
+
+    def _export(self, index, items: Dict[str, Dict], path: str) -> Dict[str, Any]:
+        """Write an in-memory index and its items (by id) into ``path``; returns manifest fields"""
+        if isinstance(index, TfidfIndex):
+            index._ensure_ready()
+            ids = list(index._ids) if index.vectorizer is not None else []
+            matrix = index._matrix if ids else sp.csr_matrix((0, 0))
+            vocabulary = sorted(index.vectorizer.vocabulary_.items()) if ids else []
+            np.save(os.path.join(path, 'data.npy'), matrix.data)
+            np.save(os.path.join(path, 'indices.npy'), matrix.indices)
+            np.save(os.path.join(path, 'indptr.npy'), matrix.indptr)
+            _write_strings(path, 'terms', [term for term, _ in vocabulary])
+            np.save(os.path.join(path, 'term_columns.npy'), np.array([column for _, column in vocabulary], dtype=np.int32))
+            np.save(os.path.join(path, 'idf.npy'), index.vectorizer.idf_ if ids else np.zeros(0))
+            fields = {'kind': 'tfidf', 'shape': list(matrix.shape)}
+        else:
+            ids, vectors = index.vectors()
+            np.save(os.path.join(path, 'vectors.npy'), np.ascontiguousarray(vectors, dtype=np.float32))
+            fields = {'kind': 'dense', 'dimensions': int(vectors.shape[1]) if vectors.ndim == 2 else 0}
+        _write_strings(path, 'ids', ids)
+        _write_strings(path, 'items', [json.dumps(items[item_id], default=str) for item_id in ids])
+        return fields
+
+    def _publish(self, index, items: Dict[str, Dict], parents: Dict[str, Dict], applied: Dict[str, int]) -> str:
+        """Write ``index`` as a new generation and point CURRENT at it (publish lock held)"""
+        staging = os.path.join(self.directory, f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            fields = self._export(index, items, staging)
+            parent_ids = sorted(parents)
+            _write_strings(staging, 'parent_ids', parent_ids)
+            _write_strings(staging, 'parents', [json.dumps(parents[parent_id], default=str) for parent_id in parent_ids])
+            manifest = dict(fields, format_version=FORMAT_VERSION,
+                            digest=corpus_digest(list(items.values())), documents=len(items),
+                            applied=applied, created_at=time.time())
+            with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            existing = [name for name in os.listdir(self.directory) if name.startswith('gen-')]
+            number = max((int(name[4:]) for name in existing), default=0) + 1
+            name = f"gen-{number:06d}"
+            os.rename(staging, os.path.join(self.directory, name))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        pointer = os.path.join(self.directory, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+        with open(pointer, 'w', encoding='utf-8') as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, os.path.join(self.directory, CURRENT_FILE))
+        logger.info("Published shared index %s (%d items)", name, len(items))
+        self._refresh(force=True)
+        self._prune(existing + [name])
+        return name
+
+    def _prune(self, names: List[str]):
+        # Mapped files stay readable in other processes after unlink, so old generations can go
+        for name in sorted(names)[:-self.keep_generations]:
+            if name != self.generation:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _build_live(self, items: List[Dict], parents: Optional[List[Dict]]) -> Tuple[Any, Dict[str, Dict], Dict[str, Dict]]:
+        index = self.factory()
+        index.build(items)
+        return index, self._by_id(items), self._by_id(parents or [])
+
+    @staticmethod
+    def _by_id(entries: List[Dict]) -> Dict[str, Dict]:
+        return {str(entry['id']): entry for entry in entries if entry.get('id') is not None}
+
+    def build(self, knowledge_items: List[Dict], parents: Optional[List[Dict]] = None):
+        """Map the published generation, publishing the first one if none exists yet
+
+        ``parents`` are the documents ``parent`` resolves, when the items are
+        their passages. A corpus that differs from the published generation is
+        handed to the publisher thread; the leader adopts it without blocking
+        the caller.
+        """
+        digest = corpus_digest(knowledge_items)
+        self._refresh(force=True)
+        if self._generation is None:
+            with self._publish_lock():
+                # Another worker may have published while we waited for the lock
+                self._refresh(force=True)
+                if self._generation is None:
+                    index, items, parent_items = self._build_live(knowledge_items, parents)
+                    name = self._publish(index, items, parent_items, {})
+                    self._live = (name, index, items, parent_items, {})
+                    return
+        if self._generation.digest == digest:
+            return
+        with self._lock:
+            self._corpus_request = (knowledge_items, parents)
+        self._ensure_publisher()
+        self._wake.set()
+
+    def _record(self, table: str, items: List[Tuple[str, Optional[Dict]]]):
+        if not items:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._pending_since = now
+            for item_id, item in items:
+                self._sequence += 1
+                self._pending[(table, item_id)] = item
+                self._unpublished[(table, item_id)] = (self._sequence, item)
+            self._last_write = now
+        self._ensure_publisher()
+        self._wake.set()
+
+    def add(self, item: Dict):
+        self.add_many([item])
+
+    def add_many(self, knowledge_items: List[Dict]):
+        self._record(ITEMS, [(str(item['id']), item) for item in knowledge_items if item.get('id') is not None])
+
+    def update(self, item: Dict):
+        self.add(item)
+
+    def remove(self, item_id: str):
+        self._record(ITEMS, [(str(item_id), None)])
+
+    def add_parents(self, parents: List[Dict]):
+        """Publish the documents that passage ``parent_id``s resolve to"""
+        self._record(PARENTS, [(str(parent['id']), parent) for parent in parents if parent.get('id') is not None])
+
+    def remove_parent(self, parent_id: str):
+        self._record(PARENTS, [(str(parent_id), None)])
+
+    def parent(self, parent_id: str) -> Optional[Dict]:
+        """A parent document: this process's unpublished write, else the mapped generation's"""
+        self._refresh()
+        with self._lock:
+            entry = self._unpublished.get((PARENTS, parent_id))
+            generation = self._generation
+        if entry is not None:
+            return entry[1]
+        return generation.parent(parent_id) if generation is not None else None
+
+    def _ensure_publisher(self):
+        """Start this process's publisher thread (again, in a forked child)"""
+        if self._publisher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._publisher_pid == os.getpid():
+                return
+            # A leader lock inherited across fork belongs to the parent
+            self._leader_file = None
+            self._live = None if self._publisher_pid is not None else self._live
+            if self._publisher_pid is not None:
+                # The parent flushes what it had already taken; keep overlaying only what we will flush
+                self._writer = f"{os.getpid()}-{uuid.uuid4().hex}"
+                self._unpublished = {key: entry for key, entry in self._unpublished.items() if key in self._pending}
+            self._publisher_pid = os.getpid()
+            threading.Thread(target=self._run, name='shared-index-publisher', daemon=True).start()
+
+    def _try_lead(self) -> bool:
+        if not FCNTL_AVAILABLE:
+            # No cross-process locking: every process publishes its own writes
+            self._leader_file = True
+            return True
+        leader_file = open(os.path.join(self.directory, LEADER_FILE), 'a+')
+        try:
+            fcntl.flock(leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            leader_file.close()
+            return False
+        self._leader_file = leader_file
+        logger.info("Process %d is now the shared index publisher", os.getpid())
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.publish_delay)
+            self._wake.clear()
+            # Debounce: wait for writes to pause, but not longer than max_publish_delay
+            while True:
+                with self._lock:
+                    wait = min(self._last_write + self.publish_delay,
+                               self._pending_since + self.max_publish_delay) - time.monotonic() if self._pending else 0
+                if wait <= 0:
+                    break
+                time.sleep(wait)
+            try:
+                if self.is_leader or self._try_lead():
+                    self._lead()
+                else:
+                    self._hand_off()
+            except Exception as e:
+                logger.error("Shared index publisher failed: %s", e)
+
+    def _take_pending(self) -> Tuple[Dict[Tuple[str, str], Optional[Dict]], Optional[Tuple], int]:
+        """Buffered writes, any corpus request, and the sequence number of the last write taken"""
+        with self._lock:
+            pending, corpus = self._pending, self._corpus_request
+            self._pending, self._corpus_request = {}, None
+            return pending, corpus, self._sequence
+
+    def _restore_pending(self, pending: Dict[Tuple[str, str], Optional[Dict]], corpus: Optional[Tuple] = None):
+        """Put writes taken by a failed flush back, behind any that arrived since"""
+        with self._lock:
+            self._pending = {**pending, **self._pending}
+            self._pending_since = time.monotonic()
+            if self._corpus_request is None:
+                self._corpus_request = corpus
+
+    def _hand_off(self):
+        """Follower: pass buffered writes to the leader through the journal"""
+        pending, _, sequence = self._take_pending()
+        if not pending:
+            return
+        try:
+            name = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex}.json"
+            staging = os.path.join(self.journal_directory, f".{name}")
+            changes = [[table, item_id, item] for (table, item_id), item in pending.items()]
+            with open(staging, 'w', encoding='utf-8') as f:
+                json.dump({'writer': self._writer, 'sequence': sequence, 'changes': changes}, f, default=str)
+            os.replace(staging, os.path.join(self.journal_directory, name))
+        except Exception:
+            self._restore_pending(pending)
+            raise
+
+    def _read_journal(self) -> List[Tuple[str, List]]:
+        entries = []
+        for name in sorted(os.listdir(self.journal_directory)):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.journal_directory, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entries.append((path, json.load(f)))
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping unreadable shared index journal %s: %s", name, e)
+        return entries
+
+    def _lead(self):
+        """Leader: apply buffered and journaled writes to the live index and publish it"""
+        pending, corpus, sequence = self._take_pending()
+        try:
+            journal = self._read_journal()
+            if not pending and not journal and corpus is None:
+                return
+            self._refresh(force=True)
+            generation = self._generation
+            changed = False
+            stale = self._live is None or self._live[0] != self.generation
+            applied = (dict(generation.applied) if generation is not None else {}) if stale else self._live[4]
+            if corpus is not None and (generation is None or generation.digest != corpus_digest(corpus[0])):
+                self._live = (None, *self._build_live(*corpus), applied)
+                changed = True
+            elif stale:
+                # Adopt what is published (first time leading, or a bootstrap by another worker)
+                self._live = (self.generation, *self._build_live(
+                    generation.all_items() if generation is not None else [],
+                    generation.all_parents() if generation is not None else []), applied)
+            _, index, items, parents, applied = self._live
+            for _, entry in journal:
+                for table, item_id, item in entry['changes']:
+                    changed |= self._apply(index, items, parents, table, item_id, item)
+                changed |= self._advance(applied, entry['writer'], entry['sequence'])
+            for (table, item_id), item in pending.items():
+                changed |= self._apply(index, items, parents, table, item_id, item)
+            if pending:
+                changed |= self._advance(applied, self._writer, sequence)
+            if changed:
+                with self._publish_lock():
+                    self._live = (self._publish(index, items, parents, applied), index, items, parents, applied)
+        except Exception:
+            self._restore_pending(pending, corpus)
+            raise
+        for path, _ in journal:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _advance(applied: Dict[str, int], writer: str, sequence: int) -> bool:
+        """Record that ``writer``'s writes up to ``sequence`` are applied"""
+        if applied.get(writer, 0) >= sequence:
+            return False
+        applied[writer] = sequence
+        return True
+
+    @staticmethod
+    def _apply(index, items: Dict[str, Dict], parents: Dict[str, Dict], table: str,
+               item_id: str, item: Optional[Dict]) -> bool:
+        if table == PARENTS:
+            if item is None:
+                return parents.pop(item_id, None) is not None
+            parents[item_id] = item
+            return True
+        if item is None:
+            if item_id not in items:
+                return False
+            del items[item_id]
+            index.remove(item_id)
+        elif item_id in items:
+            items[item_id] = item
+            index.update(item)
+        else:
+            items[item_id] = item
+            index.add(item)
+        return True
+
+    def search(self, query: str, top_k: int = 5, threshold: float = 0.0) -> List[Tuple[Dict, float]]:
+        """Return the top-k items of the current generation, overlaid with this process's unpublished writes"""
+        self._refresh()
+        with self._lock:
+            generation = self._generation
+            overlay = {item_id: entry[1] for (table, item_id), entry in self._unpublished.items() if table == ITEMS}
+            vectors = self._overlay_vectors
+        if generation is None:
+            return []
+        if not overlay:
+            return generation.search(query, top_k, threshold)
+        return generation.search_overlaid(query, overlay, top_k, threshold, vectors)
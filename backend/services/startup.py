@@ -0,0 +1,80 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, List, Tuple
+from services.logger import get_logger
+
+logger = get_logger('startup')
+
+# Captured as early as possible so the import phase can be measured
+PROCESS_STARTED = time.perf_counter()
+
+
+class StartupTracker:
+    """Times startup phases and tracks readiness separately from liveness.
+
+    ``STARTUP_MODE`` controls warm-up: ``background`` (default) loads heavy
+    resources in a daemon thread while the server already accepts requests,
+    ``eager`` loads them before ``create_app`` returns, and ``lazy`` skips
+    warm-up entirely so everything loads on first use.
+    """
+
+    def __init__(self):
+        self.mode = os.getenv('STARTUP_MODE', 'background').lower()
+        self.phases: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases[name] = round(seconds * 1000, 2)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block as a named startup phase; failures are recorded, not raised"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.errors[name] = str(e)
+            logger.warning("Startup phase '%s' failed: %s", name, e, extra={'phase': name})
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def _warm_up(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        started = time.perf_counter()
+        for name, step in steps:
+            with self.phase(name):
+                step()
+        self.record('warm_up_total', time.perf_counter() - started)
+        self._ready.set()
+
+    def start(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        """Run the warm-up steps according to STARTUP_MODE"""
+        if self.mode == 'lazy':
+            self._ready.set()
+        elif self.mode == 'eager':
+            self._warm_up(steps)
+        elif self._thread is None:
+            self._thread = threading.Thread(target=self._warm_up, args=(steps,), name='startup-warm-up', daemon=True)
+            self._thread.start()
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'mode': self.mode,
+                'phases_ms': dict(self.phases),
+                'errors': dict(self.errors)
+            }
+
+
+startup = StartupTracker()
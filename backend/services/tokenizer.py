@@ -0,0 +1,109 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Iterable, Optional, Set
+
+STOPWORDS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'stopwords_english.txt')
+
+_WORD_PATTERN = re.compile(r"\w+(?:'\w+)?|[^\w\s]")
+_SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])')
+_NON_ALPHA_PATTERN = re.compile(r'[^a-z\s]+')
+# Texts longer than this are documents, not queries, and are not worth caching
+_CACHEABLE_LENGTH = 512
+
+
+def load_stop_words() -> Set[str]:
+    """English stop words (bundled copy of the NLTK list)"""
+    try:
+        with open(STOPWORDS_FILE, 'r', encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+    except OSError:
+        # Basic English stop words
+        return set(['the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'])
+
+
+class Tokenizer:
+    """Dependency-free tokenizer built on precompiled regexes.
+
+    ``normalize``/``index_tokens`` define the canonical token stream used for
+    every index: lowercase ASCII letters only, whitespace-split, stop words
+    and single letters dropped. Results for short (query-sized) texts are kept
+    in a small LRU cache, since one chat message is tokenized by several
+    pipeline stages.
+    """
+
+    def __init__(self, stop_words: Optional[Set[str]] = None, cache_size: int = 4096):
+        self.stop_words = stop_words if stop_words is not None else load_stop_words()
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, List[str]]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def words(self, text: str) -> List[str]:
+        """Split text into word and punctuation tokens, preserving case"""
+        return _WORD_PATTERN.findall(text)
+
+    def count_tokens(self, text: str) -> int:
+        """Approximate LLM (BPE) token count: roughly one token per four characters of a word"""
+        return sum(1 + (len(piece) - 1) // 4 for piece in _WORD_PATTERN.findall(text))
+
+    def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of ``text`` whose approximate token count fits ``max_tokens``"""
+        used = 0
+        end = 0
+        for match in _WORD_PATTERN.finditer(text):
+            used += 1 + (match.end() - match.start() - 1) // 4
+            if used > max_tokens:
+                return text[:end]
+            end = match.end()
+        return text
+
+    def sentences(self, text: str) -> List[str]:
+        """Split text into sentences on terminal punctuation"""
+        return [sentence for sentence in _SENTENCE_PATTERN.split(text.strip()) if sentence]
+
+    def normalize(self, text: str) -> str:
+        """Lowercase, strip everything but letters and collapse whitespace"""
+        return ' '.join(_NON_ALPHA_PATTERN.sub('', text.lower()).split())
+
+    def _index_tokens(self, text: str) -> List[str]:
+        stop_words = self.stop_words
+        return [word for word in _NON_ALPHA_PATTERN.sub('', text.lower()).split()
+                if len(word) > 1 and word not in stop_words]
+
+    def index_tokens(self, text: str) -> List[str]:
+        """Stable, stop-word-free tokens for indexing and querying"""
+        if self.cache_size <= 0 or len(text) > _CACHEABLE_LENGTH:
+            return self._index_tokens(text)
+        with self._cache_lock:
+            tokens = self._cache.get(text)
+            if tokens is not None:
+                self._cache.move_to_end(text)
+                return list(tokens)
+        tokens = self._index_tokens(text)
+        with self._cache_lock:
+            self._cache[text] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return list(tokens)
+
+    def tokenize_batch(self, texts: Iterable[str]) -> List[List[str]]:
+        """Index tokens for many documents in one pass (bypasses the query cache)"""
+        tokenize = self._index_tokens
+        return [tokenize(text) for text in texts]
+
+    @staticmethod
+    def ngrams(tokens: List[str], max_n: int = 2) -> List[str]:
+        """Tokens plus space-joined n-grams up to ``max_n``"""
+        grams = list(tokens)
+        for n in range(2, max_n + 1):
+            grams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def analyze(self, document) -> List[str]:
+        """Unigram + bigram analyzer for vectorizers; accepts text or pre-tokenized lists"""
+        tokens = document if isinstance(document, list) else self.index_tokens(document)
+        return self.ngrams(tokens, 2)
+
+
+tokenizer = Tokenizer()
@@ -1,17 +1,29 @@
 import json
 import os
+import threading
 from typing import List, Dict, Any
+from services.logger import get_logger
+
+logger = get_logger('training')
 
 class TrainingService:
     def __init__(self, data_dir: str = 'data'):
         self.data_dir = os.path.join(os.path.dirname(__file__), '..', data_dir)
         self.cybersecurity_knowledge: List[Dict[str, Any]] = []
         self.team_information: Dict[str, Any] = {}
+        self._loaded = False
+        self._load_lock = threading.Lock()
 
     def load_data(self):
         """Load training data from JSON files."""
-        self._load_cybersecurity_knowledge()
-        self._load_team_information()
+        with self._load_lock:
+            self._load_cybersecurity_knowledge()
+            self._load_team_information()
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load_data()
 
     def _load_cybersecurity_knowledge(self):
         """Load cybersecurity knowledge from the JSON file."""
@@ -19,11 +31,11 @@ class TrainingService:
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 self.cybersecurity_knowledge = json.load(f)
-            print(f"Successfully loaded {len(self.cybersecurity_knowledge)} cybersecurity knowledge items.")
+            logger.info("Loaded %d cybersecurity knowledge items", len(self.cybersecurity_knowledge))
         except FileNotFoundError:
-            print(f"Warning: Cybersecurity knowledge file not found at {file_path}")
+            logger.warning("Cybersecurity knowledge file not found at %s", file_path)
         except json.JSONDecodeError:
-            print(f"Warning: Could not decode cybersecurity knowledge file at {file_path}")
+            logger.warning("Could not decode cybersecurity knowledge file at %s", file_path)
 
     def _load_team_information(self):
         """Load team information from the JSON file."""
@@ -31,20 +43,21 @@ class TrainingService:
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 self.team_information = json.load(f)
-            print("Successfully loaded team information.")
+            logger.info("Loaded team information")
         except FileNotFoundError:
-            print(f"Warning: Team information file not found at {file_path}")
+            logger.warning("Team information file not found at %s", file_path)
         except json.JSONDecodeError:
-            print(f"Warning: Could not decode team information file at {file_path}")
+            logger.warning("Could not decode team information file at %s", file_path)
 
     def get_all_cybersecurity_knowledge(self) -> List[Dict[str, Any]]:
         """Return all cybersecurity knowledge items."""
+        self._ensure_loaded()
         return self.cybersecurity_knowledge
 
     def get_team_information(self) -> Dict[str, Any]:
         """Return team information."""
+        self._ensure_loaded()
         return self.team_information
 
-# Instantiate and load data on startup
+# Data is loaded on first access (or by the startup warm-up)
 training_service = TrainingService()
-training_service.load_data()
@@ -0,0 +1,142 @@
+import time
+import queue
+import atexit
+import threading
+from typing import List, Dict, Any, Callable, Tuple
+from services.metrics import metrics
+from services.logger import get_logger
+
+logger = get_logger('write_behind')
+
+
+class WriteBehindQueue:
+    """Background write-behind pipeline that batches row inserts.
+
+    ``enqueue`` returns immediately; a daemon thread flushes rows through
+    ``flush_fn`` as one multi-row insert when ``max_batch`` rows are waiting
+    or ``flush_interval`` seconds have passed since the first one. When the
+    queue is full, callers block for up to ``put_timeout`` and then write
+    their row synchronously, so overload slows producers down instead of
+    dropping data. ``pending`` exposes rows not yet written, so readers can
+    merge them instead of waiting for a flush. ``close`` drains everything
+    still queued.
+    """
+
+    def __init__(self, flush_fn: Callable[[List[Dict[str, Any]]], None], name: str = 'write-behind',
+                 max_batch: int = 50, flush_interval: float = 1.0, max_queue: int = 10000,
+                 put_timeout: float = 0.5):
+        self.flush_fn = flush_fn
+        self.name = name
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: 'queue.Queue[Tuple[int, Dict[str, Any]]]' = queue.Queue(maxsize=max_queue)
+        # Rows accepted but not yet written (queued or in the batch being flushed), by sequence number
+        self._unwritten: Dict[int, Dict[str, Any]] = {}
+        self._sequence = 0
+        self._flush_now = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'failed': 0, 'sync_writes': 0}
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def enqueue(self, row: Dict[str, Any]):
+        """Queue a row for the next batch, applying backpressure when full"""
+        if self._stopping.is_set():
+            self._write([row])
+            return
+        self._ensure_started()
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            self._unwritten[sequence] = row
+        try:
+            self._queue.put((sequence, row), timeout=self.put_timeout)
+            self._count('enqueued')
+        except queue.Full:
+            with self._lock:
+                self._unwritten.pop(sequence, None)
+            self._count('sync_writes')
+            self._write([row])
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        try:
+            with metrics.span(self.name):
+                self.flush_fn(rows)
+            self._count('written', len(rows))
+            self._count('batches')
+        except Exception as e:
+            self._count('failed', len(rows))
+            logger.error("Error flushing %d rows from %s: %s", len(rows), self.name, e)
+
+    def _collect_batch(self) -> List[Tuple[int, Dict[str, Any]]]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            urgent = self._flush_now.is_set() or self._stopping.is_set()
+            remaining = deadline - time.monotonic()
+            try:
+                if urgent or remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=min(remaining, 0.05)))
+            except queue.Empty:
+                if urgent or remaining <= 0:
+                    break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            self._write([row for _, row in batch])
+            with self._lock:
+                for sequence, _ in batch:
+                    self._unwritten.pop(sequence, None)
+            for _ in batch:
+                self._queue.task_done()
+
+    def pending(self, predicate: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
+        """Rows matching ``predicate`` that have been accepted but not yet written, oldest first"""
+        with self._lock:
+            return [row for _, row in sorted(self._unwritten.items()) if predicate(row)]
+
+    def flush(self):
+        """Block until every queued row has been written"""
+        if self._thread is None:
+            return
+        self._flush_now.set()
+        try:
+            self._queue.join()
+        finally:
+            self._flush_now.clear()
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting queued writes and drain what is left"""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['max_queue'] = self._queue.maxsize
+        return stats
@@ -4,14 +4,17 @@ import os
 import json
 from datetime import datetime
 import uuid
-import requests
 from dotenv import load_dotenv
+from services.http_client import http_client
+from routes.debug import debug_bp
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app, origins=['http://localhost:3000'])
+# Admin-only profiling endpoints; 404 unless ADMIN_TOKEN is set
+app.register_blueprint(debug_bp, url_prefix='/api/debug')
 
 # In-memory storage for demo (replace with database in production)
 knowledge_base = [
@@ -86,11 +89,10 @@ def call_deepseek_api(message, context=""):
             "temperature": 0.7
         }
         
-        response = requests.post(
+        response = http_client.post(
             f"{base_url}/v1/chat/completions",
             headers=headers,
-            json=payload,
-            timeout=30
+            json=payload
         )
         
         if response.status_code == 200:
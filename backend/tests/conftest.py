@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Tests run against a throwaway SQLite database and never touch the network;
+# set before any service module (and its module-level singleton) is imported
+_TEST_DIR = tempfile.mkdtemp(prefix='satecha-tests-')
+os.environ.update({
+    'STORAGE_BACKEND': 'sqlite',
+    'SQLITE_PATH': os.path.join(_TEST_DIR, 'knowledge.db'),
+    'STARTUP_MODE': 'lazy',
+    'KNOWLEDGE_SHARED_INDEX': 'False',
+    'KNOWLEDGE_INDEX_SNAPSHOTS': 'False',
+    'LOG_LEVEL': 'WARNING',
+})
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+SECURITY_CORPUS = [
+    {'id': 'phishing', 'title': 'Phishing', 'content': 'Phishing emails trick users into revealing passwords.'},
+    {'id': 'firewall', 'title': 'Firewalls', 'content': 'A firewall filters network traffic between trusted zones.'},
+    {'id': 'malware', 'title': 'Malware', 'content': 'Malware infects computers and steals passwords from users.'},
+    {'id': 'backups', 'title': 'Backups', 'content': 'Offline backups protect data against ransomware encryption.'},
+    {'id': 'patching', 'title': 'Patching', 'content': 'Patching software closes vulnerabilities that malware exploits.'},
+    {'id': 'mfa', 'title': 'Multi factor', 'content': 'Multi factor authentication protects accounts when passwords leak.'},
+    {'id': 'vpn', 'title': 'VPN', 'content': 'A VPN encrypts network traffic on untrusted public networks.'},
+    {'id': 'training', 'title': 'Awareness', 'content': 'Security awareness training helps users spot phishing emails.'},
+    {'id': 'logging', 'title': 'Logging', 'content': 'Centralised logging helps detect intrusions on the network.'},
+    {'id': 'encryption', 'title': 'Encryption', 'content': 'Disk encryption protects data on lost or stolen laptops.'},
+]
+
+
+@pytest.fixture
+def corpus():
+    """Ten short security articles with overlapping vocabulary"""
+    return [dict(item) for item in SECURITY_CORPUS]
+
+
+@pytest.fixture
+def ranked():
+    """(id, rounded score) pairs an index returns for a query, for comparing two indexes"""
+    def results(index, query, top_k=10):
+        return [(item['id'], round(score, 6)) for item, score in index.search(query, top_k=top_k)]
+    return results
+
+
+KNOWLEDGE_ROWS = [
+    {'id': 'k1', 'title': 'Phishing', 'content': 'Phishing emails trick users into revealing passwords.',
+     'keywords': ['phishing'], 'created_at': '2024-01-01T00:00:00', 'updated_at': '2024-01-01T00:00:00'},
+    {'id': 'k2', 'title': 'Firewalls', 'content': 'A firewall filters network traffic between zones.',
+     'keywords': ['firewall'], 'created_at': '2024-01-02T00:00:00', 'updated_at': '2024-01-02T00:00:00'},
+]
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    """A fresh SQLite backend holding KNOWLEDGE_ROWS"""
+    from services.storage import SQLiteStorage
+    backend = SQLiteStorage(str(tmp_path / 'knowledge.db'))
+    backend.initialize()
+    backend.insert_knowledge([dict(row) for row in KNOWLEDGE_ROWS])
+    return backend
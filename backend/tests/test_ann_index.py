@@ -0,0 +1,101 @@
+import os
+import numpy as np
+from services.ann_index import IVFIndex
+from services.embedding_store import EmbeddingStore
+from benchmarks.run import _hashed_embeddings
+from benchmarks.corpus import SyntheticCorpus
+
+# Item n is embedded as row n of a fixed random matrix, so queries can name an exact vector
+RANDOM_VECTORS = np.random.default_rng(11).normal(size=(300, 24)).astype(np.float32)
+
+
+def _lookup_vectors(texts):
+    return RANDOM_VECTORS[[int(text.split()[-1]) for text in texts]]
+
+
+def _ivf(directory, **kwargs):
+    store = EmbeddingStore(_hashed_embeddings, str(directory))
+    return IVFIndex(store, path=os.path.join(str(directory), 'ivf.npz'), **kwargs)
+
+
+def _corpus(size):
+    return [dict(item, id=f"doc-{n}") for n, item in enumerate(SyntheticCorpus(seed=7).documents(size))]
+
+
+def test_build_retrains_when_corpus_has_grown(tmp_path):
+    index = _ivf(tmp_path, retrain_ratio=1.0)
+    index.build(_corpus(50))
+    assert index._trained_size == 50
+
+    # Centroids reloaded from disk by a restarted process
+    restarted = _ivf(tmp_path, retrain_ratio=1.0)
+    assert restarted._trained_size == 50
+    restarted.build(_corpus(80))
+    assert restarted._trained_size == 50
+    restarted.build(_corpus(300))
+    assert restarted._trained_size == 300
+    assert len(restarted.centroids) == restarted._default_n_lists(300)
+
+
+def test_incremental_changes_survive_a_restart(tmp_path):
+    corpus = _corpus(60)
+    index = _ivf(tmp_path)
+    index.build(corpus[:50])
+    for item in corpus[50:]:
+        index.add(item)
+    index.remove('doc-0')
+
+    restarted = _ivf(tmp_path)
+    restarted.build(corpus[1:])
+    assert len(restarted) == 59
+    assert 'doc-0' not in restarted._assignment
+
+
+def test_full_probe_matches_exact_search(tmp_path):
+    index = _ivf(tmp_path)
+    index.build(_corpus(200))
+    queries = list(SyntheticCorpus(seed=7).queries(20))
+    report = index.evaluate_recall(queries, top_k=5, nprobe_values=(1, len(index.centroids)))
+    assert report[-1]['recall_at_k'] >= 0.95
+    assert report[0]['recall_at_k'] <= report[-1]['recall_at_k']
+
+
+def test_probing_every_list_matches_exact_search(tmp_path):
+    store = EmbeddingStore(_lookup_vectors, str(tmp_path / 'store'))
+    index = IVFIndex(store, n_lists=8, path=os.path.join(str(tmp_path), 'ivf.npz'))
+    index.build([{'id': f'v{n}', 'title': '', 'content': str(n)} for n in range(300)])
+    for n in range(0, 300, 23):
+        exact = [item['id'] for item, _ in store.search(str(n), top_k=5)]
+        assert [item['id'] for item, _ in index.search(str(n), top_k=5, nprobe=8)] == exact
+        assert index.search(str(n), top_k=1, nprobe=1)[0][0]['id'] == f'v{n}'
+
+
+def test_edits_do_not_count_towards_retraining(tmp_path):
+    corpus = _corpus(40)
+    index = _ivf(tmp_path, retrain_ratio=0.5)
+    index.build(corpus)
+    for n in range(30):
+        index.update(dict(corpus[0], content=f"{corpus[0]['content']} revision {n}"))
+    assert index._inserts_since_training == 0
+    assert index._retrain_thread is None
+
+
+def test_growth_retrains_in_the_background_not_in_search(tmp_path):
+    corpus = _corpus(60)
+    index = _ivf(tmp_path, retrain_ratio=0.5)
+    index.build(corpus[:20])
+    for item in corpus[20:30]:
+        index.add(item)
+
+    def no_training(vectors):
+        raise AssertionError('search must not train')
+
+    train, index._train = index._train, no_training
+    counted, index._inserts_since_training = index._inserts_since_training, 100
+    assert index.search(corpus[25]['content'], top_k=3)
+    index._train, index._inserts_since_training = train, counted
+    index.add(corpus[30])
+    index._retrain_thread.join(10)
+    assert index._trained_size == 31 and index._inserts_since_training == 0
+    assert len(index) == 31
+    assert index.search(corpus[30]['content'], top_k=1, nprobe=len(index.centroids))[0][0]['id'] == 'doc-30'
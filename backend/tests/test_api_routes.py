@@ -0,0 +1,49 @@
+import pytest
+
+from routes import api as api_module
+from services.knowledge_service import knowledge_service
+
+
+def _articles(count):
+    return [{'id': f'a{n:04d}', 'title': f'Article {n}', 'content': 'text',
+             'created_at': f'2024-01-01T00:00:{n % 60:02d}.{n:06d}'} for n in range(count)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Flask test client over a fixed corpus larger than one default page"""
+    from app import create_app
+    items = sorted(_articles(api_module.DEFAULT_PAGE_SIZE + 30), key=knowledge_service._page_key)
+    keys = [knowledge_service._page_key(item) for item in items]
+    monkeypatch.setattr(knowledge_service, '_sorted_snapshot', lambda: (items, keys))
+    return create_app().test_client()
+
+
+@pytest.mark.parametrize('limit', ['abc', '0', '-5', '2.5'])
+def test_invalid_limit_is_rejected(client, limit):
+    response = client.get(f'/api/knowledge?limit={limit}')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_knowledge_without_params_returns_one_bounded_page(client):
+    response = client.get('/api/knowledge')
+    assert response.status_code == 200
+    first = response.get_json()
+    assert len(first) == api_module.DEFAULT_PAGE_SIZE
+    cursor = response.headers['X-Next-Cursor']
+
+    rest = client.get(f'/api/knowledge?cursor={cursor}').get_json()
+    assert len(rest) == 30
+    assert not {item['id'] for item in first} & {item['id'] for item in rest}
+
+
+def test_limit_is_capped(client, monkeypatch):
+    monkeypatch.setattr(api_module, 'MAX_PAGE_SIZE', 10)
+    response = client.get('/api/knowledge?limit=100000')
+    assert len(response.get_json()) == 10
+
+
+def test_ndjson_without_params_is_bounded(client):
+    response = client.get('/api/knowledge?format=ndjson')
+    assert len(response.get_data(as_text=True).strip().splitlines()) == api_module.DEFAULT_PAGE_SIZE
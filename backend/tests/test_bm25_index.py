@@ -0,0 +1,56 @@
+import sys
+import threading
+from services.nlp_service import BM25Index
+
+CORPUS = [{'id': f'doc-{n}', 'title': f'Firewall {n}', 'content': f'firewall rule blocks port traffic zone{n % 5}'}
+          for n in range(200)]
+
+
+def test_incremental_updates_match_a_rebuild():
+    index = BM25Index(CORPUS[:150])
+    for item in CORPUS[150:]:
+        index.add(item)
+    for n in range(0, 200, 3):
+        index.remove(f'doc-{n}')
+    expected = BM25Index([item for n, item in enumerate(CORPUS) if n % 3])
+    query = 'firewall port traffic'
+    assert [(hit['id'], round(score, 9)) for hit, score in index.search(query, 10)] == \
+        [(hit['id'], round(score, 9)) for hit, score in expected.search(query, 10)]
+
+
+def test_concurrent_writes_and_searches():
+    index = BM25Index(CORPUS)
+    errors = []
+    stop = threading.Event()
+
+    def write():
+        n = 0
+        while not stop.is_set():
+            item_id = f'new-{n % 50}'
+            index.add({'id': item_id, 'title': 'Port scan', 'content': f'port scan traffic burst {n}'})
+            index.remove(item_id)
+            n += 1
+
+    def search():
+        try:
+            for _ in range(300):
+                index.search('port traffic firewall', 5)
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write) for _ in range(2)]
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    # Switch threads often so writes land inside scoring loops
+    previous = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in writers + readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+    finally:
+        stop.set()
+        for thread in writers:
+            thread.join()
+        sys.setswitchinterval(previous)
+    assert not errors
@@ -0,0 +1,65 @@
+import pytest
+from services import chat_service as chat_module
+from services.chat_service import ChatService
+from services.deepseek_service import FallbackReply, LLMStreamError
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    monkeypatch.setenv('SEMANTIC_CACHE_ENABLED', 'True')
+    monkeypatch.setenv('CHAT_HISTORY_TURNS', '0')
+    monkeypatch.setattr(chat_module.knowledge_service, 'get_relevant_context', lambda query, budget=None: '')
+    service = ChatService()
+    yield service
+    service.history_writer.close()
+
+
+def _reply_with(monkeypatch, reply):
+    calls = []
+    def generate_response(prompt, context, cache_version=None, history=None):
+        calls.append(prompt)
+        return reply
+    monkeypatch.setattr(chat_module.deepseek_service, 'generate_response', generate_response)
+    return calls
+
+
+def test_completed_reply_is_served_to_near_duplicates(chat, monkeypatch):
+    calls = _reply_with(monkeypatch, 'Phishing is a social engineering attack.')
+    assert chat.process_message('What is phishing?')['cached'] is False
+    assert chat.process_message('what is phishing')['cached'] is True
+    assert len(calls) == 1
+
+
+def test_fallback_reply_is_not_cached(chat, monkeypatch):
+    calls = _reply_with(monkeypatch, FallbackReply('Could you provide more details?'))
+    chat.process_message('What is phishing?')
+    assert chat.process_message('What is phishing?')['cached'] is False
+    assert len(calls) == 2
+
+
+def test_custom_context_budget_bypasses_cache(chat, monkeypatch):
+    calls = _reply_with(monkeypatch, 'Phishing is a social engineering attack.')
+    chat.process_message('What is phishing?', context_tokens=50)
+    assert chat.process_message('What is phishing?')['cached'] is False
+    assert chat.process_message('What is phishing?', context_tokens=50)['cached'] is False
+    assert len(calls) == 3
+
+
+def test_history_dependent_replies_are_not_shared(chat, monkeypatch):
+    chat.history_turns = 3
+    monkeypatch.setattr(chat, '_recent_turns', lambda user_id: [])
+    calls = _reply_with(monkeypatch, 'Phishing is a social engineering attack.')
+    chat.process_message('What is phishing?', user_id='alice')
+    assert chat.process_message('What is phishing?', user_id='bob')['cached'] is False
+    assert len(calls) == 2
+
+
+def test_truncated_stream_is_reported_and_not_cached(chat, monkeypatch):
+    def stream_response(prompt, context, cache_version=None, history=None):
+        yield 'Phishing is'
+        raise LLMStreamError('connection reset', 'Phishing is')
+    monkeypatch.setattr(chat_module.deepseek_service, 'stream_response', stream_response)
+    events = list(chat.stream_message('What is phishing?'))
+    assert events[0] == ('delta', 'Phishing is')
+    assert events[-1][0] == 'error' and events[-1][1]['truncated'] is True
+    assert chat._cached_answer('What is phishing?', 'anonymous', None) is None
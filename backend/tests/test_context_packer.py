@@ -0,0 +1,68 @@
+from services.context_packer import ContextPacker, SEPARATOR_TOKENS
+from services.tokenizer import tokenizer
+
+
+def _render(passage):
+    return passage['content']
+
+
+def _hit(item_id, words, score):
+    # Letters only, so every passage has distinct index tokens
+    suffixes = [a + b for a in 'abcdefghij' for b in 'klmnopqrst']
+    return {'id': item_id, 'content': ' '.join(f"{item_id}x{suffixes[i]}" for i in range(words))}, score
+
+
+def _tokens(packed):
+    return sum(tokenizer.count_tokens(text) + SEPARATOR_TOKENS for text, _, _ in packed)
+
+
+def test_pack_respects_budget():
+    packer = ContextPacker(_render, min_relative_score=0)
+    hits = [_hit(f"d{chr(97 + i)}", 10 + i, 1.0 - i / 20) for i in range(8)]
+    for budget in (0, 5, 30, 60, 200):
+        packed = packer.pack(hits, budget)
+        assert _tokens(packed) <= budget
+
+
+def test_pack_prefers_higher_total_score():
+    packer = ContextPacker(_render, min_relative_score=0)
+    big = _hit('big', 20, 1.0)
+    small = [_hit(name, 8, 0.7) for name in ('sa', 'sb')]
+    budget = tokenizer.count_tokens(small[0][0]['content']) * 2 + 2 * SEPARATOR_TOKENS
+    packed = packer.pack([big] + small, budget)
+    assert sorted(passage['id'] for _, passage, _ in packed) == ['sa', 'sb']
+
+
+def test_pack_drops_duplicates_and_overlaps():
+    packer = ContextPacker(_render, min_relative_score=0)
+    passage, _ = _hit('a', 10, 0)
+    hits = [
+        (dict(passage, parent_id='doc', start=0, end=50), 0.9),
+        (dict(passage, id='b', parent_id='doc', start=40, end=90), 0.8),
+        (dict(passage, id='c'), 0.7),
+    ]
+    assert [p['id'] for p in (p for p, _ in packer.deduplicate(hits))] == ['a']
+
+
+def test_knapsack_capacity_is_capped_at_total_weight():
+    chosen = ContextPacker._knapsack([3, 4, 5], [1.0, 1.0, 1.0], 10 ** 9)
+    assert chosen == [0, 1, 2]
+
+
+def test_huge_budget_is_cheap():
+    packer = ContextPacker(_render, min_relative_score=0)
+    packed = packer.pack([_hit('a', 5, 1.0), _hit('b', 5, 0.9)], 10 ** 9)
+    assert len(packed) == 2
+
+
+def test_context_tokens_validation():
+    from services.chat_service import ChatService
+    from services.knowledge_service import knowledge_service
+    assert ChatService.context_tokens_error(None) is None
+    assert ChatService.context_tokens_error(0) is None
+    assert ChatService.context_tokens_error(knowledge_service.max_context_tokens) is None
+    assert ChatService.context_tokens_error(-1)
+    assert ChatService.context_tokens_error(True)
+    assert ChatService.context_tokens_error('100')
+    assert ChatService.context_tokens_error(knowledge_service.max_context_tokens + 1)
+    assert ChatService.context_tokens_error(10 ** 9)
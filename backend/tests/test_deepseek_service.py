@@ -0,0 +1,98 @@
+import json
+import pytest
+from services import deepseek_service as deepseek_module
+from services.deepseek_service import DeepSeekService, LLMStreamError
+
+
+class FakeStreamResponse:
+    def __init__(self, lines, fail_after=None):
+        self.status_code = 200
+        self.lines = lines
+        self.fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_lines(self, decode_unicode=True):
+        for number, line in enumerate(self.lines):
+            if self.fail_after is not None and number == self.fail_after:
+                raise ConnectionError('connection reset')
+            yield line
+
+
+def _delta(text):
+    return 'data: ' + json.dumps({'choices': [{'delta': {'content': text}}]})
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv('DEEPSEEK_API_KEY', 'test-key')
+    return DeepSeekService()
+
+
+def _serve(monkeypatch, response):
+    monkeypatch.setattr(deepseek_module.http_client, 'post', lambda *args, **kwargs: response)
+
+
+def test_stream_yields_content_deltas(service, monkeypatch):
+    _serve(monkeypatch, FakeStreamResponse([': keep-alive', _delta('Hello'), _delta(' world'), 'data: [DONE]']))
+    assert list(service.stream_response('hi')) == ['Hello', ' world']
+
+
+def test_completed_stream_is_cached(service, monkeypatch):
+    _serve(monkeypatch, FakeStreamResponse([_delta('Hello'), _delta(' world'), 'data: [DONE]']))
+    assert ''.join(service.stream_response('hi', cache_version=1)) == 'Hello world'
+    assert service.response_cache.get(service._cache_key('hi', ''), 1) == 'Hello world'
+
+
+def test_interrupted_stream_raises_with_partial_text(service, monkeypatch):
+    _serve(monkeypatch, FakeStreamResponse([_delta('Hello'), _delta(' wor'), 'data: [DONE]'], fail_after=2))
+    received = []
+    with pytest.raises(LLMStreamError) as error:
+        for delta in service.stream_response('hi', cache_version=1):
+            received.append(delta)
+    assert ''.join(received) == error.value.partial == 'Hello wor'
+    assert service.response_cache.get(service._cache_key('hi', ''), 1) is None
+
+
+def test_stream_ending_without_done_is_truncated(service, monkeypatch):
+    _serve(monkeypatch, FakeStreamResponse([_delta('Hello')]))
+    with pytest.raises(LLMStreamError):
+        list(service.stream_response('hi', cache_version=1))
+    assert service.response_cache.get(service._cache_key('hi', ''), 1) is None
+
+
+def test_failure_before_first_token_falls_back(service, monkeypatch):
+    _serve(monkeypatch, FakeStreamResponse([_delta('Hello')], fail_after=0))
+    chunks = list(service.stream_response('hello there'))
+    assert chunks == ["Hello! How can I help you today?"]
+
+
+class FakeCompletion:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+    def json(self):
+        return {'choices': [{'message': {'content': self.text}}], 'usage': {'total_tokens': 5}}
+
+
+def test_completion_limits_are_sent_and_part_of_the_cache_key(service, monkeypatch):
+    payloads = []
+
+    def post(url, json=None, **kwargs):
+        payloads.append(json)
+        return FakeCompletion(f"reply {len(payloads)}")
+
+    monkeypatch.setattr(deepseek_module.http_client, 'post', post)
+    assert service.generate_response('hi', max_tokens=50, cache_version=1) == 'reply 1'
+    assert payloads[0]['max_tokens'] == 50 and payloads[0]['temperature'] == service.temperature
+    assert service.generate_response('hi', max_tokens=50, cache_version=1) == 'reply 1'
+    assert service.generate_response('hi', max_tokens=400, cache_version=1) == 'reply 2'
+    service.temperature = 0.1
+    assert service.generate_response('hi', max_tokens=400, cache_version=1) == 'reply 3'
+    assert len(payloads) == 3
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import numpy as np
+from services.embedding_store import EmbeddingStore
+
+
+class CountingEncoder:
+    """Deterministic bag-of-letters vectors; records how many texts it encoded"""
+
+    def __init__(self, dim=16, salt=0):
+        self.dim = dim
+        self.salt = salt
+        self.encoded = 0
+
+    def __call__(self, texts):
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, (ord(char) + self.salt) % self.dim] += 1.0
+        return vectors
+
+
+ITEMS = [
+    {'id': 'a', 'title': 'alpha', 'content': 'apples and apricots'},
+    {'id': 'b', 'title': 'bravo', 'content': 'bananas and blueberries'},
+    {'id': 'c', 'title': 'charlie', 'content': 'cherries and coconuts'},
+]
+
+
+def test_unchanged_items_are_not_reencoded_after_restart(tmp_path):
+    EmbeddingStore(CountingEncoder(), str(tmp_path)).build(ITEMS)
+    encoder = CountingEncoder()
+    restarted = EmbeddingStore(encoder, str(tmp_path))
+    restarted.build(ITEMS)
+    assert encoder.encoded == 0
+    assert restarted.search('apples apricots', top_k=1)[0][0]['id'] == 'a'
+
+
+def test_edits_reencode_only_the_changed_item(tmp_path):
+    encoder = CountingEncoder()
+    store = EmbeddingStore(encoder, str(tmp_path))
+    store.build(ITEMS)
+    store.update(dict(ITEMS[0], content='avocados'))
+    store.build(ITEMS[1:] + [dict(ITEMS[0], content='avocados')])
+    assert encoder.encoded == len(ITEMS) + 1
+    assert store.search('alpha avocados', top_k=1)[0][0]['id'] == 'a'
+
+
+def test_model_change_reencodes_every_item(tmp_path):
+    EmbeddingStore(CountingEncoder(), str(tmp_path), model='m1').build(ITEMS)
+    encoder = CountingEncoder(salt=5)
+    switched = EmbeddingStore(encoder, str(tmp_path), model='m2')
+    switched.build(ITEMS)
+    assert encoder.encoded == len(ITEMS)
+    expected = encoder([ITEMS[0]['title'] + ' ' + ITEMS[0]['content']])[0]
+    np.testing.assert_allclose(switched.get_vector('a'), expected / np.linalg.norm(expected), rtol=1e-6)
+
+
+def test_dimension_change_recovers_instead_of_failing(tmp_path):
+    EmbeddingStore(CountingEncoder(dim=16), str(tmp_path)).build(ITEMS)
+    # Same (unnamed) model, but the encoder now produces wider vectors
+    restarted = EmbeddingStore(CountingEncoder(dim=32), str(tmp_path))
+    restarted.build(ITEMS)
+    results = restarted.search('cherries coconuts', top_k=1)
+    assert results[0][0]['id'] == 'c'
+    assert restarted.get_vector('a').shape == (32,)
+
+    restarted.add({'id': 'd', 'title': 'delta', 'content': 'dates and durians'})
+    assert len(restarted) == 4
+
+
+def test_single_changes_are_journaled_and_replayed(tmp_path):
+    store = EmbeddingStore(CountingEncoder(), str(tmp_path), model='m1')
+    store.build(ITEMS)
+    with open(store.id_table_path, encoding='utf-8') as f:
+        table_after_build = f.read()
+
+    store.add({'id': 'd', 'title': 'delta', 'content': 'dates and durians'})
+    store.update({'id': 'a', 'title': 'alpha', 'content': 'avocados'})
+    store.remove('b')
+    store.add({'id': 'e', 'title': 'echo', 'content': 'elderberries'})
+
+    with open(store.id_table_path, encoding='utf-8') as f:
+        assert f.read() == table_after_build
+    with open(store.journal_path, encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 1 + 4
+
+    encoder = CountingEncoder()
+    restarted = EmbeddingStore(encoder, str(tmp_path), model='m1')
+    corpus = [ITEMS[0] | {'content': 'avocados'}, ITEMS[2],
+              {'id': 'd', 'title': 'delta', 'content': 'dates and durians'},
+              {'id': 'e', 'title': 'echo', 'content': 'elderberries'}]
+    restarted.build(corpus)
+    assert encoder.encoded == 0
+    for item_id in ('a', 'c', 'd', 'e'):
+        np.testing.assert_array_equal(restarted.get_vector(item_id), store.get_vector(item_id))
+    assert restarted.get_vector('b') is None
+    # 'e' reused the row freed by 'b'
+    assert len({restarted._rows[item_id] for item_id in ('a', 'c', 'd', 'e')}) == 4
+
+
+def test_journal_from_an_older_table_is_ignored(tmp_path):
+    store = EmbeddingStore(CountingEncoder(), str(tmp_path), model='m1')
+    store.build(ITEMS)
+    store.remove('a')
+    with open(store.journal_path, encoding='utf-8') as f:
+        stale_journal = f.read()
+    store.build(ITEMS)
+    with open(store.journal_path, 'w', encoding='utf-8') as f:
+        f.write(stale_journal)
+
+    restarted = EmbeddingStore(CountingEncoder(), str(tmp_path), model='m1')
+    assert set(restarted._rows) == {'a', 'b', 'c'}
+    assert json.loads(stale_journal.splitlines()[0])['generation'] != restarted._generation
+    assert os.path.exists(restarted.matrix_path)
+
+
+def test_query_encoding_does_not_block_writers(tmp_path):
+    encoder = CountingEncoder()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_encoder(texts):
+        if texts == ['slow query']:
+            started.set()
+            release.wait(5)
+        return encoder(texts)
+
+    store = EmbeddingStore(slow_encoder, str(tmp_path))
+    store.build(ITEMS)
+    searcher = threading.Thread(target=store.search, args=('slow query',))
+    searcher.start()
+    assert started.wait(5)
+    writer = threading.Thread(target=store.add, args=({'id': 'd', 'title': 'delta', 'content': 'dates'},))
+    writer.start()
+    writer.join(2)
+    finished_while_encoding = not writer.is_alive()
+    release.set()
+    searcher.join()
+    writer.join()
+    assert finished_while_encoding
+
+
+def test_second_process_keeps_its_changes_in_memory(tmp_path):
+    writer = EmbeddingStore(CountingEncoder(), str(tmp_path))
+    writer.build(ITEMS)
+    with open(writer.id_table_path, encoding='utf-8') as f:
+        table = f.read()
+    with open(writer.journal_path, encoding='utf-8') as f:
+        journal = f.read()
+    vector_a = writer.get_vector('a')
+
+    # A second open of the directory cannot take the writer lock, as another worker would not
+    reader = EmbeddingStore(CountingEncoder(), str(tmp_path))
+    assert writer.owns_files() and not reader.owns_files()
+    reader.build(ITEMS)
+    reader.update(dict(ITEMS[0], content='avocados'))
+    reader.add({'id': 'd', 'title': 'delta', 'content': 'dates and durians'})
+    reader.remove('b')
+    assert reader.search('delta dates durians', top_k=1)[0][0]['id'] == 'd'
+
+    with open(writer.id_table_path, encoding='utf-8') as f:
+        assert f.read() == table
+    with open(writer.journal_path, encoding='utf-8') as f:
+        assert f.read() == journal
+    np.testing.assert_array_equal(writer.get_vector('a'), vector_a)
+    np.testing.assert_array_equal(EmbeddingStore(CountingEncoder(), str(tmp_path)).get_vector('b'),
+                                  writer.get_vector('b'))
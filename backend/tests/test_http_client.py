@@ -0,0 +1,49 @@
+import socket
+import threading
+import pytest
+import requests
+from services.http_client import PooledHttpClient
+
+
+def _client():
+    return PooledHttpClient(pool_size=2, connect_timeout=1.0, read_timeout=2.0, max_retries=2, backoff_base=0.0)
+
+
+def test_connection_reset_after_sending_is_not_retried():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(4)
+    received = []
+
+    def serve():
+        server.settimeout(1.0)
+        try:
+            while True:
+                connection, _ = server.accept()
+                received.append(connection.recv(65536))
+                # Drop the connection without answering, as a crashed upstream would
+                connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, b'\x01\x00\x00\x00\x00\x00\x00\x00')
+                connection.close()
+        except OSError:
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    client = _client()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post(f'http://127.0.0.1:{server.getsockname()[1]}/chat', json={'prompt': 'hi'})
+    server.close()
+    thread.join()
+    assert len(received) == 1
+    assert client.get_metrics()['attempts'] == 1
+
+
+def test_refused_connections_are_retried():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    client = _client()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post(f'http://127.0.0.1:{port}/chat', json={'prompt': 'hi'})
+    assert client.get_metrics()['attempts'] == 3
@@ -0,0 +1,62 @@
+import os
+import numpy as np
+from services.index_snapshot import IndexSnapshotStore
+from services.search_index import TfidfIndex
+
+SETTINGS = {'method': 'tfidf', 'passages': False}
+
+
+def _saved_index(directory, corpus):
+    index = TfidfIndex(refit_ratio=0.5)
+    index.build(corpus)
+    store = IndexSnapshotStore(str(directory))
+    store.save(index.export_state(), SETTINGS, {'corpus_version': 1})
+    return index, store
+
+
+def test_round_trip_applies_only_changed_rows(tmp_path, corpus, ranked):
+    original, store = _saved_index(tmp_path, corpus)
+    state, manifest = store.load(SETTINGS)
+    assert manifest['corpus_version'] == 1
+    assert state['ids'] == [item['id'] for item in corpus]
+    np.testing.assert_allclose(state['matrix'].toarray(), original.export_state()['matrix'].toarray())
+
+    edited = dict(corpus[1], content='A firewall blocks network traffic from untrusted zones.')
+    added = {'id': 'reuse', 'title': 'Passwords', 'content': 'Users reuse passwords across accounts.'}
+    changed_corpus = [item for item in corpus if item['id'] not in ('firewall', 'vpn')] + [edited, added]
+
+    restored = TfidfIndex(refit_ratio=0.5)
+    # One edit, one addition, one removal
+    assert restored.restore_state(state, changed_corpus) == 3
+    assert restored.vectorizer.vocabulary_ == original.vectorizer.vocabulary_
+
+    # The same writes applied to the live index give the same results
+    original.update(edited)
+    original.add(added)
+    original.remove('vpn')
+    for query in ('network traffic', 'reuse passwords', 'phishing emails', 'public networks'):
+        assert ranked(restored, query) == ranked(original, query), query
+    assert len(restored) == len(changed_corpus)
+
+
+def test_large_drift_refits_instead(tmp_path, corpus, ranked):
+    _, store = _saved_index(tmp_path, corpus)
+    state, _ = store.load(SETTINGS)
+    replaced = [{'id': f"new-{item['id']}", 'title': item['title'], 'content': item['content']} for item in corpus]
+    restored = TfidfIndex(refit_ratio=0.5)
+    restored.restore_state(state, replaced)
+    rebuilt = TfidfIndex()
+    rebuilt.build(replaced)
+    assert ranked(restored, 'phishing emails') == ranked(rebuilt, 'phishing emails')
+
+
+def test_mismatched_settings_or_corruption_are_rejected(tmp_path, corpus):
+    _, store = _saved_index(tmp_path, corpus)
+    assert store.load({'method': 'tfidf', 'passages': True}) is None
+
+    with open(os.path.join(str(tmp_path), 'LATEST'), encoding='utf-8') as f:
+        snapshot = os.path.join(str(tmp_path), f.read().strip())
+    with open(os.path.join(snapshot, 'idf.npy'), 'r+b') as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b'\x00\x00\x80\x7f')
+    assert store.load(SETTINGS) is None
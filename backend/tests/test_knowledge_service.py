@@ -0,0 +1,55 @@
+import pytest
+from services.storage import SQLiteStorage
+from services.knowledge_service import KnowledgeService
+
+
+class FailingInsertStorage(SQLiteStorage):
+    def insert_knowledge(self, rows):
+        raise RuntimeError('database unavailable')
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv('KNOWLEDGE_SEARCH_METHOD', 'tfidf')
+    backend = SQLiteStorage(str(tmp_path / 'knowledge.db'))
+    backend.initialize()
+    knowledge = KnowledgeService(storage_backend=backend)
+    knowledge.search_knowledge('warm up')
+    return knowledge
+
+
+def _found(service, query, item_id):
+    return any(item.get('id') == item_id for item, _ in service.search_knowledge(query, 10))
+
+
+def test_failed_insert_leaves_snapshot_and_index_untouched(service):
+    failing = FailingInsertStorage(service.storage.path)
+    service.storage = failing
+    version = service.corpus_version
+    corpus_size = len(service.get_all_knowledge())
+
+    assert service.add_knowledge('Zanzibar', 'Zanzibar quokka protocol handshake') is None
+    assert service.corpus_version == version
+    assert len(service.get_all_knowledge()) == corpus_size
+    assert service.search_knowledge('zanzibar quokka', 5) == []
+
+
+def test_saved_item_is_searchable(service):
+    item = service.add_knowledge('Zanzibar', 'Zanzibar quokka protocol handshake')
+    assert item is not None
+    assert _found(service, 'zanzibar quokka', item['id'])
+
+
+def test_bulk_add_updates_the_index_incrementally(service, monkeypatch):
+    def no_rebuild(corpus):
+        raise AssertionError('bulk add must not rebuild the whole index')
+
+    monkeypatch.setattr(service.search_index, 'build', no_rebuild)
+    result = service.add_knowledge_bulk([
+        {'title': 'Zanzibar', 'content': 'Zanzibar quokka protocol handshake'},
+        {'title': 'Xylophone', 'content': 'Xylophone wombat cipher rotation'},
+    ])
+    ids = result['ids']
+    assert len(ids) == 2
+    assert _found(service, 'zanzibar quokka', ids[0])
+    assert _found(service, 'xylophone wombat', ids[1])
@@ -0,0 +1,47 @@
+import io
+import json
+import os
+import pytest
+from services.logger import get_logger, log_subsystem
+
+
+def test_records_are_written_as_json_lines(monkeypatch):
+    stream = io.StringIO()
+    for handler in log_subsystem.listener.handlers:
+        monkeypatch.setattr(handler, 'stream', stream)
+    get_logger('jsontest').warning("disk %s is %d%% full", 'sda', 91, extra={'device': 'sda'})
+    log_subsystem.handler.queue.join()
+    entry = json.loads(stream.getvalue().splitlines()[-1])
+    assert entry['category'] == 'jsontest'
+    assert entry['level'] == 'WARNING'
+    assert entry['message'] == 'disk sda is 91% full'
+    assert entry['device'] == 'sda'
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_still_writes_logs():
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            for handler in log_subsystem.listener.handlers:
+                handler.stream = os.fdopen(write_fd, 'w')
+            logger = get_logger('forktest')
+            for n in range(50):
+                logger.warning("child record %d", n)
+            log_subsystem.shutdown()
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    output = b''
+    while True:
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        output += chunk
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    messages = [json.loads(line)['message'] for line in output.decode('utf-8').splitlines() if line.startswith('{')]
+    assert [message for message in messages if message.startswith('child record')] == \
+        [f'child record {n}' for n in range(50)]
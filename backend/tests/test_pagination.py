@@ -0,0 +1,59 @@
+import base64
+import json
+import pytest
+from services.pagination import encode_cursor, decode_cursor, next_cursor
+
+
+def _raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_round_trip():
+    cursor = encode_cursor('2024-05-01T12:30:00.123456', '6f1c2f9e-8b1d-4c3e-9a57-0d2b8f7e1a11')
+    assert decode_cursor(cursor) == ('2024-05-01T12:30:00.123456', '6f1c2f9e-8b1d-4c3e-9a57-0d2b8f7e1a11')
+    assert decode_cursor(encode_cursor('2024-05-01T12:30:00+00:00', 'cyber_001')) == ('2024-05-01T12:30:00+00:00', 'cyber_001')
+    assert decode_cursor(encode_cursor(None, 'team_info_001')) == ('', 'team_info_001')
+
+
+@pytest.mark.parametrize('payload', [
+    ['2024-01-01T00:00:00"),id.gt.(0', 'abc'],
+    ['not a date', 'abc'],
+    ['2024-01-01T00:00:00', 'x",timestamp.gt."0'],
+    ['2024-01-01T00:00:00', 'a,b'],
+    ['2024-01-01T00:00:00', 'a)b'],
+    ['2024-01-01T00:00:00', ''],
+    [123, 'abc'],
+    ['2024-01-01T00:00:00', None],
+    ['2024-01-01T00:00:00'],
+])
+def test_rejects_values_that_could_rewrite_a_filter(payload):
+    with pytest.raises(ValueError):
+        decode_cursor(_raw_cursor(payload))
+
+
+def test_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor('!!!')
+
+
+def test_next_cursor_only_for_full_pages():
+    rows = [{'id': f'id{n}', 'created_at': f'2024-01-0{n + 1}T00:00:00'} for n in range(3)]
+    assert next_cursor(rows, 4, 'created_at') is None
+    assert next_cursor(rows, None, 'created_at') is None
+    assert decode_cursor(next_cursor(rows, 3, 'created_at')) == ('2024-01-03T00:00:00', 'id2')
+
+
+def test_knowledge_pages_walk_the_whole_corpus():
+    from services.knowledge_service import KnowledgeService
+    service = KnowledgeService()
+    service._corpus = [{'id': f'doc-{n:03d}', 'title': 't', 'content': 'c',
+                        'created_at': f'2024-01-01T00:{n // 60:02d}:{n % 60:02d}'} for n in range(25)]
+    service._corpus_loaded_at = float('inf')
+    service.cache_ttl = 0
+    seen, cursor = [], None
+    while True:
+        rows, cursor = service.list_knowledge_page(10, cursor)
+        seen.extend(row['id'] for row in rows)
+        if cursor is None:
+            break
+    assert seen == [f'doc-{n:03d}' for n in reversed(range(25))]
@@ -0,0 +1,115 @@
+import pytest
+from services import search_index as search_index_module
+from services.search_index import TfidfIndex
+
+QUERIES = ['phishing emails', 'network traffic', 'passwords users', 'protects data', 'quantum lattice cryptography']
+
+
+def _assert_matches_rebuild(ranked, index, corpus):
+    rebuilt = TfidfIndex()
+    rebuilt.build(corpus)
+    for query in QUERIES:
+        assert ranked(index, query) == ranked(rebuilt, query), query
+
+
+def test_small_in_vocabulary_write_does_not_refit(corpus):
+    index = TfidfIndex(refit_ratio=0.2)
+    index.build(corpus)
+    vectorizer = index.vectorizer
+    index.add({'id': 'reuse', 'title': 'Passwords', 'content': 'Users reuse passwords across accounts.'})
+    assert index.search('reuse passwords', top_k=1)[0][0]['id'] == 'reuse'
+    assert index.vectorizer is vectorizer
+
+
+def test_writes_past_refit_ratio_match_a_full_rebuild(corpus, ranked):
+    index = TfidfIndex(refit_ratio=0.4)
+    index.build(corpus)
+    reuse = {'id': 'reuse', 'title': 'Passwords', 'content': 'Users reuse passwords across accounts.'}
+    wifi = {'id': 'wifi', 'title': 'Wifi', 'content': 'Public wifi networks expose network traffic.'}
+    usb = {'id': 'usb', 'title': 'USB', 'content': 'Unknown USB drives can carry malware.'}
+    edited = dict(corpus[0], content='Phishing emails and phishing texts steal passwords.')
+    index.add(reuse)
+    index.add(wifi)
+    index.remove('vpn')
+    index.update(edited)
+    assert all(item['id'] != 'vpn' for item, _ in index.search('network traffic', top_k=20))
+    # The fifth write takes the changes past the ratio and refits
+    index.add(usb)
+
+    final = [edited] + [item for item in corpus[1:] if item['id'] != 'vpn'] + [reuse, wifi, usb]
+    _assert_matches_rebuild(ranked, index, final)
+
+
+def test_searches_never_refit_or_restack(corpus, monkeypatch):
+    index = TfidfIndex(refit_ratio=0.5)
+    index.build(corpus)
+    index.add({'id': 'reuse', 'title': 'Passwords', 'content': 'Users reuse passwords across accounts.'})
+    index.remove('vpn')
+
+    def fail(*args, **kwargs):
+        raise AssertionError('search must not rebuild the index')
+
+    monkeypatch.setattr(index, '_fit', fail)
+    monkeypatch.setattr(search_index_module.sp, 'vstack', fail)
+    assert index.search('reuse passwords', top_k=1)[0][0]['id'] == 'reuse'
+    assert all(item['id'] != 'vpn' for item, _ in index.search('public networks', top_k=20))
+
+
+def test_out_of_vocabulary_write_refits(corpus, ranked):
+    index = TfidfIndex(refit_ratio=0.5)
+    index.build(corpus)
+    novel = {'id': 'quantum', 'title': 'Quantum', 'content': 'Quantum computers threaten lattice cryptography.'}
+    index.add(novel)
+    assert index.search('quantum lattice cryptography', top_k=1)[0][0]['id'] == 'quantum'
+    assert 'quantum' in index.vectorizer.vocabulary_
+    _assert_matches_rebuild(ranked, index, corpus + [novel])
+
+
+@pytest.mark.parametrize('refit_ratio', [0.05, 1.0])
+def test_removing_items_never_returns_them(corpus, refit_ratio):
+    index = TfidfIndex(refit_ratio=refit_ratio)
+    index.build(corpus)
+    for item_id in ('phishing', 'training'):
+        index.remove(item_id)
+    assert all(item['id'] not in ('phishing', 'training') for item, _ in index.search('phishing emails', top_k=10))
+    assert len(index) == len(corpus) - 2
+
+
+def _count_calls(monkeypatch, obj, name):
+    calls = []
+    original = getattr(obj, name)
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(obj, name, counted)
+    return calls
+
+
+def test_small_batch_is_transformed_once(corpus, ranked, monkeypatch):
+    index = TfidfIndex(refit_ratio=0.5)
+    index.build(corpus)
+    fits = _count_calls(monkeypatch, index, '_fit')
+    transforms = _count_calls(monkeypatch, index.vectorizer, 'transform')
+    batch = [
+        {'id': 'reuse', 'title': 'Passwords', 'content': 'Users reuse passwords across accounts.'},
+        {'id': 'wifi', 'title': 'Wifi', 'content': 'Public wifi networks expose network traffic.'},
+    ]
+    index.add_many(batch)
+    assert len(transforms) == 1 and not fits
+    one_by_one = TfidfIndex(refit_ratio=0.5)
+    one_by_one.build(corpus)
+    for item in batch:
+        one_by_one.add(item)
+    for query in QUERIES:
+        assert ranked(index, query) == ranked(one_by_one, query), query
+
+
+def test_large_batch_refits_once(corpus, ranked, monkeypatch):
+    index = TfidfIndex(refit_ratio=0.2)
+    index.build(corpus[:5])
+    fits = _count_calls(monkeypatch, index, '_fit')
+    index.add_many(corpus[5:])
+    assert len(fits) == 1
+    _assert_matches_rebuild(ranked, index, corpus)
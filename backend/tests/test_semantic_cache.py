@@ -0,0 +1,33 @@
+from services.semantic_cache import SemanticCache
+
+ANSWER = {'response': 'Phishing is a social engineering attack.'}
+
+
+def test_near_duplicate_question_is_served():
+    cache = SemanticCache(capacity=10, threshold=0.9)
+    cache.store('What is phishing?', ANSWER, version=1)
+    hit = cache.lookup('what is phishing', version=1)
+    assert hit is not None and hit[0] == ANSWER
+
+
+def test_other_questions_and_corpus_versions_miss():
+    cache = SemanticCache(capacity=10, threshold=0.9)
+    cache.store('What is phishing?', ANSWER, version=1)
+    assert cache.lookup('How do firewalls filter traffic?', version=1) is None
+    assert cache.lookup('What is phishing?', version=2) is None
+
+
+def test_capacity_evicts_oldest_entries():
+    cache = SemanticCache(capacity=2, threshold=0.9)
+    for topic in ('phishing', 'firewalls', 'ransomware'):
+        cache.store(f'What is {topic}?', {'response': topic}, version=1)
+    assert cache.lookup('What is phishing?', version=1) is None
+    assert cache.lookup('What is ransomware?', version=1)[0] == {'response': 'ransomware'}
+
+
+def test_negated_and_role_swapped_questions_miss():
+    cache = SemanticCache(capacity=10, threshold=0.9)
+    cache.store('Should I click links in phishing emails?', ANSWER, version=1)
+    cache.store('Can an attacker impersonate the bank?', ANSWER, version=1)
+    assert cache.lookup('Should I not click links in phishing emails?', version=1) is None
+    assert cache.lookup('Can the bank impersonate an attacker?', version=1) is None
@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import time
+import pytest
+
+pytest.importorskip('scipy')
+
+from services.chunker import PassageChunker
+from services.search_index import TfidfIndex, PassageIndex
+from services.shared_index import SharedIndex
+
+CORPUS = [
+    {'id': f'base-{n}', 'title': f'Topic {n}', 'content': f'firewall network traffic rule number {n} for zone {n % 3}'}
+    for n in range(20)
+]
+WORKERS = 3
+WRITES = 5
+
+
+def _shared(directory):
+    return SharedIndex(TfidfIndex, directory, check_interval=0, publish_delay=0.05)
+
+
+def _visible_ids(index):
+    index.search('firewall', 1)
+    generation = index._generation
+    return {generation.ids[position] for position in range(len(generation))} if generation is not None else set()
+
+
+def _writer(directory, worker, expected, results):
+    index = _shared(directory)
+    index.build(CORPUS)
+    for n in range(WRITES):
+        index.add({'id': f'w{worker}-{n}', 'title': f'Worker {worker}', 'content': f'intrusion detection alert {worker} {n}'})
+    index.remove('base-0')
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if _visible_ids(index) == expected:
+            results.put((worker, True, index.is_leader))
+            # Stay alive so a leader keeps serving the others' journals
+            time.sleep(1.0)
+            return
+        time.sleep(0.05)
+    results.put((worker, False, index.is_leader))
+
+
+def _passages(directory, publish_delay=0.05):
+    return PassageIndex(SharedIndex(TfidfIndex, directory, check_interval=0, publish_delay=publish_delay),
+                        PassageChunker(max_chars=60, overlap=10))
+
+
+ARTICLE = {'id': 'ransomware', 'title': 'Ransomware', 'keywords': ['ransomware'],
+           'content': 'Ransomware encrypts files and demands payment. Offline backups let you restore firewall rules too.'}
+
+
+def _passage_writer(directory, results):
+    index = _passages(directory)
+    index.build(CORPUS)
+    index.add(ARTICLE)
+    # Visible to the writer straight away, before anything is published
+    documents = index.documents(index.search('ransomware payment', 5), 1)
+    results.put([item['id'] for item, _ in documents])
+    time.sleep(3.0)
+
+
+def test_passages_written_in_one_process_resolve_in_another(tmp_path):
+    directory = str(tmp_path / 'shared')
+    reader = _passages(directory)
+    reader.build(CORPUS)
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    writer = context.Process(target=_passage_writer, args=(directory, results))
+    writer.start()
+    assert results.get(timeout=60) == ['ransomware']
+
+    documents = []
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and not documents:
+        documents = reader.documents(reader.search('ransomware payment', 5), 1)
+        time.sleep(0.05)
+    writer.join(timeout=30)
+    assert [item for item, _ in documents] == [ARTICLE]
+
+
+def test_writer_reads_its_own_unpublished_writes(tmp_path):
+    index = SharedIndex(TfidfIndex, str(tmp_path / 'shared'), check_interval=0, publish_delay=5.0)
+    index.build(CORPUS)
+    generation = index.generation
+    index.add({'id': 'new', 'title': 'Zone 1 firewall', 'content': 'firewall rule number 1 for zone 1'})
+    index.update({'id': 'base-4', 'title': 'Replaced', 'content': 'intrusion detection'})
+    index.remove('base-1')
+
+    ids = [item['id'] for item, _ in index.search('firewall rule number 1 for zone 1', 25)]
+    assert ids[0] == 'new'
+    assert 'base-1' not in ids and 'base-4' not in ids
+    assert [item['title'] for item, _ in index.search('intrusion detection', 1)] == ['Replaced']
+    assert index.generation == generation
+
+    # Once published, the generation serves the writes and the overlay is retired
+    index.publish_delay = 0.05
+    index._wake.set()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and index._unpublished:
+        index.search('firewall', 1)
+        time.sleep(0.05)
+    assert not index._unpublished and index.generation != generation
+    assert [item['id'] for item, _ in index.search('firewall rule number 1 for zone 1', 1)] == ['new']
+
+
+def test_writes_from_all_workers_are_published(tmp_path):
+    directory = str(tmp_path / 'shared')
+    reader = _shared(directory)
+    reader.build(CORPUS)
+    first = reader.generation
+    expected = {item['id'] for item in CORPUS} - {'base-0'} | \
+        {f'w{worker}-{n}' for worker in range(WORKERS) for n in range(WRITES)}
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=_writer, args=(directory, worker, expected, results)) for worker in range(WORKERS)]
+    for process in workers:
+        process.start()
+
+    # Readers keep serving a generation while the workers publish
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and _visible_ids(reader) != expected:
+        assert reader.search('firewall network traffic', 3)
+        time.sleep(0.02)
+
+    outcomes = [results.get(timeout=60) for _ in workers]
+    for process in workers:
+        process.join(timeout=30)
+    assert all(ok for _, ok, _ in outcomes), outcomes
+    assert sum(leader for _, _, leader in outcomes) == 1
+    assert _visible_ids(reader) == expected
+    assert reader.generation != first
+    assert not [name for name in os.listdir(os.path.join(directory, 'journal')) if not name.startswith('.')]
+
+
+def test_first_build_publishes_and_matching_builds_reuse_it(tmp_path):
+    directory = str(tmp_path / 'shared')
+    first = _shared(directory)
+    first.build(CORPUS)
+    second = _shared(directory)
+    second.build(list(reversed(CORPUS)))
+    assert second.generation == first.generation
+    hits = second.search('zone firewall rule number 7', 1)
+    local = TfidfIndex()
+    local.build(CORPUS)
+    assert hits[0][0]['id'] == local.search('zone firewall rule number 7', 1)[0][0]['id']
+
+
+def test_search_does_not_wait_for_pending_writes(tmp_path):
+    index = SharedIndex(TfidfIndex, str(tmp_path / 'shared'), check_interval=0, publish_delay=5.0)
+    index.build(CORPUS)
+    generation = index.generation
+    index.add({'id': 'new', 'title': 'New', 'content': 'firewall network traffic'})
+    started = time.monotonic()
+    assert index.search('firewall network traffic', 3)
+    assert time.monotonic() - started < 1.0
+    assert index.generation == generation
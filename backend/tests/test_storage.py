@@ -0,0 +1,23 @@
+def test_sqlite_full_text_search_ranks_matching_rows(sqlite_storage):
+    hits = sqlite_storage.search_knowledge('phishing passwords', 5)
+    assert [item['id'] for item, _ in hits] == ['k1']
+    assert hits[0][0]['keywords'] == ['phishing']
+
+
+def test_sqlite_updates_and_deletes_keep_search_in_sync(sqlite_storage):
+    sqlite_storage.update_knowledge('k2', {'content': 'Firewalls also block phishing callbacks.'})
+    assert {item['id'] for item, _ in sqlite_storage.search_knowledge('phishing', 5)} == {'k1', 'k2'}
+    assert sqlite_storage.delete_knowledge('k1')
+    assert [item['id'] for item, _ in sqlite_storage.search_knowledge('phishing', 5)] == ['k2']
+    assert [item['id'] for item in sqlite_storage.list_knowledge()] == ['k2']
+
+
+def test_sqlite_chat_history_round_trip(sqlite_storage):
+    sqlite_storage.append_chat_history([
+        {'id': f'h{n}', 'user_id': 'alice', 'user_message': f'question {n}', 'bot_response': f'answer {n}',
+         'timestamp': f'2024-01-01T00:00:0{n}'}
+        for n in range(3)
+    ])
+    assert [row['id'] for row in sqlite_storage.get_chat_history('alice', 2)] == ['h2', 'h1']
+    assert sqlite_storage.clear_chat_history('alice')
+    assert sqlite_storage.get_chat_history('alice') == []
@@ -0,0 +1,159 @@
+from types import SimpleNamespace
+from postgrest.exceptions import APIError
+from services import storage as storage_module
+from services.storage import SupabaseStorage, PostgresStorage, StorageSearchIndex
+from services.knowledge_service import KnowledgeService
+
+
+def test_storage_method_returns_backend_ranked_hits(sqlite_storage, monkeypatch):
+    monkeypatch.setenv('KNOWLEDGE_SEARCH_METHOD', 'storage')
+    service = KnowledgeService(storage_backend=sqlite_storage)
+    assert isinstance(service.search_index, StorageSearchIndex)
+    hits = service.search_knowledge('phishing passwords', 3)
+    assert hits and hits[0][0]['id'] == 'k1'
+
+
+def test_storage_method_searches_training_data_without_listing_rows(sqlite_storage, monkeypatch):
+    monkeypatch.setenv('KNOWLEDGE_SEARCH_METHOD', 'storage')
+    service = KnowledgeService(storage_backend=sqlite_storage)
+
+    def list_knowledge():
+        raise AssertionError('storage search must not download the knowledge table')
+
+    monkeypatch.setattr(sqlite_storage, 'list_knowledge', list_knowledge)
+    ids = [item['id'] for item, _ in service.search_knowledge('firewall intrusion detection', 5)]
+    assert 'k2' in ids and 'cyber_001' in ids
+
+
+class FakeRPC:
+    def __init__(self, error):
+        self.error = error
+
+    def execute(self):
+        raise self.error
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        self.data = [row for row in self.data if row[column] in values]
+        return self
+
+
+class FakeClient:
+    def __init__(self, error=None, ranked=None, rows=None):
+        self.error = error
+        self.ranked = ranked or []
+        self.rows = rows or []
+        self.calls = 0
+
+    def rpc(self, name, params):
+        self.calls += 1
+        if self.error:
+            return FakeRPC(self.error)
+        return FakeResult(self.ranked[:params['match_count']])
+
+    def table(self, name):
+        return FakeResult(list(self.rows))
+
+
+def _supabase(monkeypatch, error=None, **data):
+    backend = SupabaseStorage()
+    client = FakeClient(error, **data)
+    monkeypatch.setattr(SupabaseStorage, 'client', property(lambda self: client))
+    monkeypatch.setattr(backend, '_search_ilike', lambda query, limit: [])
+    return backend, client
+
+
+def test_missing_rpc_disables_it(monkeypatch):
+    backend, client = _supabase(monkeypatch, APIError({'code': 'PGRST202', 'message': 'not found'}))
+    backend.search_knowledge('phishing')
+    backend.search_knowledge('phishing')
+    assert backend._rpc_available is False
+    assert client.calls == 1
+
+
+def test_transient_rpc_error_falls_back_once(monkeypatch):
+    backend, client = _supabase(monkeypatch, TimeoutError('timed out'))
+    backend.search_knowledge('phishing')
+    backend.search_knowledge('phishing')
+    assert backend._rpc_available is True
+    assert client.calls == 2
+
+
+def test_rpc_ranks_fetch_only_the_matching_rows(monkeypatch):
+    rows = [{'id': 'k1', 'title': 'Phishing'}, {'id': 'k2', 'title': 'Firewalls'}, {'id': 'k3', 'title': 'VPNs'}]
+    backend, client = _supabase(monkeypatch, ranked=[{'id': 'k2', 'score': 0.8}, {'id': 'k1', 'score': 0.3}], rows=rows)
+    hits = backend.search_knowledge('firewall', 5)
+    assert [(item['id'], score) for item, score in hits] == [('k2', 0.8), ('k1', 0.3)]
+    assert backend._rpc_available is True
+
+
+class FakeCursor:
+    description = (('id',),)
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchall(self):
+        return [dict(row) for row in self.rows]
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, cursor_factory=None):
+        return self._cursor
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.returned = 0
+
+    def getconn(self):
+        return self.connection
+
+    def putconn(self, connection):
+        self.returned += 1
+
+
+def test_postgres_search_joins_the_ranked_ids(monkeypatch):
+    cursor = FakeCursor([{'id': 'k2', 'title': 'Firewalls', 'content': '', 'keywords': None,
+                          'created_at': None, 'updated_at': None, 'score': 0.8}])
+    pool = FakePool(FakeConnection(cursor))
+    monkeypatch.setattr(storage_module, 'psycopg2', SimpleNamespace(extras=SimpleNamespace(RealDictCursor=dict)),
+                        raising=False)
+    backend = PostgresStorage('postgresql://unused')
+    backend._pool = pool
+    hits = backend.search_knowledge('firewall', 3)
+    assert [(item['id'], score) for item, score in hits] == [('k2', 0.8)]
+    assert 'score' not in hits[0][0]
+    sql, params = cursor.executed[0]
+    assert 'search_knowledge_base(%s, %s)' in sql and params == ('firewall', 3)
+    assert pool.returned == 1
@@ -0,0 +1,66 @@
+import threading
+import time
+from services.chat_service import ChatService
+from services.storage import SQLiteStorage
+from services.write_behind import WriteBehindQueue
+
+
+def test_rows_are_written_in_order_and_in_batches():
+    batches = []
+    writer = WriteBehindQueue(batches.append, max_batch=10, flush_interval=0.01)
+    for n in range(25):
+        writer.enqueue({'id': n})
+    writer.flush()
+    assert [row['id'] for batch in batches for row in batch] == list(range(25))
+    assert all(len(batch) <= 10 for batch in batches)
+    writer.close()
+
+
+def test_pending_rows_are_visible_until_written():
+    release = threading.Event()
+    written = []
+
+    def flush(rows):
+        release.wait(5)
+        written.extend(rows)
+
+    writer = WriteBehindQueue(flush, max_batch=10, flush_interval=0.01)
+    for n in range(3):
+        writer.enqueue({'id': n, 'user_id': 'alice' if n < 2 else 'bob'})
+    assert [row['id'] for row in writer.pending(lambda row: row['user_id'] == 'alice')] == [0, 1]
+    release.set()
+    writer.flush()
+    assert writer.pending(lambda row: True) == []
+    assert len(written) == 3
+    writer.close()
+
+
+def test_history_reads_merge_queued_turns_without_flushing(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'history.db'))
+    chat = ChatService(storage_backend=storage)
+    release = threading.Event()
+
+    def slow_insert(rows):
+        release.wait(5)
+        storage.append_chat_history(rows)
+
+    chat.history_writer.flush_fn = slow_insert
+    storage.append_chat_history([{'id': 'stored', 'user_id': 'alice', 'user_message': 'hi', 'bot_response': 'hello',
+                                  'timestamp': '2024-01-01T00:00:00'}])
+    chat._save_chat_history('alice', 'what is phishing?', 'a scam')
+    chat._save_chat_history('bob', 'unrelated', 'reply')
+
+    started = time.monotonic()
+    rows, _ = chat.get_chat_history_page('alice', 10)
+    assert time.monotonic() - started < 1.0
+    assert [row['user_message'] for row in rows] == ['what is phishing?', 'hi']
+
+    # Paging past the queued turn reaches the stored one
+    page, cursor = chat.get_chat_history_page('alice', 1)
+    assert page[0]['user_message'] == 'what is phishing?'
+    assert [row['id'] for row in chat.get_chat_history_page('alice', 1, cursor)[0]] == ['stored']
+
+    release.set()
+    chat.history_writer.flush()
+    assert [row['user_message'] for row in chat.get_chat_history('alice')] == ['what is phishing?', 'hi']
+    chat.history_writer.close()
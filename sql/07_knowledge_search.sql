@@ -0,0 +1,125 @@
+-- Server-side Knowledge Search
+-- Full-text (tsvector + GIN) and trigram (pg_trgm) indexes on the knowledge
+-- tables, plus ranked search RPC functions that return only the top-k ids
+-- and scores, so the backend no longer downloads every row to score it.
+
+-- Enable trigram matching
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- The backend's knowledge table (see the project README); created here so
+-- the migration also runs against a plain local Postgres
+CREATE TABLE IF NOT EXISTS public.knowledge_base (
+    id UUID PRIMARY KEY,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    keywords TEXT[],
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- array_to_string is only STABLE, but generated columns need IMMUTABLE expressions
+CREATE OR REPLACE FUNCTION public.immutable_array_to_string(items TEXT[])
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT array_to_string(items, ' ');
+$$;
+
+-- Weighted document vectors: title (A), tags/keywords (B), body (C)
+ALTER TABLE public.knowledge_base
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, COALESCE(public.immutable_array_to_string(keywords), '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, COALESCE(content, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_search_vector ON public.knowledge_base USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_title_trgm ON public.knowledge_base USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_created_at ON public.knowledge_base (created_at DESC);
+
+-- Chat questions are matched on ANY of their terms (plainto_tsquery ANDs them)
+CREATE OR REPLACE FUNCTION public.any_terms_tsquery(search_query TEXT)
+RETURNS tsquery
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT CASE
+        WHEN numnode(plainto_tsquery('english'::regconfig, search_query)) = 0 THEN plainto_tsquery('english'::regconfig, search_query)
+        ELSE replace(plainto_tsquery('english'::regconfig, search_query)::TEXT, ' & ', ' | ')::tsquery
+    END;
+$$;
+
+-- Top-k knowledge_base ids ranked by full-text rank plus title trigram similarity
+CREATE OR REPLACE FUNCTION public.search_knowledge_base(search_query TEXT, match_count INTEGER DEFAULT 5)
+RETURNS TABLE (id UUID, score REAL)
+LANGUAGE sql
+STABLE
+PARALLEL SAFE
+AS $$
+    WITH query AS (
+        SELECT public.any_terms_tsquery(search_query) AS terms
+    )
+    SELECT kb.id,
+           (ts_rank_cd(kb.search_vector, query.terms, 32) + 0.5 * similarity(kb.title, search_query))::REAL AS score
+    FROM public.knowledge_base kb, query
+    WHERE kb.search_vector @@ query.terms
+       OR kb.title % search_query
+    ORDER BY score DESC, kb.id
+    LIMIT LEAST(GREATEST(match_count, 1), 100);
+$$;
+
+-- Same ranking over published knowledge_articles; RLS still applies to the caller.
+-- knowledge_articles comes from 01_schema.sql, so skip this on a plain Postgres without it
+DO $$
+BEGIN
+    IF to_regclass('public.knowledge_articles') IS NOT NULL THEN
+        ALTER TABLE public.knowledge_articles
+            ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english'::regconfig, COALESCE(title, '')), 'A') ||
+                setweight(to_tsvector('english'::regconfig, COALESCE(public.immutable_array_to_string(tags), '')), 'B') ||
+                setweight(to_tsvector('english'::regconfig, COALESCE(content, '')), 'C')
+            ) STORED;
+
+        CREATE INDEX IF NOT EXISTS idx_knowledge_articles_search_vector ON public.knowledge_articles USING GIN (search_vector);
+        CREATE INDEX IF NOT EXISTS idx_knowledge_articles_title_trgm ON public.knowledge_articles USING GIN (title gin_trgm_ops);
+
+        CREATE OR REPLACE FUNCTION public.search_knowledge_articles(search_query TEXT, match_count INTEGER DEFAULT 5)
+        RETURNS TABLE (id UUID, score REAL)
+        LANGUAGE sql
+        STABLE
+        PARALLEL SAFE
+        AS $fn$
+            WITH query AS (
+                SELECT public.any_terms_tsquery(search_query) AS terms
+            )
+            SELECT ka.id,
+                   (ts_rank_cd(ka.search_vector, query.terms, 32) + 0.5 * similarity(ka.title, search_query))::REAL AS score
+            FROM public.knowledge_articles ka, query
+            WHERE ka.is_published
+              AND (ka.search_vector @@ query.terms OR ka.title % search_query)
+            ORDER BY score DESC, ka.id
+            LIMIT LEAST(GREATEST(match_count, 1), 100);
+        $fn$;
+
+        COMMENT ON FUNCTION public.search_knowledge_articles(TEXT, INTEGER) IS 'Ranked full-text + trigram search over published knowledge_articles; returns top-k ids and scores';
+    END IF;
+END
+$$;
+
+-- The anon and authenticated roles exist on Supabase only; plain Postgres keeps the default grants
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon')
+       AND EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticated') THEN
+        GRANT EXECUTE ON FUNCTION public.search_knowledge_base(TEXT, INTEGER) TO anon, authenticated;
+        IF to_regprocedure('public.search_knowledge_articles(text, integer)') IS NOT NULL THEN
+            GRANT EXECUTE ON FUNCTION public.search_knowledge_articles(TEXT, INTEGER) TO anon, authenticated;
+        END IF;
+    END IF;
+END
+$$;
+
+COMMENT ON FUNCTION public.search_knowledge_base(TEXT, INTEGER) IS 'Ranked full-text + trigram search over knowledge_base; returns top-k ids and scores';
@@ -0,0 +1,18 @@
+-- Keyset Pagination Indexes
+-- Composite indexes matching the (created_at, id) / (timestamp, id) keyset
+-- order used by GET /api/knowledge and GET /api/chat/history/<user_id>, so
+-- every page is an index range scan instead of a sort over the whole table.
+
+CREATE TABLE IF NOT EXISTS public.chat_history (
+    id UUID PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    user_message TEXT NOT NULL,
+    bot_response TEXT NOT NULL,
+    timestamp TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_created_at_id ON public.knowledge_base (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_chat_history_user_timestamp_id ON public.chat_history (user_id, timestamp DESC, id DESC);
+
+-- Superseded by the composite index above
+DROP INDEX IF EXISTS public.idx_knowledge_base_created_at;